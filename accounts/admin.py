@@ -1,5 +1,20 @@
 from django.contrib import admin
-from .models import Profile
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.contrib.auth.models import User
+from questions import deletion
+from questions.admin import BackgroundDeleteAdminMixin
+from .models import Profile, UserStats
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class UserAdmin(BackgroundDeleteAdminMixin, BaseUserAdmin):
+    """
+    The stock user admin, deleting users and their content in the background
+    """
+    soft_delete_function = deletion.delete_user
+
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
@@ -8,4 +23,15 @@ class ProfileAdmin(admin.ModelAdmin):
     """
     list_display = ('user', 'created_at', 'updated_at')
     search_fields = ('user__username', 'user__email')
-    readonly_fields = ('created_at', 'updated_at')
\ No newline at end of file
+    readonly_fields = ('created_at', 'updated_at')
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the UserStats rollup, which is maintained by
+    signals and repair_counters rather than edited by hand
+    """
+    list_display = ('user', 'questions_asked', 'answers_written', 'likes_received', 'likes_given', 'last_activity')
+    list_select_related = ('user',)
+    search_fields = ('user__username',)
+    readonly_fields = ('user', 'questions_asked', 'answers_written', 'likes_received', 'likes_given', 'last_activity')
@@ -0,0 +1,47 @@
+"""
+Authentication backend that keeps logged-in users in a cache.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from core.cache import is_shared
+
+
+def user_cache():
+    return caches[settings.AUTH_USER_CACHE['ALIAS']]
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def forget_user(user_id):
+    """
+    Drop a user from the cache, so the next request loads them fresh
+    """
+    user_cache().delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose per-request user lookup (from the session's user id)
+    is served from the cache for AUTH_USER_CACHE['TIMEOUT'] seconds.
+
+    The session auth hash is still checked against the cached user's
+    password, and accounts.signals drops the entry whenever the user is
+    saved or deleted, so password changes and deactivation apply at once.
+    That only holds if every worker sees the deletion, so with a per-process
+    cache users are loaded from the database as by ModelBackend.
+    """
+    def get_user(self, user_id):
+        if not is_shared(settings.AUTH_USER_CACHE['ALIAS']):
+            return super().get_user(user_id)
+        cache = user_cache()
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, settings.AUTH_USER_CACHE['TIMEOUT'])
+        return user if self.user_can_authenticate(user) else None
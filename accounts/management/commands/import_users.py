@@ -0,0 +1,80 @@
+import csv
+import sys
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from accounts.models import Profile, UserStats
+
+
+class Command(BaseCommand):
+    """
+    Bulk user import that skips the per-user signals
+    """
+    help = (
+        'Create users from a CSV file with username, email and optional '
+        'password and bio columns, inserting users, profiles and stats in '
+        'batches (one INSERT per table per batch) instead of one signal per user. '
+        'Users without a password get an unusable one and must reset it'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row, or - for standard input')
+        parser.add_argument('--batch-size', type=int, default=500, help='Users per transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        if options['path'] == '-':
+            created, skipped = self.load(sys.stdin, options['batch_size'])
+        else:
+            try:
+                with open(options['path'], newline='') as f:
+                    created, skipped = self.load(f, options['batch_size'])
+            except OSError as e:
+                raise CommandError(f'Cannot read {options["path"]}: {e}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {created} user(s); skipped {skipped} existing or duplicate username(s)'
+        ))
+
+    def load(self, f, batch_size):
+        reader = csv.DictReader(f)
+        missing = {'username', 'email'} - set(reader.fieldnames or ())
+        if missing:
+            raise CommandError(f'Missing column(s): {", ".join(sorted(missing))}')
+        created = skipped = 0
+        seen = set()
+        while rows := list(islice(reader, batch_size)):
+            names = {row['username'] for row in rows}
+            existing = set(User.objects.filter(username__in=names).values_list('username', flat=True))
+            batch = []
+            for row in rows:
+                if row['username'] in existing or row['username'] in seen:
+                    skipped += 1
+                    continue
+                seen.add(row['username'])
+                batch.append(row)
+            if batch:
+                self.insert(batch)
+                created += len(batch)
+        return created, skipped
+
+    def insert(self, rows):
+        """
+        Insert one batch of users and then their profiles and stats
+        """
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                User(
+                    username=row['username'],
+                    email=row['email'],
+                    # make_password(None) is an unusable password
+                    password=make_password(row.get('password') or None),
+                )
+                for row in rows
+            )
+            Profile.objects.bulk_create_for(
+                users, bios={user.pk: row.get('bio') or '' for user, row in zip(users, rows)}
+            )
+            UserStats.objects.bulk_create(UserStats(user=user) for user in users)
@@ -0,0 +1,94 @@
+# Generated by Django 5.0.5 on 2026-10-18 10:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_user_stats(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    User = apps.get_model("auth", "User")
+    UserStats = apps.get_model("accounts", "UserStats")
+    Question = apps.get_model("questions", "Question")
+    Answer = apps.get_model("questions", "Answer")
+    Like = apps.get_model("questions", "Like")
+
+    def total(queryset, field):
+        return Coalesce(Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ), 0)
+
+    def latest(queryset, field):
+        return Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(latest=Max("created_at"))
+            .values("latest")
+        )
+
+    users = User.objects.using(db_alias).annotate(
+        questions_asked=total(Question.objects, "author"),
+        answers_written=total(Answer.objects, "author"),
+        likes_received=total(Like.objects, "answer__author"),
+        likes_given=total(Like.objects, "user"),
+        last_question=latest(Question.objects, "author"),
+        last_answer=latest(Answer.objects, "author"),
+    )
+    UserStats.objects.using(db_alias).bulk_create(
+        (
+            UserStats(
+                user_id=user.pk,
+                questions_asked=user.questions_asked,
+                answers_written=user.answers_written,
+                likes_received=user.likes_received,
+                likes_given=user.likes_given,
+                last_activity=max(filter(None, [user.last_question, user.last_answer]), default=None),
+            )
+            for user in users.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("questions", "0007_question_author_created_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("questions_asked", models.PositiveIntegerField(default=0)),
+                ("answers_written", models.PositiveIntegerField(default=0)),
+                ("likes_received", models.PositiveIntegerField(default=0)),
+                ("likes_given", models.PositiveIntegerField(default=0)),
+                ("last_activity", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "User Stats",
+                "verbose_name_plural": "User Stats",
+            },
+        ),
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
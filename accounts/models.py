@@ -1,5 +1,27 @@
-from django.db import models
+from django.db import models, router
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+class ProfileManager(models.Manager):
+    """
+    Manager holding the bulk way a Profile comes into existence
+    """
+    def bulk_create_for(self, users, bios=None, batch_size=None):
+        """
+        Create profiles for many users in batched inserts, for users inserted
+        in bulk (which skips create_profile in accounts.signals); bios maps a
+        user's pk to their bio. Users who already have one are skipped
+        """
+        bios = bios or {}
+        return self.bulk_create(
+            (self.model(user=user, bio=bios.get(user.pk, '')) for user in users),
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+
 
 class Profile(models.Model):
     """
@@ -9,11 +31,116 @@ class Profile(models.Model):
     bio = models.TextField(max_length=500, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
+    objects = ProfileManager()
+
+    # Fields a save() compares against their loaded values
+    TRACKED_FIELDS = ('bio',)
+
     def __str__(self):
         return f"{self.user.username}'s Profile"
-    
+
     class Meta:
         verbose_name = 'User Profile'
         verbose_name_plural = 'User Profiles'
         ordering = ['-created_at']
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = {name: getattr(instance, name) for name in cls.TRACKED_FIELDS if name in field_names}
+        return instance
+
+    def changed_fields(self):
+        """
+        Names of the tracked fields that differ from the values loaded from
+        the database (all of them for a profile that was not loaded)
+        """
+        loaded = getattr(self, '_loaded', None)
+        if loaded is None:
+            return list(self.TRACKED_FIELDS)
+        return [
+            name for name in self.TRACKED_FIELDS
+            # A deferred field counts as changed once it has been assigned
+            if (loaded[name] != getattr(self, name) if name in loaded else name in self.__dict__)
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Write only the fields that changed; saving an unchanged profile is a no-op
+        """
+        if self._state.adding or kwargs.get('update_fields') is not None or kwargs.get('force_insert'):
+            super().save(*args, **kwargs)
+        else:
+            changed = self.changed_fields()
+            if not changed:
+                return
+            super().save(*args, update_fields=[*changed, 'updated_at'], **kwargs)
+        self._loaded = {name: getattr(self, name) for name in self.TRACKED_FIELDS}
+
+
+class UserStatsManager(models.Manager):
+    """
+    Manager for the per-user activity rollup
+    """
+    def for_user(self, user):
+        """
+        Return the user's stats, creating an empty row if they have none
+        (repair_counters fills in the real numbers)
+        """
+        try:
+            return user.stats
+        except self.model.DoesNotExist:
+            stats, _ = self.get_or_create(user=user)
+            user.stats = stats
+            return stats
+
+    def bump(self, user_id, active=False, using=None, **deltas):
+        """
+        Add the deltas to the user's counters with a database-side update
+        (never below zero), and mark them active now if asked; one UPDATE
+        """
+        changes = {
+            name: Greatest(F(name) + delta, Value(0))
+            for name, delta in deltas.items() if delta
+        }
+        if active:
+            changes['last_activity'] = timezone.now()
+        if changes:
+            self.using(using or router.db_for_write(self.model)).filter(user_id=user_id).update(**changes)
+
+    def bump_many(self, counter, deltas, using=None):
+        """
+        Add {user_id: delta} to one counter of many users (never below
+        zero); one UPDATE however many users there are
+        """
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+        if deltas:
+            self.using(using or router.db_for_write(self.model)).filter(user_id__in=deltas).update(**{
+                counter: Greatest(
+                    F(counter) + Case(*(When(user_id=user_id, then=Value(delta)) for user_id, delta in deltas.items())),
+                    Value(0),
+                ),
+            })
+
+
+class UserStats(models.Model):
+    """
+    Denormalized activity counters for a user, maintained incrementally by
+    accounts.signals from question, answer and like writes
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    questions_asked = models.PositiveIntegerField(default=0)
+    answers_written = models.PositiveIntegerField(default=0)
+    likes_received = models.PositiveIntegerField(default=0)
+    likes_given = models.PositiveIntegerField(default=0)
+    last_activity = models.DateTimeField(null=True, blank=True)
+
+    objects = UserStatsManager()
+
+    class Meta:
+        verbose_name = 'User Stats'
+        verbose_name_plural = 'User Stats'
+
+    def __str__(self):
+        return f"Stats for user {self.user_id}"
@@ -1,22 +1,129 @@
-from django.db.models.signals import post_save
+from collections import Counter
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Profile
+from questions.models import Question, Answer, Like
+from questions.signals import answers_purged, like_toggled, likes_purged
+from .backends import forget_user
+from .models import Profile, UserStats
 
 @receiver(post_save, sender=User)
-def create_profile(sender, instance, created, **kwargs):
+def create_profile(sender, instance, created, raw=False, **kwargs):
     """
-    Create a Profile whenever a User is created
+    Create a Profile whenever a User is created; later saves of the User
+    (e.g. last_login on every login) leave the Profile alone. Users inserted
+    in bulk get theirs from Profile.objects.bulk_create_for()
     """
-    if created:
+    if created and not raw:
         Profile.objects.create(user=instance)
 
+
 @receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """
+    Drop the user from the authentication cache whenever they change
+    """
+    forget_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    """
+    Start every new user with an empty stats rollup
+    """
+    if created and not raw:
+        UserStats.objects.create(user=instance)
+
+
+def _is_deleting(origin, user_id):
+    """
+    Check whether a delete cascades from the user, whose stats go with them
+    """
+    return isinstance(origin, User) and origin.pk == user_id
+
+
+@receiver(post_save, sender=Question)
+def count_question_asked(sender, instance, created, raw=False, **kwargs):
+    """
+    Count a new question towards its author's stats
+    """
+    if created and not raw:
+        UserStats.objects.bump(instance.author_id, active=True, questions_asked=1)
+
+
+@receiver(post_delete, sender=Question)
+def uncount_question_asked(sender, instance, origin=None, **kwargs):
+    """
+    Take a deleted question off its author's stats
+    """
+    if not _is_deleting(origin, instance.author_id):
+        UserStats.objects.bump(instance.author_id, questions_asked=-1)
+
+
+@receiver(post_save, sender=Answer)
+def count_answer_written(sender, instance, created, raw=False, **kwargs):
+    """
+    Count a new answer towards its author's stats
+    """
+    if created and not raw:
+        UserStats.objects.bump(instance.author_id, active=True, answers_written=1)
+
+
+@receiver(post_delete, sender=Answer)
+def uncount_answer_written(sender, instance, origin=None, **kwargs):
+    """
+    The answer's likes are deleted with it without like_toggled, so its
+    stored like count comes off the author's likes received here
+    """
+    if not _is_deleting(origin, instance.author_id):
+        UserStats.objects.bump(instance.author_id, answers_written=-1, likes_received=-instance.like_count)
+
+
+@receiver(like_toggled)
+def count_like(sender, answer, user, liked, using=None, **kwargs):
+    """
+    Count a like (or take back an unlike) for the liker and the answer's author
+    """
+    delta = 1 if liked else -1
+    UserStats.objects.bump(user.pk, active=liked, using=using, likes_given=delta)
+    UserStats.objects.bump(answer.author_id, using=using, likes_received=delta)
+
+
+@receiver(post_delete, sender=Like)
+def uncount_cascaded_like(sender, instance, origin=None, using=None, **kwargs):
+    """
+    Likes deleted along with their answer or question send no like_toggled;
+    take them off the likers' likes given. Answer.delete() and
+    Question.delete() purge their likes first, so this only runs for
+    queryset deletes
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if model in (Answer, Question):
+        UserStats.objects.bump(instance.user_id, using=using, likes_given=-1)
+
+
+@receiver(likes_purged)
+def uncount_purged_likes(sender, counts, using=None, **kwargs):
+    """
+    Likes removed in bulk ahead of their answers; as with the cascade above,
+    take them off the likers' likes given, in one UPDATE
+    """
+    UserStats.objects.bump_many('likes_given', {user_id: -removed for user_id, removed in counts.items()}, using=using)
+
+
+@receiver(answers_purged)
+def uncount_purged_answers(sender, answers, using=None, **kwargs):
     """
-    Save the Profile whenever the User is saved
+    A purged chunk of answers comes off its authors' answers written and,
+    as in uncount_answer_written, their stored like counts off the authors'
+    likes received; one UPDATE per counter
     """
-    try:
-        instance.profile.save() # This will save the profile if it exists
-    except Profile.DoesNotExist:
-        Profile.objects.create(user=instance) #If profile doesn't exist for some reason, it will be created
\ No newline at end of file
+    written, received = Counter(), Counter()
+    for _, _, author_id, like_count in answers:
+        written[author_id] -= 1
+        received[author_id] -= like_count
+    UserStats.objects.bump_many('answers_written', written, using=using)
+    UserStats.objects.bump_many('likes_received', received, using=using)
@@ -1,7 +1,16 @@
-from django.test import TestCase, Client
+import os
+import tempfile
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
-from .models import Profile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from core.testing import shared_caches
+from questions.models import Question, Answer, Like
+from .models import Profile, UserStats
 from .forms import UserRegisterForm
 
 class UserRegistrationTest(TestCase):
@@ -101,6 +110,7 @@ class ProfileModelTest(TestCase):
             email='test@example.com',
             password='testpassword123'
         )
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
         
     def test_profile_creation(self):
         """Test profile is automatically created for new user"""
@@ -111,6 +121,48 @@ class ProfileModelTest(TestCase):
         profile = self.user.profile
         self.assertEqual(str(profile), "testuser's Profile")
 
+    def test_user_save_leaves_profile_alone(self):
+        """Test saving the user, as every login does, issues no profile query"""
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.login(username='testuser', password='testpassword123')
+            self.user.save()
+        self.assertFalse(any('accounts_profile' in query['sql'] for query in ctx.captured_queries))
+
+    def test_unchanged_profile_not_written(self):
+        """Test saving a profile writes only when its own fields changed"""
+        profile = Profile.objects.get(user=self.user)
+        with self.assertNumQueries(0):
+            profile.save()
+        profile.bio = 'New bio'
+        with CaptureQueriesContext(connection) as ctx:
+            profile.save()
+        self.assertEqual(len(ctx), 1)
+        self.assertNotIn('"created_at"', ctx.captured_queries[0]['sql'])
+        self.assertEqual(Profile.objects.get(user=self.user).bio, 'New bio')
+        with self.assertNumQueries(0):
+            profile.save()
+
+    def test_import_users(self):
+        """Test importing users creates them and their profiles in batches"""
+        path = os.path.join(self.directory, 'users.csv')
+        with open(path, 'w', newline='') as f:
+            f.write('username,email,password,bio\n')
+            f.write('testuser,test@example.com,,\n')
+            for i in range(5):
+                f.write(f'imported{i},imported{i}@example.com,{"secret123" if i == 0 else ""},Bio {i}\n')
+        out = StringIO()
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('import_users', path, batch_size=2, stdout=out)
+        inserts = [
+            query['sql'].split(' INTO ')[1].split()[0]
+            for query in ctx.captured_queries if query['sql'].startswith('INSERT')
+        ]
+        self.assertEqual(inserts, ['"auth_user"', '"accounts_profile"', '"accounts_userstats"'] * 3)
+        self.assertIn('Imported 5 user(s); skipped 1', out.getvalue())
+        self.assertEqual(Profile.objects.get(user__username='imported3').bio, 'Bio 3')
+        self.assertTrue(User.objects.get(username='imported0').check_password('secret123'))
+        self.assertFalse(User.objects.get(username='imported1').has_usable_password())
+
 class LogoutTest(TestCase):
     """
     Test case for logout functionality
@@ -143,3 +195,166 @@ class LogoutTest(TestCase):
         self.assertEqual(response.status_code, 302)  # Should redirect to login page
         self.assertRedirects(response, f"{reverse('login')}?next={reverse('profile')}")
 
+
+
+@shared_caches()
+class CachedUserBackendTest(TestCase):
+    """
+    Test case for the cached authentication backend
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.client.login(username='testuser', password='testpassword123')
+
+    def test_logged_in_requests_run_no_auth_queries(self):
+        """Test the session and user come from the cache after the first request"""
+        self.client.get(reverse('profile'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.context['user'], self.user)
+        tables = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertNotIn('django_session', tables)
+        self.assertNotIn('"auth_user"."password"', tables)
+
+    def test_per_process_cache_not_used(self):
+        """Test users are loaded from the database while the cache is private to one worker"""
+        with override_settings(CACHES={**settings.CACHES, 'sessions': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'private',
+        }}, SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            client = Client()
+            client.login(username='testuser', password='testpassword123')
+            self.assertEqual(client.get(reverse('profile')).status_code, 200)
+            # Deactivated by another worker, without this one hearing of it
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            self.assertEqual(client.get(reverse('profile')).status_code, 302)
+
+    def test_password_change_logs_out(self):
+        """Test a password change drops the cached user and ends other sessions"""
+        self.client.get(reverse('profile'))
+        self.user.set_password('newpassword123')
+        self.user.save()
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_deactivated_user_logged_out(self):
+        """Test deactivating a user takes effect on their next request"""
+        self.client.get(reverse('profile'))
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 302)
+
+
+class UserStatsTest(TestCase):
+    """
+    Test case for the per-user stats rollup and the public profile page
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpassword123'
+        )
+
+    def stats(self, user):
+        stats = UserStats.objects.get(user=user)
+        return [stats.questions_asked, stats.answers_written, stats.likes_received, stats.likes_given]
+
+    def test_stats_follow_writes(self):
+        """Test questions, answers and likes keep both users' stats current"""
+        question = Question.objects.create(title='Test Question', author=self.user)
+        answer = Answer.objects.create(question=question, author=self.other_user, content='Answer')
+        Like.objects.toggle(answer, self.user)
+        self.assertEqual(self.stats(self.user), [1, 0, 0, 1])
+        self.assertEqual(self.stats(self.other_user), [0, 1, 1, 0])
+        self.assertIsNotNone(UserStats.objects.get(user=self.user).last_activity)
+
+        Like.objects.toggle(answer, self.user)
+        self.assertEqual(self.stats(self.user), [1, 0, 0, 0])
+        self.assertEqual(self.stats(self.other_user), [0, 1, 0, 0])
+
+    def test_stats_follow_cascades(self):
+        """Test deleting a question takes its answers and likes off everyone's stats"""
+        question = Question.objects.create(title='Test Question', author=self.user)
+        answer = Answer.objects.create(question=question, author=self.other_user, content='Answer')
+        Like.objects.toggle(answer, self.user)
+        question.delete()
+        self.assertEqual(self.stats(self.user), [0, 0, 0, 0])
+        self.assertEqual(self.stats(self.other_user), [0, 0, 0, 0])
+
+    def test_stats_follow_answer_and_user_deletes(self):
+        """Test deleting a liked answer, or its author, takes the likes off every liker's stats"""
+        likers = [
+            User.objects.create_user(username=f'liker{i}', email=f'liker{i}@example.com', password='testpassword123')
+            for i in range(3)
+        ]
+        question = Question.objects.create(title='Test Question', author=self.user)
+        first = Answer.objects.create(question=question, author=self.other_user, content='First')
+        second = Answer.objects.create(question=question, author=self.other_user, content='Second')
+        for liker in likers:
+            Like.objects.toggle(first, liker)
+            Like.objects.toggle(second, liker)
+        Like.objects.toggle(first, self.user)
+
+        first.delete()
+        self.assertEqual([self.stats(liker)[3] for liker in likers], [1, 1, 1])
+        self.assertEqual(self.stats(self.user), [1, 0, 0, 0])
+        self.other_user.delete()
+        self.assertEqual([self.stats(liker)[3] for liker in likers], [0, 0, 0])
+
+    def test_stats_follow_liked_answer_delete(self):
+        """Test deleting a liked answer or question takes the likes off every liker's stats"""
+        likers = [
+            User.objects.create_user(username=f'liker{i}', email=f'liker{i}@example.com', password='testpassword123')
+            for i in range(3)
+        ]
+        question = Question.objects.create(title='Test Question', author=self.user)
+        first = Answer.objects.create(question=question, author=self.other_user, content='First')
+        second = Answer.objects.create(question=question, author=self.other_user, content='Second')
+        for liker in likers:
+            Like.objects.toggle(first, liker)
+            Like.objects.toggle(second, liker)
+
+        first.delete()
+        self.assertEqual([self.stats(liker)[3] for liker in likers], [1, 1, 1])
+        self.assertEqual(self.stats(self.other_user), [0, 1, 3, 0])
+        question.delete()
+        self.assertEqual([self.stats(liker)[3] for liker in likers], [0, 0, 0])
+        self.assertFalse(Like.objects.exists())
+
+    def test_repair_counters_rebuilds_stats(self):
+        """Test repair_counters creates missing stats rows and fixes drifted ones"""
+        question = Question.objects.create(title='Test Question', author=self.user)
+        Answer.objects.create(question=question, author=self.other_user, content='Answer')
+        UserStats.objects.filter(user=self.user).delete()
+        UserStats.objects.filter(user=self.other_user).update(answers_written=7)
+        call_command('repair_counters', stdout=StringIO())
+        self.assertEqual(self.stats(self.user), [1, 0, 0, 0])
+        self.assertEqual(self.stats(self.other_user), [0, 1, 0, 0])
+
+    def test_public_profile(self):
+        """Test the public profile shows the rollup and recent questions in constant queries"""
+        for i in range(8):
+            Question.objects.create(title=f'Question {i}', author=self.user)
+        url = reverse('user-profile', kwargs={'username': 'testuser'})
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertContains(response, 'Question 7')
+        self.assertNotContains(response, 'Question 2<')
+        self.assertEqual(response.context['stats'].questions_asked, 8)
+        self.assertNotContains(response, 'test@example.com')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
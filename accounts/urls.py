@@ -7,4 +7,5 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'), 
     path('register/', views.register, name='register'),
     path('profile/', views.profile, name='profile'),
+    path('users/<str:username>/', views.user_profile, name='user-profile'),
 ]
\ No newline at end of file
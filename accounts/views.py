@@ -1,11 +1,18 @@
 
-from django.shortcuts import render, redirect
+from django.contrib.auth.models import User
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib import messages
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView
 from django.views.decorators.http import require_http_methods
+from core.db import write_transaction
 from .forms import UserRegisterForm, UserUpdateForm, ProfileUpdateForm
+from questions.models import Question
+from .models import UserStats
+
+# Questions listed on profile pages
+RECENT_QUESTIONS = 5
 
 class CustomLoginView(LoginView):
     """
@@ -27,6 +34,7 @@ def logout_view(request):
     return redirect('home')
 
 
+@write_transaction
 def register(request):
     """
     User registration view
@@ -48,13 +56,15 @@ def register(request):
 
 
 @login_required
+@write_transaction
 def profile(request):
     """
     User profile view for viewing and updating user information
     """
+    profile = request.user.profile
     if request.method == 'POST':
         u_form = UserUpdateForm(request.POST, instance=request.user)
-        p_form = ProfileUpdateForm(request.POST, instance=request.user.profile)
+        p_form = ProfileUpdateForm(request.POST, instance=profile)
         
         if u_form.is_valid() and p_form.is_valid():
             u_form.save()
@@ -63,11 +73,37 @@ def profile(request):
             return redirect('profile')
     else:
         u_form = UserUpdateForm(instance=request.user)
-        p_form = ProfileUpdateForm(instance=request.user.profile)
+        p_form = ProfileUpdateForm(instance=profile)
     
     context = {
         'u_form': u_form,
-        'p_form': p_form
+        'p_form': p_form,
+        'stats': UserStats.objects.for_user(request.user),
+        'recent_questions': recent_questions(request.user),
     }
     
-    return render(request, 'accounts/profile.html', context)
\ No newline at end of file
+    return render(request, 'accounts/profile.html', context)
+
+
+def recent_questions(user):
+    """
+    The user's latest questions, read from the (author, -created_at) index
+    """
+    return list(Question.objects.filter(author=user).order_by('-created_at')[:RECENT_QUESTIONS])
+
+
+def user_profile(request, username):
+    """
+    Public profile page: the user, their profile and stats in one query and
+    their recent questions in another
+    """
+    user = get_object_or_404(
+        User.objects.select_related('profile', 'stats'), username=username, is_active=True
+    )
+    context = {
+        'profile_user': user,
+        'profile': user.profile,
+        'stats': UserStats.objects.for_user(user),
+        'recent_questions': recent_questions(user),
+    }
+    return render(request, 'accounts/user_profile.html', context)
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+SQLite backend with per-connection PRAGMAs and immediate write transactions.
+
+Two extra keys are read from OPTIONS (and kept away from sqlite3.connect):
+
+* 'pragmas': a mapping applied with PRAGMA on every new connection, e.g.
+  {'journal_mode': 'wal', 'synchronous': 'normal', 'busy_timeout': 5000}
+* 'transaction_mode': 'DEFERRED' (SQLite's default) or 'IMMEDIATE'.
+
+A deferred transaction only asks for the write lock at its first write, and
+if another connection got there first SQLite cannot wait for it (the reader
+would deadlock the writer), so it fails at once with "database is locked"
+regardless of busy_timeout. BEGIN IMMEDIATE takes the write lock up front,
+where busy_timeout does apply. Single write transactions can opt in with
+core.db.write_transaction without making every transaction immediate.
+"""
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Set by core.db.immediate_transactions() for the current block
+        self.force_immediate = False
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    @property
+    def transaction_mode(self):
+        if self.force_immediate:
+            return 'IMMEDIATE'
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode', 'DEFERRED').upper()
+        return mode if mode in TRANSACTION_MODES else 'DEFERRED'
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,121 @@
+"""
+Versioned fragment caching for question and answer cards.
+
+Each cacheable object has a version number stored in the fragment cache.
+Rendered fragments are keyed on (kind, id, version), so bumping the version
+from a model signal makes every old fragment unreachable without having to
+find and delete it; stale entries simply age out of the cache.
+"""
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+FRAGMENT_CACHE_ALIAS = 'fragments'
+
+
+def fragment_cache():
+    return caches[FRAGMENT_CACHE_ALIAS]
+
+
+def is_shared(alias=FRAGMENT_CACHE_ALIAS):
+    """
+    Whether every worker process sees the same entries in a cache (by
+    default the fragment versions). A local-memory cache is private to its
+    process, so a change made in one worker never reaches the others
+    """
+    return not isinstance(caches[alias], LocMemCache)
+
+
+def _version_key(kind, pk):
+    return f'version:{kind}:{pk}'
+
+
+def _seed():
+    # New versions start from the clock, so a version that was evicted and
+    # re-created can never collide with fragments cached under an older one
+    return time.time_ns() // 1000
+
+
+def get_versions(kind, pks):
+    """
+    Current version for each pk, fetched in one round trip
+    """
+    cache = fragment_cache()
+    keys = {_version_key(kind, pk): pk for pk in pks}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, pk in keys.items():
+        if key not in found:
+            seed = _seed()
+            cache.add(key, seed, timeout=None)
+            versions[pk] = cache.get(key, seed)
+    return versions
+
+
+def attach_versions(objects, kind):
+    """
+    Set fragment_version on each object so templates do not look them up one by one
+    """
+    objects = list(objects)
+    versions = get_versions(kind, [obj.pk for obj in objects])
+    for obj in objects:
+        obj.fragment_version = versions[obj.pk]
+    return objects
+
+
+def bump_version(kind, pk):
+    """
+    Invalidate every cached fragment of one object
+    """
+    cache = fragment_cache()
+    key = _version_key(kind, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _seed(), timeout=None)
+
+
+def fragment_key(obj, kind, version, vary_on=()):
+    """
+    Cache key for one rendering of an object's fragment. The creation time is
+    part of the key so a reused primary key (e.g. after a database restore)
+    never picks up fragments of the row that previously had it.
+    """
+    created = getattr(obj, 'created_at', None)
+    stamp = int(created.timestamp() * 1000000) if created else 0
+    key = f'fragment:{kind}:{obj.pk}:{stamp}:{version}'
+    if vary_on:
+        digest = hashlib.md5(':'.join(str(v) for v in vary_on).encode(), usedforsecurity=False)
+        key = f'{key}:{digest.hexdigest()}'
+    return key
+
+
+class FragmentStats:
+    """
+    Per-process hit/miss counters for fragment lookups, by kind
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def record(self, kind, hit):
+        with self._lock:
+            self._counts[kind]['hits' if hit else 'misses'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = {}
+            for kind, counts in self._counts.items():
+                total = counts['hits'] + counts['misses']
+                stats[kind] = dict(counts, hit_ratio=round(counts['hits'] / total, 4) if total else None)
+            return stats
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+fragment_stats = FragmentStats()
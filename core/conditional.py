@@ -0,0 +1,108 @@
+"""
+Conditional GET for pages whose content can be summarised cheaply.
+
+A view using ConditionalGetMixin supplies get_validator_row(): at most one
+indexed query plus version counters from the cache (timestamps, counters,
+versions), run before any of the page's own queries. The row, the viewer
+and the URL are hashed into a weak ETag; a request whose If-None-Match
+matches gets a 304 without the view running, and other responses carry the
+ETag and, when the row has a timestamp, a Last-Modified from the newest one.
+
+Deleting a row does not move any timestamp, so Last-Modified is
+informational: 304s are only decided by the ETag, which counters and
+versions in the row do change.
+
+The versions must be the same in every worker: with a per-process fragment
+cache, a worker that never saw a change would keep answering 304 for it.
+Conditional GET is therefore skipped unless the fragment cache is shared
+(core.cache.is_shared).
+"""
+import hashlib
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from .cache import is_shared
+
+
+def config(name):
+    """
+    Read one CONDITIONAL_GET setting
+    """
+    return settings.CONDITIONAL_GET[name]
+
+
+class ConditionalGetMixin:
+    """
+    Answer revalidations of a page with 304 from a cheap validator row
+    """
+    def get_validator_row(self):
+        """
+        A dict of values that change whenever the page's content does, from
+        at most one query, or None to skip conditional handling (e.g. not found)
+        """
+        raise NotImplementedError
+
+    def uses_conditional_get(self):
+        request = self.request
+        if not config('ENABLED') or not is_shared() or request.method not in ('GET', 'HEAD'):
+            return False
+        # Pages showing one-off flash messages must always be rendered
+        return not any(name in request.COOKIES for name in config('BYPASS_COOKIES'))
+
+    def get_validators(self):
+        """
+        (ETag, Last-Modified timestamp) for the current request, or (None, None)
+        """
+        row = self.get_validator_row()
+        if row is None:
+            return None, None
+        viewer = self.request.user.pk if self.request.user.is_authenticated else 0
+        parts = [self.request.get_full_path(), viewer, *(f'{name}={row[name]}' for name in sorted(row))]
+        digest = hashlib.md5('|'.join(map(str, parts)).encode(), usedforsecurity=False).hexdigest()
+        stamps = [value for value in row.values() if hasattr(value, 'timestamp')]
+        return f'W/{quote_etag(digest)}', max(stamps).timestamp() if stamps else None
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.uses_conditional_get():
+            return super().dispatch(request, *args, **kwargs)
+        if self.view_is_async:
+            return self.adispatch(request, *args, **kwargs)
+        etag, last_modified = self.get_validators()
+        not_modified = self.not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+        return self.add_validators(super().dispatch(request, *args, **kwargs), etag, last_modified)
+
+    async def adispatch(self, request, *args, **kwargs):
+        etag, last_modified = await sync_to_async(self.get_validators)()
+        not_modified = self.not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+        response = await super().dispatch(request, *args, **kwargs)
+        return self.add_validators(response, etag, last_modified)
+
+    def not_modified(self, etag):
+        if etag is None:
+            return None
+        response = get_conditional_response(self.request, etag=etag)
+        if response is not None:
+            response['ETag'] = etag
+            self.patch_headers(response)
+        return response
+
+    def add_validators(self, response, etag, last_modified):
+        if etag is not None and response.status_code == 200:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            self.patch_headers(response)
+        return response
+
+    def patch_headers(self, response):
+        # Revalidated on every use; a logged-in viewer's page is theirs alone
+        if self.request.user.is_authenticated:
+            patch_cache_control(response, no_cache=True, private=True)
+        else:
+            patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ['Cookie'])
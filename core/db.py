@@ -0,0 +1,91 @@
+"""
+Helpers for short, contention-tolerant write transactions on SQLite.
+"""
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from .replicas import pin_primary
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def is_database_locked(error):
+    """
+    Whether an OperationalError is SQLite's busy/locked condition
+    """
+    message = str(error).lower()
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+@contextmanager
+def immediate_transactions(using=None):
+    """
+    Start transactions opened inside the block with BEGIN IMMEDIATE, on
+    backends that support it (see core.backends.sqlite3); a no-op elsewhere
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    if not hasattr(connection, 'force_immediate'):
+        yield
+        return
+    previous = connection.force_immediate
+    connection.force_immediate = True
+    try:
+        yield
+    finally:
+        connection.force_immediate = previous
+
+
+def _begin(using):
+    """
+    Enter an atomic block, retrying with jittered exponential backoff while
+    the write lock cannot be taken; returns the block to be exited
+    """
+    attempts = settings.WRITE_TRANSACTION['ATTEMPTS']
+    backoff = settings.WRITE_TRANSACTION['BACKOFF']
+    for attempt in range(attempts):
+        block = transaction.atomic(using=using)
+        try:
+            block.__enter__()
+            return block
+        except OperationalError as e:
+            if not is_database_locked(e) or attempt == attempts - 1:
+                raise
+            time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def run_write_transaction(func, *args, using=None, **kwargs):
+    """
+    Call func in one immediate transaction on the primary (reads included).
+
+    Only the BEGIN IMMEDIATE that takes the write lock is retried while the
+    database is locked, so func runs at most once and side effects it has
+    outside the database are never repeated. A locked error raised by func
+    itself (from a deferred transaction, on backends without immediate
+    ones) is not retried.
+    """
+    with pin_primary(), immediate_transactions(using), ExitStack() as stack:
+        stack.push(_begin(using))
+        return func(*args, **kwargs)
+
+
+def write_transaction(view=None, *, using=None):
+    """
+    Run a view's unsafe requests (POST and friends) with run_write_transaction;
+    GET requests pass straight through. A request that finds the database
+    locked waits for the write lock before the view runs, and is never run
+    twice
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method in SAFE_METHODS:
+                return view_func(request, *args, **kwargs)
+            return run_write_transaction(view_func, request, *args, using=using, **kwargs)
+        return wrapper
+
+    if view is not None:
+        return decorator(view)
+    return decorator
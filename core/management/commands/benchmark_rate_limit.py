@@ -0,0 +1,82 @@
+import logging
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+from core import rate_limit
+from .benchmark_sqlite_concurrency import Command as ConcurrencyCommand
+
+
+class Command(ConcurrencyCommand):
+    """
+    Show the write limits keeping reads fast under a like flood
+    """
+    help = (
+        'Flood the like toggle from one user through the full request stack '
+        'while reader threads load answer pages, with rate limiting off and '
+        'then on, on a scratch database, and report read latency and how '
+        'many writes were accepted or throttled'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--host', default='localhost', help='Host header to send, must be in ALLOWED_HOSTS')
+        parser.set_defaults(writers=8, profiles=['production'])
+
+    def run(self):
+        results = {}
+        # Every throttled request would otherwise be logged as a warning
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            for enabled in (False, True):
+                rate_limit.limiter_cache().clear()
+                self.clients = threading.local()
+                self.statuses = Counter()
+                self.statuses_lock = threading.Lock()
+                with override_settings(RATE_LIMIT={**settings.RATE_LIMIT, 'ENABLED': enabled}):
+                    results[enabled] = super().run()
+                results[enabled]['statuses'] = self.statuses
+        finally:
+            request_logger.setLevel(level)
+        results['check_us'] = self.time_check()
+        return results
+
+    def time_check(self, iterations=10000):
+        """
+        Mean cost of the limiter on one request (a user and an IP bucket), in µs
+        """
+        request = RequestFactory().post('/')
+        user = User.objects.get(pk=self.user_ids[1])
+        rate_limit.limiter_cache().clear()
+        started = time.perf_counter()
+        for _ in range(iterations):
+            rate_limit.check('toggle-like', request, user)
+        return (time.perf_counter() - started) / iterations * 1000000
+
+    def write(self, rng):
+        """
+        One flooder (a single user and address) toggling likes through the like view
+        """
+        client = getattr(self.clients, 'client', None)
+        if client is None:
+            client = self.clients.client = Client(HTTP_HOST=self.options['host'])
+            client.force_login(User.objects.get(pk=self.user_ids[0]))
+        answer = rng.choice(self.answers)
+        response = client.post(
+            reverse('toggle-like', args=[answer.pk]), headers={'X-Requested-With': 'XMLHttpRequest'}
+        )
+        with self.statuses_lock:
+            self.statuses[response.status_code] += 1
+
+    def report(self, profile, results):
+        for enabled in (False, True):
+            result = results[enabled]
+            super().report(f'{profile}, rate limiting {"on" if enabled else "off"}', result)
+            statuses = result['statuses']
+            self.stdout.write(f'  accepted {statuses[200]:>7}  throttled (429) {statuses[429]}')
+        self.stdout.write(f'  limiter check {results["check_us"]:.1f} µs per request')
@@ -0,0 +1,297 @@
+import asyncio
+import io
+import json
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+from questions.models import Question, Answer
+from core.stats import percentile
+
+SERVERS = {
+    # Each server gets the URL configuration it is deployed with
+    'wsgi': ('quora_clone.urls', get_wsgi_application),
+    'asgi': ('quora_clone.asgi_urls', get_asgi_application),
+}
+
+
+class Request:
+    """
+    One request as sent by a benchmark client
+    """
+    def __init__(self, path, method='GET', headers=None):
+        self.path, _, self.query = path.partition('?')
+        self.method = method
+        self.headers = headers or {}
+
+
+class ThreadMonitor:
+    """
+    Sample the number of live threads in the background and keep the peak
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+class Command(BaseCommand):
+    """
+    Compare the WSGI and ASGI deployments under many concurrent slow clients
+    """
+    help = (
+        'Drive the hot pages and the like toggle through the WSGI handler on a '
+        'fixed pool of worker threads and through the ASGI handler (native '
+        'async views) on one event loop, with many concurrent clients that are '
+        'slow to send requests and read responses, and compare throughput, '
+        'latency and threads used'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=100, help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=5, help='Requests each client sends, one after another')
+        parser.add_argument('--threads', type=int, default=16, help='WSGI worker threads')
+        parser.add_argument(
+            '--slow-ms',
+            type=float,
+            default=50,
+            help='How long a client takes to send its request, and again to read the response',
+        )
+        parser.add_argument('--user', default='bench_staff', help='Username of the user to like answers as')
+        parser.add_argument('--host', default='localhost', help='Host header to send, must be in ALLOWED_HOSTS')
+        parser.add_argument('--only', nargs='+', metavar='NAME', help='Only run the named scenarios')
+        parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=['wsgi', 'asgi'])
+        parser.add_argument('--output', help='Write machine-readable results to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['clients'] < 1 or options['requests'] < 1 or options['threads'] < 1:
+            raise CommandError('--clients, --requests and --threads must be at least 1')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'User "{options["user"]}" not found; run seed_benchmark_data first')
+        self.options = options
+        self.slow = options['slow_ms'] / 1000
+        scenarios = self.build_scenarios(user)
+        if options['only']:
+            scenarios = {name: request for name, request in scenarios.items() if name in options['only']}
+
+        results = {}
+        for name, request in scenarios.items():
+            for server in options['servers']:
+                urlconf, get_application = SERVERS[server]
+                # Many clients share one user and address; the write limits would throttle them
+                with override_settings(ROOT_URLCONF=urlconf, RATE_LIMIT={**settings.RATE_LIMIT, 'ENABLED': False}):
+                    application = get_application()
+                    run = self.run_wsgi if server == 'wsgi' else self.run_asgi
+                    with ThreadMonitor() as monitor:
+                        started = time.perf_counter()
+                        latencies, errors = run(application, request)
+                        elapsed = time.perf_counter() - started
+                result = self.summarize(latencies, errors, elapsed, monitor.peak)
+                results.setdefault(name, {})[server] = result
+                self.report(name, server, result)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'options': {k: options[k] for k in ('clients', 'requests', 'threads', 'slow_ms')},
+                           'scenarios': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote results to {options["output"]}'))
+
+    def build_scenarios(self, user):
+        hot_question = Question.objects.order_by('-answer_count').first()
+        answer = Answer.objects.filter(question=hot_question).first()
+        if not (hot_question and answer):
+            raise CommandError('No answered question found; run seed_benchmark_data first')
+
+        client = Client()
+        client.force_login(user)
+        # Any 32-character secret is a valid CSRF cookie and matching token
+        csrf = get_random_string(32)
+        auth = {
+            'Cookie': f'{client.cookies["sessionid"].key}={client.cookies["sessionid"].value}; csrftoken={csrf}',
+            'X-CSRFToken': csrf,
+            'X-Requested-With': 'XMLHttpRequest',
+        }
+        # Every client toggles its like an even number of times, so the data is left as it was
+        self.options['requests'] += self.options['requests'] % 2
+        return {
+            'home': Request(reverse('home')),
+            'question-list': Request(reverse('question-list')),
+            'question-detail': Request(reverse('question-detail', args=[hot_question.pk])),
+            'toggle-like': Request(reverse('toggle-like', args=[answer.pk]), method='POST', headers=auth),
+        }
+
+    def run_wsgi(self, application, request):
+        """
+        A threaded WSGI server: a worker thread is busy for the whole
+        exchange, including the time the client takes to send and receive
+        """
+        latencies, errors = [], 0
+        lock = threading.Lock()
+        finished = threading.Event()
+        remaining = [self.options['clients'] * self.options['requests']]
+
+        def serve(started):
+            nonlocal errors
+            time.sleep(self.slow)
+            statuses = []
+            response = application(self.environ(request), lambda status, headers, exc_info=None: statuses.append(status))
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            time.sleep(self.slow)
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+                errors += int(statuses[0].split()[0]) >= 400
+
+        def client(pool, left):
+            started = time.perf_counter()
+            future = pool.submit(serve, started)
+            future.add_done_callback(lambda f: done(pool, f, left - 1))
+
+        def done(pool, future, left):
+            nonlocal errors
+            if future.exception() is not None:
+                with lock:
+                    errors += 1
+            if left:
+                client(pool, left)
+            with lock:
+                remaining[0] -= 1
+                if not remaining[0]:
+                    finished.set()
+
+        with ThreadPoolExecutor(max_workers=self.options['threads']) as pool:
+            for _ in range(self.options['clients']):
+                client(pool, self.options['requests'])
+            finished.wait()
+        return latencies, errors
+
+    def run_asgi(self, application, request):
+        """
+        An ASGI server: waiting on slow clients costs no thread, only the
+        synchronous parts of a request (rendering, writes) take one
+        """
+        latencies, errors = [], 0
+
+        async def serve():
+            nonlocal errors
+            started = time.perf_counter()
+            received = False
+            status = []
+
+            async def receive():
+                nonlocal received
+                if not received:
+                    received = True
+                    await asyncio.sleep(self.slow)
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The client stays connected until the response is sent
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+                elif not message.get('more_body'):
+                    await asyncio.sleep(self.slow)
+
+            try:
+                await application(self.scope(request), receive, send)
+            except Exception:
+                errors += 1
+            else:
+                errors += status[0] >= 400
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        async def client():
+            for _ in range(self.options['requests']):
+                await serve()
+
+        async def main():
+            await asyncio.gather(*(client() for _ in range(self.options['clients'])))
+
+        asyncio.run(main())
+        return latencies, errors
+
+    def environ(self, request):
+        environ = {
+            'REQUEST_METHOD': request.method,
+            'PATH_INFO': request.path,
+            'QUERY_STRING': request.query,
+            'SCRIPT_NAME': '',
+            'SERVER_NAME': self.options['host'],
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'CONTENT_LENGTH': '0',
+            'HTTP_HOST': self.options['host'],
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http',
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in request.headers.items():
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+        return environ
+
+    def scope(self, request):
+        headers = [(b'host', self.options['host'].encode()), (b'content-length', b'0')]
+        headers += [(name.lower().encode(), value.encode()) for name, value in request.headers.items()]
+        return {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': request.method,
+            'scheme': 'http',
+            'path': request.path,
+            'raw_path': request.path.encode(),
+            'query_string': request.query.encode(),
+            'root_path': '',
+            'headers': headers,
+            'client': ('127.0.0.1', 50000),
+            'server': (self.options['host'], 80),
+        }
+
+    def summarize(self, latencies, errors, elapsed, peak_threads):
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'requests_per_second': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'peak_threads': peak_threads,
+        }
+
+    def report(self, name, server, result):
+        self.stdout.write(
+            f'{name:<16} {server:<5} {result["requests_per_second"]:>8.1f} req/s  '
+            f'p50 {result["p50_ms"]:>9.2f} ms  p99 {result["p99_ms"]:>9.2f} ms  '
+            f'{result["errors"]:>4} errors  {result["peak_threads"]:>4} threads'
+        )
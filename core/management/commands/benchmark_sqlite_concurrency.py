@@ -0,0 +1,165 @@
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from copy import deepcopy
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from questions.models import Question, Answer, Like
+from core.db import is_database_locked, run_write_transaction
+from core.stats import percentile
+
+PROFILES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}},
+    'production': {'ENGINE': 'core.backends.sqlite3', 'OPTIONS': settings.SQLITE_PRODUCTION_OPTIONS},
+}
+
+
+class Command(BaseCommand):
+    """
+    Compare the SQLite profiles under concurrent readers and writers
+    """
+    help = (
+        'Run reader threads (answer pages) against writer threads (like '
+        'toggles) on a scratch database per SQLite profile and report '
+        'throughput, latency and "database is locked" errors'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Reader threads')
+        parser.add_argument('--writers', type=int, default=4, help='Writer threads')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds to run each profile')
+        parser.add_argument('--users', type=int, default=50, help='Users (and so distinct likes) in the scratch dataset')
+        parser.add_argument('--answers', type=int, default=200, help='Answers in the scratch dataset')
+        parser.add_argument(
+            '--profiles',
+            nargs='+',
+            choices=sorted(PROFILES),
+            default=sorted(PROFILES),
+            help='Profiles to run',
+        )
+
+    def handle(self, *args, **options):
+        if options['readers'] < 0 or options['writers'] < 0 or options['readers'] + options['writers'] == 0:
+            raise CommandError('Run at least one reader or writer thread')
+        self.options = options
+        original = connections.settings['default']
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in options['profiles']:
+                self.use_database(profile, os.path.join(directory, f'{profile}.sqlite3'))
+                try:
+                    self.seed()
+                    self.report(profile, self.run())
+                finally:
+                    self.use_settings(original)
+
+    def use_settings(self, database):
+        connections['default'].close()
+        del connections['default']
+        connections.settings['default'] = database
+
+    def use_database(self, profile, name):
+        """
+        Point the default alias at a scratch database for the profile and
+        migrate it; writes then go through the same signals (counters, hot
+        scores, search) as in the app
+        """
+        database = deepcopy(connections.settings['default'])
+        database.update(deepcopy(PROFILES[profile]), NAME=name)
+        self.use_settings(database)
+        call_command('migrate', verbosity=0)
+
+    def seed(self):
+        users = User.objects.bulk_create(
+            User(username=f'concurrency_{i}', email=f'concurrency_{i}@example.com')
+            for i in range(self.options['users'])
+        )
+        question = Question.objects.create(
+            title='Concurrency benchmark', description='Scratch question', author=users[0]
+        )
+        Answer.objects.bulk_create(
+            Answer(question=question, author=random.choice(users), content=f'Answer {i}')
+            for i in range(self.options['answers'])
+        )
+        self.user_ids = [user.pk for user in users]
+        self.question_id = question.pk
+        self.answers = list(Answer.objects.filter(question=question))
+
+    def run(self):
+        """
+        Run every thread for --duration seconds; returns latencies and error counts
+        """
+        stop = threading.Event()
+        results = {'read': [], 'write': [], 'locked': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(operation, kind):
+            latencies, locked, errors = [], 0, 0
+            rng = random.Random()
+            try:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    try:
+                        operation(rng)
+                    except OperationalError as e:
+                        if not is_database_locked(e):
+                            raise
+                        locked += 1
+                    except Exception:
+                        errors += 1
+                    else:
+                        latencies.append((time.perf_counter() - start) * 1000)
+            finally:
+                connections['default'].close()
+                with lock:
+                    results[kind].extend(latencies)
+                    results['locked'] += locked
+                    results['errors'] += errors
+
+        threads = [threading.Thread(target=worker, args=(self.read, 'read')) for _ in range(self.options['readers'])]
+        threads += [threading.Thread(target=worker, args=(self.write, 'write')) for _ in range(self.options['writers'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(self.options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def read(self, rng):
+        """
+        What the answer list does: the question, then a page of answers
+        """
+        Question.objects.select_related('author').get(pk=self.question_id)
+        list(
+            Answer.objects.filter(question_id=self.question_id)
+            .select_related('author').order_by('-created_at', '-id')[:settings.ANSWERS_PER_PAGE]
+        )
+
+    def write(self, rng):
+        """
+        What the like button does, in a retried immediate transaction
+        """
+        answer = rng.choice(self.answers)
+        user = User(pk=rng.choice(self.user_ids))
+        run_write_transaction(Like.objects.toggle, answer, user)
+
+    def report(self, profile, results):
+        duration = self.options['duration']
+        self.stdout.write(f'{profile}:')
+        for kind in ('read', 'write'):
+            latencies = results[kind]
+            if not latencies:
+                self.stdout.write(f'  {kind + "s":<7} none completed')
+                continue
+            self.stdout.write(
+                f'  {kind + "s":<7} {len(latencies) / duration:>9.1f}/s  '
+                f'p50 {percentile(latencies, 0.50):>8.2f} ms  p99 {percentile(latencies, 0.99):>8.2f} ms  '
+                f'mean {statistics.mean(latencies):>8.2f} ms'
+            )
+        self.stdout.write(f'  locked  {results["locked"]:>9}  other errors {results["errors"]}')
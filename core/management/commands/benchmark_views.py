@@ -0,0 +1,239 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from contextlib import nullcontext
+from datetime import datetime, timezone
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from questions.models import Question, Answer, Like
+from core.cache import FRAGMENT_CACHE_ALIAS
+from core.page_cache import PAGE_CACHE_ALIAS
+from core.query_budget import record_queries
+from core.stats import percentile
+
+
+class Scenario:
+    """
+    One request to benchmark: a view, how to call it and as whom
+    """
+    def __init__(self, name, url, method='get', data=None, user=None, writes=False, prepare=None, ajax=False):
+        self.name = name
+        self.url = url
+        self.method = method
+        self.data = data
+        self.user = user
+        # Write scenarios run in a transaction that is rolled back every time
+        self.writes = writes
+        # Called before each request to create its target; returns the kwargs
+        # that reverse the URL name given as url
+        self.prepare = prepare
+        self.ajax = ajax
+
+
+class Command(BaseCommand):
+    """
+    Time every view against the current dataset (see seed_benchmark_data)
+    """
+    help = (
+        'Benchmark every view in questions, core and accounts: latency '
+        'percentiles, query counts and peak memory, optionally as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per view')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per view first')
+        parser.add_argument('--user', default='bench_staff', help='Username of the (staff) user to log in as')
+        parser.add_argument('--host', default='localhost', help='Host header to send, must be in ALLOWED_HOSTS')
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Clear the fragment and page caches before every request',
+        )
+        parser.add_argument('--only', nargs='+', metavar='NAME', help='Only run the named scenarios')
+        parser.add_argument('--output', help='Write machine-readable results to this JSON file')
+        parser.add_argument('--compare', help='JSON results of an earlier run to print deltas against')
+
+    def handle(self, *args, **options):
+        try:
+            self.user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'User "{options["user"]}" not found; run seed_benchmark_data first')
+        self.options = options
+        scenarios = self.build_scenarios()
+        if options['only']:
+            scenarios = [s for s in scenarios if s.name in options['only']]
+
+        results = {}
+        # Views are timed at full speed; the write limits would turn repeats into 429s
+        with override_settings(RATE_LIMIT={**settings.RATE_LIMIT, 'ENABLED': False}):
+            for scenario in scenarios:
+                results[scenario.name] = self.run(scenario)
+                self.report(scenario.name, results[scenario.name])
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)['views']
+            self.compare(results, baseline)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'meta': self.metadata(), 'views': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote results to {options["output"]}'))
+
+    def build_scenarios(self):
+        """
+        One scenario per view (and per notable mode of a view), pointed at the
+        hottest question and at rows the benchmark user owns
+        """
+        hot_question = Question.objects.order_by('-answer_count').first()
+        own_question = Question.objects.filter(author=self.user).first()
+        own_answer = Answer.objects.filter(author=self.user).first()
+        if not (hot_question and own_question and own_answer):
+            raise CommandError(f'"{self.user.username}" needs a question and an answer; run seed_benchmark_data first')
+        answer_ids = ','.join(str(pk) for pk in hot_question.answers.values_list('pk', flat=True)[:50])
+        word = hot_question.title.split()[0].lower()
+        user = self.user
+
+        def fresh_answer():
+            return {'pk': Answer.objects.create(question=own_question, author=user, content='Benchmark').pk}
+
+        return [
+            # core.views
+            Scenario('home', reverse('home')),
+            Scenario('home-hot', reverse('home') + '?sort=hot'),
+            Scenario('cache-stats', reverse('cache-stats'), user=user),
+            Scenario('query-stats', reverse('query-stats'), user=user),
+            # questions.views
+            Scenario('question-list', reverse('question-list')),
+            Scenario('question-list-deep', reverse('question-list') + '?page=50'),
+            Scenario('question-list-hot', reverse('question-list') + '?sort=hot'),
+            Scenario('question-list-cursor', reverse('question-list') + '?cursor='),
+            Scenario('question-search', reverse('question-search') + f'?q={word}'),
+            Scenario('question-detail', reverse('question-detail', args=[hot_question.pk])),
+            Scenario('question-detail-auth', reverse('question-detail', args=[hot_question.pk]), user=user),
+            Scenario('answer-post', reverse('question-detail', args=[hot_question.pk]), method='post',
+                     data={'content': 'Benchmark answer'}, user=user, writes=True),
+            Scenario('question-create', reverse('question-create'), user=user),
+            Scenario('question-update', reverse('question-update', args=[own_question.pk]), user=user),
+            Scenario('question-delete', reverse('question-delete', args=[own_question.pk]), user=user),
+            Scenario('answer-update', reverse('answer-update', args=[own_answer.pk]), user=user),
+            Scenario('answer-delete', 'answer-delete', method='post', user=user, writes=True, prepare=fresh_answer),
+            Scenario('answer-state', reverse('answer-state') + f'?ids={answer_ids}', user=user),
+            Scenario('toggle-like', reverse('toggle-like', args=[own_answer.pk]), method='post',
+                     user=user, writes=True, ajax=True),
+            # accounts.views
+            Scenario('login', reverse('login')),
+            Scenario('register', reverse('register')),
+            Scenario('profile', reverse('profile'), user=user),
+            Scenario('logout', reverse('logout'), user=user),
+        ]
+
+    def request(self, client, scenario):
+        """
+        Issue one request; write scenarios are rolled back afterwards
+        """
+        if scenario.user and '_auth_user_id' not in client.session:
+            client.force_login(scenario.user)
+        headers = {'X-Requested-With': 'XMLHttpRequest'} if scenario.ajax else {}
+        with transaction.atomic() if scenario.writes else nullcontext():
+            url = scenario.url
+            if scenario.prepare:
+                url = reverse(url, kwargs=scenario.prepare())
+            if self.options['cold']:
+                caches[FRAGMENT_CACHE_ALIAS].clear()
+                caches[PAGE_CACHE_ALIAS].clear()
+            with record_queries() as recorder:
+                start = time.perf_counter()
+                response = getattr(client, scenario.method)(url, scenario.data, headers=headers)
+                elapsed = time.perf_counter() - start
+            if scenario.writes:
+                transaction.set_rollback(True)
+        if response.status_code >= 400:
+            raise CommandError(f'{scenario.name}: {scenario.method.upper()} {url} returned {response.status_code}')
+        return elapsed, recorder.count
+
+    def run(self, scenario):
+        client = Client(HTTP_HOST=self.options['host'])
+        for _ in range(self.options['warmup']):
+            self.request(client, scenario)
+
+        latencies, queries = [], []
+        for _ in range(self.options['iterations']):
+            elapsed, count = self.request(client, scenario)
+            latencies.append(elapsed * 1000)
+            queries.append(count)
+
+        # Peak memory on a separate pass: tracing slows every allocation down
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            self.request(client, scenario)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'iterations': len(latencies),
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p90_ms': round(percentile(latencies, 0.90), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'max_ms': round(max(latencies), 3),
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'queries': max(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<24} p50 {result["p50_ms"]:>9.2f} ms  p90 {result["p90_ms"]:>9.2f} ms  '
+            f'p99 {result["p99_ms"]:>9.2f} ms  {result["queries"]:>4} queries  '
+            f'{result["peak_memory_kb"]:>9.1f} KiB peak'
+        )
+
+    def compare(self, results, baseline):
+        self.stdout.write('\nChange against baseline (p50, queries, peak memory):')
+        for name, result in results.items():
+            before = baseline.get(name)
+            if not before:
+                continue
+            change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+            self.stdout.write(
+                f'{name:<24} {change:>+7.1f}%  {result["queries"] - before["queries"]:>+4} queries  '
+                f'{result["peak_memory_kb"] - before["peak_memory_kb"]:>+9.1f} KiB'
+            )
+
+    def metadata(self):
+        """
+        What the numbers were measured against, so runs can be compared
+        """
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'iterations': self.options['iterations'],
+            'cold': self.options['cold'],
+            'dataset': {
+                'users': User.objects.count(),
+                'questions': Question.objects.count(),
+                'answers': Answer.objects.count(),
+                'likes': Like.objects.count(),
+                'max_answers_per_question': Question.objects.order_by('-answer_count')
+                .values_list('answer_count', flat=True).first(),
+            },
+        }
@@ -0,0 +1,51 @@
+import time
+from importlib import import_module
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.db import run_write_transaction
+
+
+class Command(BaseCommand):
+    """
+    Batched replacement for clearsessions
+    """
+    help = (
+        'Delete expired sessions from the database in bounded batches, so '
+        'the session table is never locked by one long DELETE'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Sessions deleted per transaction')
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.05,
+            help='Seconds to sleep between batches, to let other writers in',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        if not hasattr(store, 'get_model_class'):
+            self.stdout.write('The session engine keeps no sessions in the database')
+            return
+
+        model = store.get_model_class()
+        now = timezone.now()
+        total = 0
+        while True:
+            # expire_date is indexed, so each batch is a short range scan
+            pks = list(
+                model.objects.filter(expire_date__lt=now).order_by()
+                .values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not pks:
+                break
+            deleted, _ = run_write_transaction(model.objects.filter(pk__in=pks).delete)
+            total += deleted
+            if len(pks) < options['batch_size']:
+                break
+            time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {total} expired session(s)'))
@@ -0,0 +1,175 @@
+import random
+from itertools import accumulate, islice
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from accounts.models import Profile
+from questions.models import Question, Answer, Like
+from questions import ranking
+
+WORDS = (
+    'python django database query index cache latency memory thread process '
+    'request response template model view form user answer question search '
+    'ranking page cursor offset sqlite postgres replica queue worker signal '
+    'session cookie token rate limit deploy server static compress benchmark'
+).split()
+
+
+class Command(BaseCommand):
+    """
+    Fill the database with a large synthetic dataset for benchmarking views
+    """
+    help = (
+        'Bulk-create users, profiles, questions, answers and likes with a '
+        'realistic skew: a few hot questions draw a large share of the activity'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Number of users to create')
+        parser.add_argument('--questions', type=int, default=5000, help='Number of questions to create')
+        parser.add_argument('--answers', type=int, default=20000, help='Number of answers to create')
+        parser.add_argument('--likes', type=int, default=50000, help='Number of likes to create (at most one per user and answer)')
+        parser.add_argument(
+            '--hot-questions',
+            type=int,
+            default=5,
+            help='Number of hot questions that draw --hot-share of all answers and likes',
+        )
+        parser.add_argument(
+            '--hot-share',
+            type=float,
+            default=0.3,
+            help='Fraction of answers and likes that go to the hot questions',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT')
+        parser.add_argument('--prefix', default='bench', help='Username prefix of the generated users')
+        parser.add_argument('--password', default='benchmark', help='Password shared by every generated user')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, for reproducible datasets')
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete users with the prefix (and everything they own) first',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['questions'] < 1:
+            raise CommandError('At least one user and one question are needed')
+        if not 0 <= options['hot_share'] <= 1:
+            raise CommandError('--hot-share must be between 0 and 1')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+
+        if options['clear']:
+            deleted, _ = User.objects.filter(username__startswith=f'{prefix}_').delete()
+            self.stdout.write(f'Deleted {deleted} existing benchmark row(s)')
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f'Users prefixed "{prefix}_" already exist; pass --clear or another --prefix')
+
+        user_ids = self.create_users(prefix, options['users'], options['password'])
+        question_ids = self.create_questions(user_ids, options['questions'])
+        hot = question_ids[:min(options['hot_questions'], len(question_ids))]
+        answers = self.create_answers(user_ids, question_ids, hot, options['answers'], options['hot_share'])
+        self.create_likes(user_ids, answers, hot, options['likes'], options['hot_share'])
+
+        # Bulk inserts skip the model signals, so derive counters, the search
+        # index and hot scores from the finished tables instead
+        call_command('repair_counters', batch_size=self.batch_size, stdout=self.stdout)
+        call_command('rebuild_search_index', batch_size=self.batch_size, stdout=self.stdout)
+        ranking.rebuild(batch_size=self.batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(user_ids)} users, {len(question_ids)} questions, {len(answers)} answers; '
+            f'staff user "{prefix}_staff" (password "{options["password"]}")'
+        ))
+
+    def insert(self, model, objects):
+        """
+        Insert objects in batches, one transaction per batch; returns their primary keys
+        """
+        pks = []
+        objects = iter(objects)
+        while batch := list(islice(objects, self.batch_size)):
+            with transaction.atomic():
+                created = model.objects.bulk_create(batch)
+            pks.extend(obj.pk for obj in created)
+        return pks
+
+    def text(self, words):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words))
+
+    def create_users(self, prefix, count, password):
+        # Hashing is slow by design; every generated user shares one hash
+        hashed = make_password(password)
+        names = [f'{prefix}_staff'] + [f'{prefix}_{i}' for i in range(1, count)]
+        user_ids = self.insert(User, (
+            User(
+                username=name,
+                email=f'{name}@example.com',
+                password=hashed,
+                is_staff=(i == 0),
+            )
+            for i, name in enumerate(names)
+        ))
+        self.insert(Profile, (Profile(user_id=pk, bio=self.text(12)) for pk in user_ids))
+        self.stdout.write(f'Created {len(user_ids)} users and profiles')
+        return user_ids
+
+    def create_questions(self, user_ids, count):
+        # The staff user (first) authors the first question and answer, so
+        # benchmarks always have owned rows for the edit and delete views
+        question_ids = self.insert(Question, (
+            Question(
+                title=self.text(8).capitalize() + '?',
+                description=self.text(60),
+                author_id=user_ids[0] if i == 0 else self.rng.choice(user_ids),
+            )
+            for i in range(count)
+        ))
+        self.stdout.write(f'Created {len(question_ids)} questions')
+        return question_ids
+
+    def skewed_choices(self, population, hot, count, hot_share):
+        """
+        Draw count items: hot_share of them evenly from the hot items, the
+        rest from the whole population with a Zipf-like long tail
+        """
+        hot_count = int(count * hot_share) if hot else 0
+        cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(population))))
+        picks = [self.rng.choice(hot) for _ in range(hot_count)]
+        picks += self.rng.choices(population, cum_weights=cum_weights, k=count - hot_count)
+        return picks
+
+    def create_answers(self, user_ids, question_ids, hot, count, hot_share):
+        targets = self.skewed_choices(question_ids, hot, count, hot_share)
+        answer_ids = self.insert(Answer, (
+            Answer(
+                question_id=question_id,
+                author_id=user_ids[0] if i == 0 else self.rng.choice(user_ids),
+                content=self.text(80),
+            )
+            for i, question_id in enumerate(targets)
+        ))
+        self.stdout.write(f'Created {len(answer_ids)} answers')
+        return list(zip(answer_ids, targets))
+
+    def create_likes(self, user_ids, answers, hot, count, hot_share):
+        if not answers:
+            return
+        hot = set(hot)
+        answer_ids = [answer_id for answer_id, _ in answers]
+        hot_answers = [answer_id for answer_id, question_id in answers if question_id in hot]
+        # A like is unique per (answer, user): draw pairs until enough distinct ones exist
+        # (capped well below every possible pair, where drawing would crawl)
+        count = min(count, len(answer_ids) * len(user_ids) // 2)
+        pairs = set()
+        targets = iter(())
+        while len(pairs) < count:
+            answer_id = next(targets, None)
+            if answer_id is None:
+                targets = iter(self.skewed_choices(answer_ids, hot_answers, count - len(pairs), hot_share))
+                continue
+            pairs.add((answer_id, self.rng.choice(user_ids)))
+        created = self.insert(Like, (Like(answer_id=answer_id, user_id=user_id) for answer_id, user_id in pairs))
+        self.stdout.write(f'Created {len(created)} likes')
@@ -0,0 +1,250 @@
+import logging
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from . import page_cache, replicas, static_files
+from .query_budget import budget_for, query_stats, record_queries, record_request, watch_connections
+
+logger = logging.getLogger(__name__)
+
+
+class DualModeMiddleware:
+    """
+    Base for middleware that runs natively under both WSGI and ASGI, so
+    async views are not pushed back onto a thread: subclasses implement
+    call() for the sync chain and acall() for the async one
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.acall(request)
+        return self.call(request)
+
+
+class AnonymousPageCacheMiddleware(DualModeMiddleware):
+    """
+    Serve whole pages to logged-out readers from the page cache.
+
+    Only GET requests for the views named in PAGE_CACHE['VIEWS'] are cached,
+    and only for visitors without a session or messages cookie, so nothing
+    personal is ever stored. Must sit above SessionMiddleware so cache hits
+    never touch the session or the database.
+    """
+    def call(self, request):
+        if not self.is_cacheable_request(request):
+            return self.get_response(request)
+
+        key, cached, refreshing = self.lookup(request)
+        if cached is not None:
+            return self.revalidate(request, cached)
+        try:
+            response = self.get_response(request)
+            self.store(key, request, response, refreshing)
+        finally:
+            if refreshing:
+                page_cache.release_refresh(key)
+        return response
+
+    async def acall(self, request):
+        if not self.is_cacheable_request(request):
+            return await self.get_response(request)
+
+        # The cache backend may block (file, memcached), so it is used from a thread
+        key, cached, refreshing = await sync_to_async(self.lookup)(request)
+        if cached is not None:
+            return self.revalidate(request, cached)
+        try:
+            response = await self.get_response(request)
+            await sync_to_async(self.store)(key, request, response, refreshing)
+        finally:
+            if refreshing:
+                await sync_to_async(page_cache.release_refresh)(key)
+        return response
+
+    def lookup(self, request):
+        """
+        Find the page in the cache; returns its key, the response to serve
+        if there is one, and whether this request is to re-render it
+        """
+        key = page_cache.page_key(request)
+        entry = page_cache.get_entry(key)
+        if entry is not None:
+            state = page_cache.freshness(entry)
+            if state == page_cache.FRESH:
+                return key, page_cache.build_response(entry, 'HIT'), False
+            if state == page_cache.STALE:
+                if not page_cache.acquire_refresh(key):
+                    # Someone else is already re-rendering this page
+                    return key, page_cache.build_response(entry, 'STALE'), False
+                return key, None, True
+        return key, None, False
+
+    def revalidate(self, request, cached):
+        """
+        A 304 for a client already holding the cached page (by its ETag,
+        see core.conditional), otherwise the page itself
+        """
+        if not cached.has_header('ETag'):
+            return cached
+        return get_conditional_response(request, etag=cached['ETag'], response=cached) or cached
+
+    def store(self, key, request, response, refreshing=False):
+        """
+        Cache the rendered page; a stale page that re-renders as something
+        not to be cached (a 404 once its question is deleted, say) is dropped
+        rather than served to everyone else until it expires
+        """
+        if self.is_cacheable_response(response):
+            page_cache.store(key, request, response)
+            response['X-Page-Cache'] = 'MISS'
+        elif refreshing:
+            page_cache.delete_entry(key)
+
+    def is_cacheable_request(self, request):
+        """
+        Anonymous GET for one of the cached views
+        """
+        if not page_cache.config('ENABLED') or request.method != 'GET':
+            return False
+        bypass = (settings.SESSION_COOKIE_NAME, *page_cache.config('BYPASS_COOKIES'))
+        if any(name in request.COOKIES for name in bypass):
+            return False
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return match.url_name in page_cache.config('VIEWS')
+
+    def is_cacheable_response(self, response):
+        """
+        Plain 200 responses that do not start a session or set any other cookie
+        """
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and 'private' not in response.get('Cache-Control', '')
+            and 'no-store' not in response.get('Cache-Control', '')
+        )
+
+
+class QueryBudgetMiddleware(DualModeMiddleware):
+    """
+    Count the queries of every request against its view's budget.
+
+    Requests over budget are logged with their repeated query shapes so
+    N+1 regressions show up in the logs before they show up in latency.
+    """
+    def call(self, request):
+        if not settings.QUERY_BUDGET['ENABLED']:
+            return self.get_response(request)
+
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        self.check(request, recorder)
+        return response
+
+    async def acall(self, request):
+        if not settings.QUERY_BUDGET['ENABLED']:
+            return await self.get_response(request)
+
+        # The async ORM runs every query in one thread shared by all the
+        # requests in flight, so the recorder goes in this request's context
+        # and that thread's connections only look it up
+        await sync_to_async(watch_connections)()
+        with record_request() as recorder:
+            response = await self.get_response(request)
+        self.check(request, recorder)
+        return response
+
+    def check(self, request, recorder):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else '<unresolved>'
+        budget = budget_for(view_name)
+        over_budget = recorder.count > budget
+        query_stats.record(view_name, recorder, over_budget)
+        if over_budget:
+            logger.warning(
+                'Query budget exceeded for %s %s (view %s): %d queries (budget %d) in %.1f ms; repeated: %s',
+                request.method, request.path, view_name, recorder.count, budget,
+                recorder.duration * 1000, recorder.duplicates or 'none',
+            )
+
+
+class ReplicaStickinessMiddleware(DualModeMiddleware):
+    """
+    Pin a visitor to the primary database for a while after they write.
+
+    A request that writes to a replicated model sets a cookie lasting
+    REPLICA_ROUTING['STICKY_SECONDS']; requests carrying it read from the
+    primary, so the writer sees their own changes before the replicas do.
+    """
+    def call(self, request):
+        if not replicas.config('REPLICAS'):
+            return self.get_response(request)
+
+        token = replicas.start_request(pinned=self.is_pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = replicas.end_request(token)
+        return self.finish(request, response, wrote)
+
+    async def acall(self, request):
+        if not replicas.config('REPLICAS'):
+            return await self.get_response(request)
+
+        # The routing state is mutable, so writes made in sync_to_async
+        # threads (which run in a copy of this context) are seen here
+        token = replicas.start_request(pinned=self.is_pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            wrote = replicas.end_request(token)
+        return self.finish(request, response, wrote)
+
+    def is_pinned(self, request):
+        return replicas.config('COOKIE') in request.COOKIES
+
+    def finish(self, request, response, wrote):
+        if wrote:
+            response.set_cookie(
+                replicas.config('COOKIE'),
+                '1',
+                max_age=replicas.config('STICKY_SECONDS'),
+                secure=request.is_secure(),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class StaticFilesMiddleware(DualModeMiddleware):
+    """
+    Serve collected static files in the production static mode, before any
+    other middleware runs, with precompressed variants and long-lived
+    caching (see core.static_files)
+    """
+    def call(self, request):
+        if static_files.config('SERVE'):
+            response = static_files.serve(request)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def acall(self, request):
+        if static_files.config('SERVE'):
+            # Reads the file from disk, so off the event loop
+            response = await sync_to_async(static_files.serve)(request)
+            if response is not None:
+                return response
+        return await self.get_response(request)
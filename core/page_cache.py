@@ -0,0 +1,139 @@
+"""
+Full-page cache for anonymous readers with tag-based invalidation.
+
+Views tag the response with the objects it displays (tag_page). Tags share
+the version counters of the fragment cache (core.cache), which model signals
+already bump whenever a question, answer or like changes, so a stored page
+records the version of each tag it was rendered with and is stale as soon as
+any of them moves on. Nothing has to be found and deleted on purge.
+
+Stale pages are served stale-while-revalidate: the first request to notice
+takes a short refresh lock and re-renders, while concurrent requests keep
+getting the stale copy, so purging a hot page does not stampede the database.
+"""
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from .cache import bump_version, get_versions
+
+PAGE_CACHE_ALIAS = 'pages'
+
+FRESH = 'fresh'
+STALE = 'stale'
+
+# Response headers that must never be replayed to another visitor
+_PRIVATE_HEADERS = {'set-cookie'}
+
+
+def config(name):
+    """
+    Read one PAGE_CACHE setting
+    """
+    return settings.PAGE_CACHE[name]
+
+
+def page_cache():
+    return caches[PAGE_CACHE_ALIAS]
+
+
+def tag_page(request, kind, *idents):
+    """
+    Record that the page being rendered shows these objects of the given kind
+    """
+    tags = getattr(request, 'page_cache_tags', None)
+    if tags is None:
+        tags = request.page_cache_tags = set()
+    tags.update((kind, ident) for ident in idents)
+
+
+def purge_tag(kind, ident):
+    """
+    Mark every cached page showing this object as stale
+    """
+    bump_version(kind, ident)
+
+
+def tag_versions(tags):
+    """
+    Current version of each (kind, ident) tag, one cache round trip per kind
+    """
+    by_kind = defaultdict(list)
+    for kind, ident in tags:
+        by_kind[kind].append(ident)
+    versions = {}
+    for kind, idents in by_kind.items():
+        for ident, version in get_versions(kind, idents).items():
+            versions[(kind, ident)] = version
+    return versions
+
+
+def page_key(request):
+    return f'page:{request.get_full_path()}'
+
+
+def get_entry(key):
+    return page_cache().get(key)
+
+
+def store(key, request, response):
+    """
+    Store a rendered response together with the versions of its tags.
+    Pages are only served to requests without cookies, so the response
+    varies on Cookie for downstream caches, stored copy included
+    """
+    patch_vary_headers(response, ('Cookie',))
+    tags = getattr(request, 'page_cache_tags', set())
+    entry = {
+        'content': response.content,
+        'status': response.status_code,
+        'headers': [
+            (name, value) for name, value in response.items()
+            if name.lower() not in _PRIVATE_HEADERS
+        ],
+        'tags': list(tag_versions(tags).items()),
+        'stored_at': time.time(),
+    }
+    page_cache().set(key, entry, config('STALE_TIMEOUT'))
+
+
+def delete_entry(key):
+    page_cache().delete(key)
+
+
+def freshness(entry):
+    """
+    FRESH if the page is young enough and none of its tags moved on,
+    STALE if it may still be served while it is regenerated, else None
+    """
+    age = time.time() - entry['stored_at']
+    if age >= config('STALE_TIMEOUT'):
+        return None
+    if age >= config('TIMEOUT'):
+        return STALE
+    tags = [tag for tag, _ in entry['tags']]
+    current = tag_versions(tags)
+    if any(current.get(tag) != version for tag, version in entry['tags']):
+        return STALE
+    return FRESH
+
+
+def acquire_refresh(key):
+    """
+    Take the right to regenerate a stale page; only one request gets it
+    """
+    return page_cache().add(f'lock:{key}', 1, config('LOCK_TIMEOUT'))
+
+
+def release_refresh(key):
+    page_cache().delete(f'lock:{key}')
+
+
+def build_response(entry, status):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for name, value in entry['headers']:
+        response[name] = value
+    response['X-Page-Cache'] = status
+    return response
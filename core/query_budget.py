@@ -0,0 +1,174 @@
+"""
+Per-request SQL query accounting.
+
+QueryRecorder hooks every database connection through execute_wrapper and
+records how many statements a request ran, how long they took and which SQL
+shapes ran more than once (the usual sign of an N+1 loop). Under ASGI the
+requests share one thread's connection, so a request's recorder is kept in a
+context variable instead, read by one wrapper installed on the connection
+for good (record_request). QueryStats folds
+those per-request numbers into per-view histograms for the staff endpoint.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+
+# Upper bounds of the histogram buckets; the last bucket is open-ended
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+TIME_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000)
+
+
+def config(name):
+    """
+    Read one QUERY_BUDGET setting
+    """
+    return settings.QUERY_BUDGET[name]
+
+
+def budget_for(view_name):
+    return config('VIEWS').get(view_name, config('DEFAULT'))
+
+
+class QueryRecorder:
+    """
+    execute_wrapper that records the statements run while it is installed
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.signatures = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            # Parameters are kept out of the SQL, so equal text means the same query shape
+            self.signatures[sql] += 1
+
+    @property
+    def duplicates(self):
+        """
+        Query shapes that ran more than once, with their counts
+        """
+        return {sql: count for sql, count in self.signatures.items() if count > 1}
+
+
+@contextmanager
+def record_queries(using=None):
+    """
+    Record the queries run inside the block on one or all connections
+    """
+    recorder = QueryRecorder()
+    aliases = [using] if using else list(connections)
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+# The recorder of the request whose code is running, for record_request
+_current = ContextVar('query_recorder', default=None)
+
+
+def _record_current(execute, sql, params, many, context):
+    recorder = _current.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def watch_connections():
+    """
+    Install the record_request wrapper on this thread's connections, once;
+    it passes queries through untouched while no request is recording
+    """
+    for alias in connections:
+        wrappers = connections[alias].execute_wrappers
+        if _record_current not in wrappers:
+            wrappers.append(_record_current)
+
+
+@contextmanager
+def record_request():
+    """
+    Record the queries run in this context, and in the sync_to_async calls
+    made from it, on connections prepared by watch_connections; concurrent
+    requests sharing a connection each count only their own
+    """
+    recorder = QueryRecorder()
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+
+
+def _bucket(value, bounds):
+    for bound in bounds:
+        if value <= bound:
+            return f'<={bound}'
+    return f'>{bounds[-1]}'
+
+
+class QueryStats:
+    """
+    Per-process query histograms, by view name
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(self._empty)
+
+    @staticmethod
+    def _empty():
+        return {
+            'requests': 0,
+            'queries': 0,
+            'max_queries': 0,
+            'time_ms': 0.0,
+            'over_budget': 0,
+            'duplicate_queries': 0,
+            'count_histogram': Counter(),
+            'time_histogram': Counter(),
+        }
+
+    def record(self, view_name, recorder, over_budget=False):
+        duration_ms = recorder.duration * 1000
+        with self._lock:
+            stats = self._views[view_name]
+            stats['requests'] += 1
+            stats['queries'] += recorder.count
+            stats['max_queries'] = max(stats['max_queries'], recorder.count)
+            stats['time_ms'] += duration_ms
+            stats['over_budget'] += int(over_budget)
+            stats['duplicate_queries'] += sum(count - 1 for count in recorder.duplicates.values())
+            stats['count_histogram'][_bucket(recorder.count, COUNT_BUCKETS)] += 1
+            stats['time_histogram'][_bucket(duration_ms, TIME_BUCKETS_MS)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            views = {}
+            for view_name, stats in self._views.items():
+                views[view_name] = dict(
+                    stats,
+                    budget=budget_for(view_name),
+                    mean_queries=round(stats['queries'] / stats['requests'], 2),
+                    time_ms=round(stats['time_ms'], 3),
+                    count_histogram=dict(stats['count_histogram']),
+                    time_histogram=dict(stats['time_histogram']),
+                )
+            return views
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+query_stats = QueryStats()
+
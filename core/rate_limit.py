@@ -0,0 +1,153 @@
+"""
+Token-bucket rate limiting for write views, kept in the cache.
+
+Each view named in RATE_LIMIT['VIEWS'] has a bucket per user and per client
+IP holding up to `burst` tokens, refilled at `per_minute`; an unsafe request
+takes one token from each of its buckets or is turned away with 429 and a
+Retry-After telling the client when a token will be back.
+
+A bucket is one cache entry, the time (in ms) at which it will be full
+again if no more tokens are taken, moved forward one refill interval per
+request with the cache's atomic incr(), as the cache has no compare-and-set.
+A request is allowed while that time is at most `burst` intervals ahead of
+now. Only a bucket that had filled up is reset with a plain set(), where two
+simultaneous requests may both be let through.
+"""
+import math
+import time
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.shortcuts import render
+from .db import SAFE_METHODS
+
+RATE_LIMIT_CACHE_ALIAS = 'ratelimit'
+# Idle buckets are reset from scratch, so entries only need to outlive a burst
+BUCKET_TIMEOUT = 24 * 60 * 60
+
+
+def config(name):
+    """
+    Read one RATE_LIMIT setting
+    """
+    return settings.RATE_LIMIT[name]
+
+
+def limiter_cache():
+    return caches[RATE_LIMIT_CACHE_ALIAS]
+
+
+def client_ip(request):
+    """
+    The client's address: REMOTE_ADDR, or the last (proxy-appended) entry of
+    RATE_LIMIT['IP_HEADER'] behind a trusted reverse proxy
+    """
+    header = config('IP_HEADER')
+    if header and request.META.get(header):
+        return request.META[header].split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def buckets_for(name, request, user):
+    """
+    (key, burst, per_minute) for each bucket a request to the view takes from
+    """
+    limits = config('VIEWS').get(name, {})
+    buckets = []
+    if 'USER' in limits and user.is_authenticated:
+        buckets.append((f'ratelimit:{name}:user:{user.pk}', *limits['USER']))
+    if 'IP' in limits:
+        buckets.append((f'ratelimit:{name}:ip:{client_ip(request)}', *limits['IP']))
+    return buckets
+
+
+def take(key, burst, per_minute, now):
+    """
+    Take a token from one bucket; returns (the milliseconds to refund if the
+    request is turned away, seconds until a token is available or 0)
+    """
+    cache = limiter_cache()
+    interval = round(60000 / per_minute)
+    now_ms = int(now * 1000)
+    cache.add(key, now_ms, timeout=BUCKET_TIMEOUT)
+    try:
+        tat = cache.incr(key, interval)
+    except ValueError:
+        # Expired between add() and incr()
+        tat = now_ms
+    if tat - interval < now_ms:
+        # The bucket had filled up: restart the schedule from now
+        tat = now_ms + interval
+        cache.set(key, tat, timeout=BUCKET_TIMEOUT)
+    wait = tat - now_ms - burst * interval
+    return interval, max(math.ceil(wait / 1000), 1) if wait > 0 else 0
+
+
+def check(name, request, user):
+    """
+    Take a token from each of the request's buckets; returns 0 when allowed,
+    otherwise the Retry-After in seconds (and no bucket is charged)
+    """
+    if not config('ENABLED'):
+        return 0
+    now = time.time()
+    taken, retry_after = [], 0
+    for key, burst, per_minute in buckets_for(name, request, user):
+        interval, wait = take(key, burst, per_minute, now)
+        taken.append((key, interval))
+        retry_after = max(retry_after, wait)
+    if retry_after:
+        for key, interval in taken:
+            try:
+                limiter_cache().decr(key, interval)
+            except ValueError:
+                pass
+    return retry_after
+
+
+def too_many_requests(request, retry_after):
+    """
+    429 as JSON for AJAX requests, otherwise as a page
+    """
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        response = JsonResponse(
+            {'status': 'error', 'message': 'Too many requests', 'retry_after': retry_after},
+            status=429,
+        )
+    else:
+        response = render(request, '429.html', {'retry_after': retry_after}, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(name):
+    """
+    Throttle a view's unsafe requests with the buckets configured for `name`
+    (its URL name) in RATE_LIMIT['VIEWS']; GET requests pass straight through.
+    Place it above write_transaction so a throttled request never takes the
+    write lock.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in SAFE_METHODS:
+                    user = await request.auser()
+                    # The cache backend may block (file, memcached), so it is used from a thread
+                    retry_after = await sync_to_async(check)(name, request, user)
+                    if retry_after:
+                        return too_many_requests(request, retry_after)
+                return await view_func(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                retry_after = check(name, request, request.user)
+                if retry_after:
+                    return too_many_requests(request, retry_after)
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
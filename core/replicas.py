@@ -0,0 +1,110 @@
+"""
+Read-replica routing with read-your-writes stickiness.
+
+PrimaryReplicaRouter sends reads of the models in REPLICA_ROUTING['MODELS']
+to a random replica and every write to the primary (default) database.
+Replicas lag behind the primary, so once a request writes, the rest of it
+reads from the primary, and ReplicaStickinessMiddleware sets a short-lived
+cookie that pins the visitor's following requests to the primary for
+REPLICA_ROUTING['STICKY_SECONDS'] so they see their own new rows.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+def config(name):
+    """
+    Read one REPLICA_ROUTING setting
+    """
+    return settings.REPLICA_ROUTING[name]
+
+
+class RoutingState:
+    """
+    Per-request routing flags; mutated in place so changes made in a sync
+    view running in another thread are seen by the middleware
+    """
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar('replica_routing_state', default=None)
+
+
+def current_state():
+    state = _state.get()
+    if state is None:
+        # Outside a request (shell, management commands): one state per context
+        state = RoutingState()
+        _state.set(state)
+    return state
+
+
+def start_request(pinned):
+    """
+    Give a request its own routing state; returns a token for end_request()
+    """
+    return _state.set(RoutingState(pinned))
+
+
+def end_request(token):
+    """
+    Restore the routing state from before start_request(); returns whether
+    the request wrote to the primary
+    """
+    wrote = _state.get().wrote
+    _state.reset(token)
+    return wrote
+
+
+@contextmanager
+def pin_primary():
+    """
+    Read everything from the primary inside the block, e.g. for read-modify-write;
+    a write inside the block keeps the pin for the rest of the request
+    """
+    state = current_state()
+    previous = state.pinned
+    state.pinned = True
+    try:
+        yield
+    finally:
+        state.pinned = previous or state.wrote
+
+
+class PrimaryReplicaRouter:
+    """
+    Reads of the configured models go to a replica unless the current
+    request is pinned to the primary; all writes go to the primary
+    """
+    def is_routed(self, model):
+        return bool(config('REPLICAS')) and model._meta.label_lower in config('MODELS')
+
+    def db_for_read(self, model, **hints):
+        if not self.is_routed(model):
+            return None
+        if current_state().pinned:
+            return DEFAULT_DB_ALIAS
+        return random.choice(config('REPLICAS'))
+
+    def db_for_write(self, model, **hints):
+        if self.is_routed(model):
+            state = current_state()
+            state.wrote = state.pinned = True
+        # Explicitly the primary: objects read from a replica would otherwise
+        # be saved back to the database they came from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *config('REPLICAS')}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary and share its schema
+        return None
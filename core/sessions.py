@@ -0,0 +1,54 @@
+"""
+Cache-backed sessions with a write-behind database copy.
+
+Sessions are read from and written to the 'sessions' cache. The database
+row is there so sessions survive a cache restart or eviction, and is
+written when a session is created or who it is logged in as changes, and
+otherwise at most once every SESSION_WRITE_BEHIND_SECONDS per session, so
+other session changes no longer cost a database write each.
+"""
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends import cached_db
+
+AUTH_KEYS = (SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY)
+
+
+class SessionStore(cached_db.SessionStore):
+    cache_key_prefix = 'core.sessions'
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # Login state of the database copy, when known
+        self._stored_auth = None
+
+    def _auth_state(self, data):
+        return tuple(data.get(key) for key in AUTH_KEYS)
+
+    def _written_key(self, session_key):
+        return f'{self.cache_key_prefix}{session_key}:written'
+
+    def load(self):
+        data = super().load()
+        self._stored_auth = self._auth_state(data)
+        return data
+
+    def save(self, must_create=False):
+        if (
+            must_create
+            or self.session_key is None
+            or self._stored_auth != self._auth_state(self._get_session())
+            or self._cache.add(self._written_key(self.session_key), True, settings.SESSION_WRITE_BEHIND_SECONDS)
+        ):
+            super().save(must_create=must_create)
+            self._stored_auth = self._auth_state(self._get_session())
+            self._cache.set(self._written_key(self.session_key), True, settings.SESSION_WRITE_BEHIND_SECONDS)
+            return
+        # Written to the database recently: only the cache is updated
+        self._cache.set(self.cache_key, self._get_session(), self.get_expiry_age())
+
+    def delete(self, session_key=None):
+        session_key = session_key or self.session_key
+        super().delete(session_key)
+        if session_key is not None:
+            self._cache.delete(self._written_key(session_key))
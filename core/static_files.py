@@ -0,0 +1,179 @@
+"""
+Production static files: hashed, precompressed and served in-process.
+
+CompressedManifestStaticFilesStorage collects files under content-hashed
+names, so a URL always refers to the same bytes and can be cached forever,
+and writes gzip and (when the brotli package is installed) brotli variants
+of text assets next to them at collectstatic time. StaticFilesMiddleware
+serves STATIC_ROOT through serve(), picking the smallest variant the
+client accepts, with a far-future immutable Cache-Control on hashed names.
+"""
+import gzip
+import mimetypes
+import os
+import threading
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.files.base import ContentFile
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional: gzip variants only
+    brotli = None
+
+
+def config(name):
+    """
+    Read one STATIC_FILES setting
+    """
+    return settings.STATIC_FILES[name]
+
+
+def compressors():
+    """
+    Encodings to precompress for, with the file suffix and compressor of each
+    """
+    # mtime=0 keeps the gzip bytes identical between builds of the same file
+    encoders = [('gzip', '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        encoders.insert(0, ('br', '.br', lambda data: brotli.compress(data, quality=11)))
+    return encoders
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that also writes precompressed variants of every
+    hashed text file, skipping those compression does not shrink
+    """
+    def post_process(self, *args, **kwargs):
+        hashed_names = []
+        for name, hashed_name, processed in super().post_process(*args, **kwargs):
+            if isinstance(processed, Exception):
+                yield name, hashed_name, processed
+                continue
+            if hashed_name:
+                hashed_names.append(hashed_name)
+            yield name, hashed_name, processed
+        if not kwargs.get('dry_run'):
+            for hashed_name in dict.fromkeys(hashed_names):
+                self.compress(hashed_name)
+
+    def compress(self, name):
+        if not name.endswith(tuple(config('COMPRESS_EXTENSIONS'))):
+            return
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < config('COMPRESS_MIN_SIZE'):
+            return
+        for _, suffix, compress in compressors():
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+
+
+class StaticFile:
+    """
+    One collected file: where it is, its variants by encoding and whether
+    its name carries a content hash
+    """
+    def __init__(self, path, immutable):
+        self.path = path
+        self.immutable = immutable
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.variants = {
+            encoding: path + suffix
+            for encoding, suffix, _ in compressors()
+            if os.path.isfile(path + suffix)
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Map of URL path to StaticFile for everything under STATIC_ROOT, built
+    once per process (collected files only change with a deploy)
+    """
+    global _index
+    root = settings.STATIC_ROOT
+    if _index is None or _index[0] != root:
+        with _index_lock:
+            if _index is None or _index[0] != root:
+                _index = (root, build_index(root))
+    return _index[1]
+
+
+def build_index(root):
+    hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+    suffixes = tuple(suffix for _, suffix, _ in compressors())
+    index = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            if name.endswith(suffixes) and os.path.isfile(path.rsplit('.', 1)[0]):
+                continue
+            index[settings.STATIC_URL + name] = StaticFile(path, name in hashed)
+    return index
+
+
+def accepted_encodings(header):
+    """
+    Content codings listed in an Accept-Encoding header, minus refused (q=0) ones
+    """
+    accepted = set()
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def serve(request):
+    """
+    Response for a request of a collected static file, or None if the
+    request is for something else
+    """
+    if request.method not in ('GET', 'HEAD') or not request.path.startswith(settings.STATIC_URL):
+        return None
+    static_file = get_index().get(request.path)
+    if static_file is None:
+        return None
+
+    accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+    path, encoding = static_file.path, None
+    # compressors() lists the smallest encoding first
+    for candidate, _, _ in compressors():
+        if candidate in accepted and candidate in static_file.variants:
+            path, encoding = static_file.variants[candidate], candidate
+            break
+    content = b''
+    if request.method == 'GET':
+        with open(path, 'rb') as f:
+            content = f.read()
+    response = HttpResponse(content, content_type=static_file.content_type)
+    response['Content-Length'] = os.path.getsize(path)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if static_file.variants:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    if static_file.immutable:
+        response['Cache-Control'] = f'public, max-age={config("MAX_AGE")}, immutable'
+    else:
+        # Unhashed names can change content in the next deploy
+        response['Cache-Control'] = f'public, max-age={config("UNHASHED_MAX_AGE")}'
+    return response
@@ -0,0 +1,12 @@
+"""
+Small statistics helpers shared by monitoring endpoints and benchmark commands.
+"""
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a non-empty list
+    """
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
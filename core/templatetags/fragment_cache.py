@@ -0,0 +1,57 @@
+from django import template
+from django.conf import settings
+from core.cache import fragment_cache, fragment_key, fragment_stats, get_versions
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    """
+    Render the enclosed block once per object version and serve it from the fragment cache
+    """
+    def __init__(self, nodelist, kind, obj, vary_on):
+        self.nodelist = nodelist
+        self.kind = kind
+        self.obj = obj
+        self.vary_on = vary_on
+
+    def render(self, context):
+        kind = self.kind.resolve(context)
+        obj = self.obj.resolve(context)
+        version = getattr(obj, 'fragment_version', None)
+        if version is None:
+            version = get_versions(kind, [obj.pk])[obj.pk]
+        key = fragment_key(obj, kind, version, [v.resolve(context) for v in self.vary_on])
+
+        cache = fragment_cache()
+        content = cache.get(key)
+        fragment_stats.record(kind, hit=content is not None)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, settings.FRAGMENT_CACHE_TIMEOUT)
+        return content
+
+
+@register.tag('fragmentcache')
+def do_fragmentcache(parser, token):
+    """
+    Cache a template fragment per object version::
+
+        {% fragmentcache 'question' question [vary_on ...] %}
+            ...
+        {% endfragmentcache %}
+
+    The version comes from obj.fragment_version when the view attached it
+    (see core.cache.attach_versions), otherwise it is looked up.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a kind and an object")
+    nodelist = parser.parse(('endfragmentcache',))
+    parser.delete_first_token()
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
@@ -0,0 +1,264 @@
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.utils import timezone
+from accounts.backends import CachedModelBackend
+from accounts.models import Profile
+from questions.models import Question, Answer, Like, HotScore
+from questions import search
+from notifications.models import Notification, Inbox
+from tasks.models import Task
+from .testing import QueryCountTestMixin, shared_caches
+
+
+@shared_caches()
+class QueryCountTest(QueryCountTestMixin, TestCase):
+    """
+    Test every page runs a fixed number of queries at 10, 100 and 1000 rows
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123',
+            is_staff=True
+        )
+        self.question = Question.objects.create(
+            title='Test Question',
+            description='This is a test question',
+            author=self.user
+        )
+        self.answer = Answer.objects.create(
+            question=self.question,
+            author=self.user,
+            content='This is a test answer'
+        )
+        self.rows = 0
+
+    def seed(self, rows):
+        """
+        Grow users, questions, answers on the test question and likes on the
+        test answer to `rows` each, in bulk
+        """
+        new = range(self.rows, rows)
+        if not new:
+            return
+        users = User.objects.bulk_create(
+            User(username=f'reader{i}', email=f'reader{i}@example.com') for i in new
+        )
+        Profile.objects.bulk_create_for(users)
+        questions = Question.objects.bulk_create(
+            Question(title=f'Seeded question {i}', description='Seeded', author=user, answer_count=1)
+            for i, user in zip(new, users)
+        )
+        Answer.objects.bulk_create(
+            Answer(question=self.question, author=user, content=f'Seeded answer {i}')
+            for i, user in zip(new, users)
+        )
+        Like.objects.bulk_create(Like(answer=self.answer, user=user) for user in users)
+        now = timezone.now()
+        HotScore.objects.bulk_create(
+            HotScore(question=question, score=float(i), epoch=now)
+            for i, question in zip(new, questions)
+        )
+        Notification.objects.bulk_create(
+            Notification(recipient=self.user, verb=Notification.LIKED, object_id=i, question=question, last_actor=user)
+            for i, question, user in zip(new, questions, users)
+        )
+        Inbox.objects.update_or_create(user=self.user, defaults={'unread_count': rows})
+        Task.objects.bulk_create(
+            Task(name='seeded', status=Task.DONE, started_at=now, finished_at=now) if i % 2
+            else Task(name='seeded', run_at=now)
+            for i in new
+        )
+        Question.objects.filter(pk=self.question.pk).update(answer_count=rows + 1)
+        Answer.objects.filter(pk=self.answer.pk).update(like_count=rows)
+        search.rebuild_index()
+        self.rows = rows
+
+    def login(self):
+        """
+        Log in and load the user once, as any earlier request would have:
+        sessions and logged-in users are then served from the cache
+        """
+        self.client.login(username='testuser', password='testpassword123')
+        CachedModelBackend().get_user(self.user.pk)
+
+    # questions/urls.py
+
+    def test_question_list(self):
+        """Test the question list query count"""
+        self.assertQueryCount(3, lambda: self.client.get(reverse('question-list')))
+
+    def test_question_list_authenticated(self):
+        """Test a logged-in user's question list runs no session or user queries"""
+        self.login()
+        self.assertQueryCount(3, lambda: self.client.get(reverse('question-list')))
+
+    def test_question_list_hot(self):
+        """Test the hot question list query count"""
+        self.assertQueryCount(3, lambda: self.client.get(reverse('question-list') + '?sort=hot'))
+
+    def test_question_list_cursor(self):
+        """Test the cursor-paginated question list query count"""
+        self.assertQueryCount(2, lambda: self.client.get(reverse('question-list') + '?cursor='))
+
+    def test_question_search(self):
+        """Test the search page query count"""
+        self.assertQueryCount(2, lambda: self.client.get(reverse('question-search') + '?q=seeded'))
+
+    def test_question_detail(self):
+        """Test the question page query count"""
+        url = reverse('question-detail', kwargs={'pk': self.question.pk})
+        self.assertQueryCount(3, lambda: self.client.get(url))
+
+    def test_question_detail_not_modified(self):
+        """Test revalidating an unchanged question page runs only the validator query"""
+        url = reverse('question-detail', kwargs={'pk': self.question.pk})
+        etag = {}
+        response = self.assertQueryCount(
+            1,
+            lambda: self.client.get(url, HTTP_IF_NONE_MATCH=etag['value']),
+            prepare=lambda: etag.update(value=self.client.get(url)['ETag']),
+            cold=False,
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_question_answers(self):
+        """Test the load-more answers fragment query count"""
+        url = reverse('question-answers', kwargs={'pk': self.question.pk}) + '?sort=top'
+        self.assertQueryCount(2, lambda: self.client.get(url))
+
+    def test_question_detail_authenticated(self):
+        """Test the question page query count for a logged-in user"""
+        self.login()
+        url = reverse('question-detail', kwargs={'pk': self.question.pk})
+        self.assertQueryCount(3, lambda: self.client.get(url))
+
+    def test_question_create(self):
+        """Test the ask-question form query count"""
+        self.login()
+        self.assertQueryCount(0, lambda: self.client.get(reverse('question-create')))
+
+    def test_question_update(self):
+        """Test the question edit form query count"""
+        self.login()
+        url = reverse('question-update', kwargs={'pk': self.question.pk})
+        self.assertQueryCount(1, lambda: self.client.get(url))
+
+    def test_question_delete(self):
+        """Test the question delete confirmation query count"""
+        self.login()
+        url = reverse('question-delete', kwargs={'pk': self.question.pk})
+        self.assertQueryCount(1, lambda: self.client.get(url))
+
+    def test_answer_update(self):
+        """Test the answer edit form query count"""
+        self.login()
+        url = reverse('answer-update', kwargs={'pk': self.answer.pk})
+        self.assertQueryCount(1, lambda: self.client.get(url))
+
+    def test_answer_delete(self):
+        """Test deleting an answer liked by every user runs a fixed number of queries"""
+        self.login()
+        answers = []
+
+        def create_answer():
+            answer = Answer.objects.create(question=self.question, author=self.user, content='Delete me')
+            users = User.objects.exclude(pk=self.user.pk)
+            Like.objects.bulk_create(Like(answer=answer, user=user) for user in users)
+            Answer.objects.filter(pk=answer.pk).update(like_count=len(users))
+            answers.append(answer)
+
+        self.assertQueryCount(
+            12,
+            lambda: self.client.post(reverse('answer-delete', kwargs={'pk': answers[-1].pk})),
+            prepare=create_answer,
+        )
+
+    def test_toggle_like(self):
+        """Test toggling a like runs a fixed number of queries"""
+        self.login()
+        url = reverse('toggle-like', kwargs={'pk': self.answer.pk})
+        self.assertQueryCount(
+            11,
+            lambda: self.client.post(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest'),
+            prepare=lambda: Like.objects.filter(user=self.user).delete(),
+        )
+
+    def test_answer_state(self):
+        """Test the like-state endpoint query count"""
+        self.login()
+        ids = ','.join(str(pk) for pk in Answer.objects.values_list('pk', flat=True)[:50])
+        self.assertQueryCount(1, lambda: self.client.get(reverse('answer-state') + f'?ids={ids}'))
+
+    # accounts/urls.py
+
+    def test_login(self):
+        """Test the login page query count"""
+        self.assertQueryCount(0, lambda: self.client.get(reverse('login')))
+
+    def test_logout(self):
+        """Test the logout query count"""
+        self.assertQueryCount(2, lambda: self.client.get(reverse('logout')), prepare=self.login)
+
+    def test_register(self):
+        """Test the registration page query count"""
+        self.assertQueryCount(0, lambda: self.client.get(reverse('register')))
+
+    def test_profile(self):
+        """Test the profile page query count"""
+        self.login()
+        self.assertQueryCount(3, lambda: self.client.get(reverse('profile')))
+
+    def test_user_profile(self):
+        """Test the public profile page query count"""
+        url = reverse('user-profile', kwargs={'username': 'testuser'})
+        self.assertQueryCount(2, lambda: self.client.get(url))
+
+    # core/urls.py
+
+    def test_home(self):
+        """Test the home page query count"""
+        self.assertQueryCount(2, lambda: self.client.get(reverse('home')))
+
+    def test_home_hot(self):
+        """Test the hot home page query count"""
+        self.assertQueryCount(2, lambda: self.client.get(reverse('home') + '?sort=hot'))
+
+    def test_cache_stats(self):
+        """Test the cache stats endpoint query count"""
+        self.login()
+        self.assertQueryCount(0, lambda: self.client.get(reverse('cache-stats')))
+
+    def test_query_stats(self):
+        """Test the query stats endpoint query count"""
+        self.login()
+        self.assertQueryCount(0, lambda: self.client.get(reverse('query-stats')))
+
+    def test_task_stats(self):
+        """Test the task stats endpoint query count"""
+        self.login()
+        self.assertQueryCount(3, lambda: self.client.get(reverse('task-stats')))
+
+    # notifications/urls.py
+
+    def test_notification_dropdown(self):
+        """Test the notification dropdown query count"""
+        self.login()
+        self.assertQueryCount(1, lambda: self.client.get(reverse('notification-dropdown')))
+
+    def test_notification_count(self):
+        """Test the unread notification count query count"""
+        self.login()
+        self.assertQueryCount(1, lambda: self.client.get(reverse('notification-count')))
+
+    def test_notification_read(self):
+        """Test marking notifications read runs a fixed number of queries"""
+        self.login()
+        self.assertQueryCount(
+            4,  # savepoint, the two updates, release
+            lambda: self.client.post(reverse('notification-read'), HTTP_X_REQUESTED_WITH='XMLHttpRequest'),
+            prepare=lambda: Notification.objects.filter(recipient=self.user).update(unread=True),
+        )
@@ -0,0 +1,74 @@
+"""
+Test helpers for pinning the number of SQL queries a request runs.
+"""
+import tempfile
+from django.conf import settings
+from django.core.cache import caches
+from django.test import override_settings
+from .cache import FRAGMENT_CACHE_ALIAS
+from .page_cache import PAGE_CACHE_ALIAS
+from .query_budget import record_queries
+
+
+def shared_caches():
+    """
+    Settings override putting the fragment and session caches in file-based
+    stores, which count as shared between workers as production's must (see
+    core.cache.is_shared), so that conditional GET, cache-backed sessions
+    and the logged-in user cache are in use
+    """
+    def file_cache(prefix):
+        return {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': tempfile.mkdtemp(prefix=prefix),
+            'TIMEOUT': None,
+        }
+
+    return override_settings(
+        CACHES={
+            **settings.CACHES,
+            FRAGMENT_CACHE_ALIAS: file_cache('fragments-'),
+            settings.SESSION_CACHE_ALIAS: file_cache('sessions-'),
+        },
+        SESSION_ENGINE=settings.SESSION_ENGINES['cache'],
+    )
+
+
+class QueryCountTestMixin:
+    """
+    Mixin for TestCases asserting that a request runs the same fixed number
+    of queries whatever the amount of data, which is what catches N+1 loops.
+
+    Subclasses implement seed(rows), growing the data set to `rows` rows per
+    table; assertQueryCount calls it for each size in row_counts in turn.
+    """
+    row_counts = (10, 100, 1000)
+
+    def seed(self, rows):
+        raise NotImplementedError('Subclasses must implement seed()')
+
+    def assertQueryCount(self, expected, request, row_counts=None, prepare=None, cold=True):
+        """
+        Seed each row count, run request() with cold caches and check the
+        number of queries; prepare(), if given, runs unmeasured just before
+        each request. With cold=False the caches are left as prepare() left
+        them, for requests that depend on what it cached (e.g. an ETag
+        built from cached versions). Returns the last response.
+        """
+        response = None
+        for rows in row_counts or self.row_counts:
+            self.seed(rows)
+            if prepare:
+                prepare()
+            if cold:
+                # Measure the cold path, where an N+1 loop would actually run
+                caches[FRAGMENT_CACHE_ALIAS].clear()
+                caches[PAGE_CACHE_ALIAS].clear()
+            with record_queries() as recorder:
+                response = request()
+            self.assertEqual(
+                recorder.count, expected,
+                f'{recorder.count} queries with {rows} rows, expected {expected}; '
+                f'repeated: {recorder.duplicates or "none"}'
+            )
+        return response
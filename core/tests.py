@@ -1,7 +1,34 @@
-from django.test import TestCase, Client
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db import router
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, Client, AsyncClient, override_settings
 from django.urls import reverse
+from django.conf import settings
 from django.contrib.auth.models import User
-from questions.models import Question
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+from questions import deletion
+from questions.models import Question, Answer, Like
+from .cache import FRAGMENT_CACHE_ALIAS, fragment_stats, get_versions
+from . import page_cache
+from .backends.sqlite3.base import DatabaseWrapper as ProductionSQLiteWrapper
+from . import db
+from .db import write_transaction
+from .query_budget import query_stats
+from . import rate_limit, replicas, static_files
+from .sessions import SessionStore
+from .testing import shared_caches
 
 class HomeViewTest(TestCase):
     """
@@ -57,4 +84,864 @@ class HomeViewTest(TestCase):
         response = self.client.get(self.home_url)
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'Login')
-        self.assertContains(response, 'Register')
\ No newline at end of file
+        self.assertContains(response, 'Register')
+
+class FragmentCacheTest(TestCase):
+    """
+    Test case for versioned question/answer card caching
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.question = Question.objects.create(
+            title='Cached Question',
+            description='This card gets cached',
+            author=self.user
+        )
+        fragment_stats.reset()
+
+    def test_second_render_hits_cache(self):
+        """Test a repeated page view serves the card from the cache"""
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.assertEqual(fragment_stats.snapshot()['question'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_edit_invalidates_card(self):
+        """Test editing a question re-renders its card"""
+        self.client.get(reverse('question-list'))
+        self.question.title = 'Edited Question'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.save()
+        response = self.client.get(reverse('question-list'))
+        self.assertContains(response, 'Edited Question')
+        self.assertNotContains(response, 'Cached Question')
+
+    def test_new_answer_and_like_bump_versions(self):
+        """Test answers bump the question card and likes bump the question's answer list"""
+        question_version = get_versions('question', [self.question.pk])[self.question.pk]
+        with self.captureOnCommitCallbacks(execute=True):
+            answer = Answer.objects.create(question=self.question, author=self.user, content='Answer')
+        self.assertGreater(get_versions('question', [self.question.pk])[self.question.pk], question_version)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, '1 answer')
+
+        answers_version = get_versions('answers', [self.question.pk])[self.question.pk]
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.toggle(answer, self.user)
+        self.assertGreater(get_versions('answers', [self.question.pk])[self.question.pk], answers_version)
+
+    def test_versions_bumped_after_commit(self):
+        """Test an edit leaves the cached card alone until its transaction commits"""
+        version = get_versions('question', [self.question.pk])[self.question.pk]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.title = 'Edited Question'
+            self.question.save()
+            # A reader in between still sees the committed row, under the old version
+            self.assertEqual(get_versions('question', [self.question.pk])[self.question.pk], version)
+        self.assertGreater(get_versions('question', [self.question.pk])[self.question.pk], version)
+
+    def test_cache_stats_staff_only(self):
+        """Test the hit/miss endpoint is only available to staff"""
+        url = reverse('cache-stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.login(username='testuser', password='testpassword123')
+        self.client.get(reverse('home'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['fragments']['question']['misses'], 1)
+
+
+@override_settings(PAGE_CACHE=dict(settings.PAGE_CACHE, ENABLED=True))
+class PageCacheTest(TestCase):
+    """
+    Test case for the anonymous full-page cache
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.question = Question.objects.create(
+            title='Cached Page Question',
+            description='Shown on cached pages',
+            author=self.user
+        )
+        self.answer = Answer.objects.create(
+            question=self.question, author=self.user, content='Cached answer'
+        )
+        self.detail_url = reverse('question-detail', kwargs={'pk': self.question.pk})
+        page_cache.page_cache().clear()
+
+    def test_anonymous_repeat_served_without_queries(self):
+        """Test a repeated anonymous request is served from the cache"""
+        first = self.client.get(self.detail_url)
+        self.assertEqual(first['X-Page-Cache'], 'MISS')
+        self.assertFalse(first.cookies)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.detail_url)
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+
+    def test_cached_pages_vary_on_cookie(self):
+        """Test stored and replayed pages keep Vary: Cookie for downstream caches"""
+        first = self.client.get(self.detail_url)
+        second = self.client.get(self.detail_url)
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        for response in (first, second):
+            self.assertIn('Cookie', response['Vary'])
+
+    def test_logged_in_users_bypass_cache(self):
+        """Test requests with a session are never cached or served from the cache"""
+        self.client.get(self.detail_url)
+        self.client.login(username='testuser', password='testpassword123')
+        response = self.client.get(self.detail_url)
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, 'Your Answer')
+
+    def test_answer_edit_purges_detail_page(self):
+        """Test changing an answer shown on a page makes the page re-render"""
+        self.client.get(self.detail_url)
+        self.answer.content = 'Edited answer'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.answer.save()
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Edited answer')
+
+    def test_like_purges_detail_page(self):
+        """Test a like re-renders the page showing the answer"""
+        self.client.get(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.toggle(self.answer, self.user)
+        self.assertEqual(self.client.get(self.detail_url)['X-Page-Cache'], 'MISS')
+
+    def test_purge_is_precise(self):
+        """Test a change to one question leaves other questions' pages cached"""
+        other = Question.objects.create(title='Other', description='Other', author=self.user)
+        other_url = reverse('question-detail', kwargs={'pk': other.pk})
+        self.client.get(self.detail_url)
+        self.client.get(other_url)
+        other.title = 'Other edited'
+        with self.captureOnCommitCallbacks(execute=True):
+            other.save()
+        self.assertEqual(self.client.get(self.detail_url)['X-Page-Cache'], 'HIT')
+        self.assertEqual(self.client.get(other_url)['X-Page-Cache'], 'MISS')
+
+    def test_new_question_purges_list(self):
+        """Test asking a question re-renders the cached question list"""
+        self.client.get(reverse('question-list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.create(title='Brand new question', description='New', author=self.user)
+        response = self.client.get(reverse('question-list'))
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Brand new question')
+
+    def test_stale_page_served_while_refreshing(self):
+        """Test concurrent requests get the stale page while one request re-renders it"""
+        self.client.get(self.detail_url)
+        self.question.title = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.save()
+        with mock.patch.object(page_cache, 'acquire_refresh', return_value=False):
+            with self.assertNumQueries(0):
+                response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Page-Cache'], 'STALE')
+        self.assertContains(response, 'Cached Page Question')
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Renamed')
+
+    @override_settings(DELETION={**settings.DELETION, 'BACKGROUND': False})
+    def test_stale_page_dropped_when_no_longer_cacheable(self):
+        """Test a stale page that re-renders as a 404 is not served to anyone again"""
+        self.client.get(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            deletion.delete_question(self.question)
+        self.assertEqual(self.client.get(self.detail_url).status_code, 404)
+        with mock.patch.object(page_cache, 'acquire_refresh', return_value=False):
+            response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('X-Page-Cache', response)
+
+    @override_settings(ROOT_URLCONF='quora_clone.asgi_urls')
+    async def test_async_views_cached(self):
+        """Test pages of the async views are cached and served under ASGI"""
+        client = AsyncClient()
+        first = await client.get(self.detail_url)
+        self.assertEqual(first['X-Page-Cache'], 'MISS')
+        second = await client.get(self.detail_url)
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+
+
+@shared_caches()
+class ConditionalGetTest(TestCase):
+    """
+    Test case for ETag revalidation of the question pages and the feed
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.question = Question.objects.create(
+            title='Conditional Question',
+            description='Revalidated by clients',
+            author=self.user
+        )
+        self.answer = Answer.objects.create(
+            question=self.question, author=self.user, content='Conditional answer'
+        )
+        self.detail_url = reverse('question-detail', kwargs={'pk': self.question.pk})
+
+    def revalidate(self, url, etag, **extra):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag, **extra)
+
+    def test_unchanged_page_not_modified(self):
+        """Test a matching If-None-Match gets an empty 304 from the validator query alone"""
+        for url in (self.detail_url, reverse('question-list'), reverse('home'), reverse('home') + '?sort=hot'):
+            first = self.client.get(url)
+            self.assertTrue(first['ETag'].startswith('W/"'))
+            self.assertIn('no-cache', first['Cache-Control'])
+            with self.assertNumQueries(1):
+                response = self.revalidate(url, first['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(response['ETag'], first['ETag'])
+        self.assertIn('Last-Modified', self.client.get(self.detail_url))
+
+    def test_answers_and_likes_change_etag(self):
+        """Test a new answer, an edit, a like and an unlike each change the page's ETag"""
+        etags = [self.client.get(self.detail_url)['ETag']]
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(question=self.question, author=self.user, content='Second answer')
+        etags.append(self.client.get(self.detail_url)['ETag'])
+        self.answer.content = 'Edited answer'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.answer.save()
+        etags.append(self.client.get(self.detail_url)['ETag'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.toggle(self.answer, self.user)
+        etags.append(self.client.get(self.detail_url)['ETag'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.toggle(self.answer, self.user)
+        etags.append(self.client.get(self.detail_url)['ETag'])
+        self.assertEqual(len(set(etags)), len(etags))
+        self.assertEqual(self.revalidate(self.detail_url, etags[0]).status_code, 200)
+
+    def test_likes_on_different_answers_change_etag(self):
+        """Test likes and unlikes that leave the like total unchanged still change the ETag"""
+        other = Answer.objects.create(question=self.question, author=self.user, content='Other answer')
+        reader = User.objects.create_user(username='reader', password='testpassword123')
+        Like.objects.toggle(other, reader)
+        etag = self.client.get(self.detail_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.apply_toggles({(self.answer.pk, reader.pk): True, (other.pk, reader.pk): False})
+        self.assertEqual(self.revalidate(self.detail_url, etag).status_code, 200)
+
+    def test_feed_etag_follows_answers_and_likes(self):
+        """Test the feeds' ETags move with answers, and the hot feed's with likes"""
+        urls = (reverse('question-list'), reverse('home') + '?sort=hot')
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(question=self.question, author=self.user, content='Second answer')
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.revalidate(url, etag).status_code, 200)
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.toggle(self.answer, self.user)
+        self.assertEqual(self.revalidate(urls[0], etags[0]).status_code, 304)
+        self.assertEqual(self.revalidate(urls[1], etags[1]).status_code, 200)
+
+    def test_deleted_question_changes_feed_etag(self):
+        """Test removing a question changes the feed's ETag although no timestamp moved"""
+        other = Question.objects.create(title='Other', description='Other', author=self.user)
+        etag = self.client.get(reverse('question-list'))['ETag']
+        other.delete()
+        self.assertEqual(self.revalidate(reverse('question-list'), etag).status_code, 200)
+
+    def test_etag_per_viewer(self):
+        """Test a logged-in viewer gets their own, private ETag"""
+        anonymous = self.client.get(self.detail_url)['ETag']
+        self.client.login(username='testuser', password='testpassword123')
+        response = self.client.get(self.detail_url)
+        self.assertNotEqual(response['ETag'], anonymous)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.revalidate(self.detail_url, anonymous).status_code, 200)
+        self.assertEqual(self.revalidate(self.detail_url, response['ETag']).status_code, 304)
+
+    def test_flash_messages_always_rendered(self):
+        """Test a page carrying a flash message is rendered despite a matching ETag"""
+        etag = self.client.get(self.detail_url)['ETag']
+        self.client.cookies['messages'] = 'pending'
+        response = self.revalidate(self.detail_url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_missing_question_not_found(self):
+        """Test a missing question still 404s"""
+        url = reverse('question-detail', kwargs={'pk': self.question.pk + 100})
+        self.assertEqual(self.revalidate(url, '*').status_code, 404)
+
+    @override_settings(PAGE_CACHE=dict(settings.PAGE_CACHE, ENABLED=True))
+    def test_cached_page_not_modified(self):
+        """Test a page-cache hit answers If-None-Match without queries"""
+        page_cache.page_cache().clear()
+        etag = self.client.get(self.detail_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.revalidate(self.detail_url, etag)
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(ROOT_URLCONF='quora_clone.asgi_urls')
+    async def test_async_views_not_modified(self):
+        """Test the async views are revalidated the same way"""
+        client = AsyncClient()
+        for url in (self.detail_url, reverse('question-list'), reverse('home')):
+            first = await client.get(url)
+            self.assertEqual(first.status_code, 200)
+            response = await client.get(url, headers={'If-None-Match': first['ETag']})
+            self.assertEqual(response.status_code, 304)
+
+    def test_change_after_cache_loss_not_modified(self):
+        """Test a page changed while its versions were lost from the cache is sent in full"""
+        etag = self.client.get(self.detail_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.toggle(self.answer, self.user)
+        caches[FRAGMENT_CACHE_ALIAS].clear()
+        self.assertEqual(self.revalidate(self.detail_url, etag).status_code, 200)
+
+    def test_per_process_cache_skips_validators(self):
+        """Test a worker keeping the versions in its own memory never answers 304"""
+        etag = self.client.get(self.detail_url)['ETag']
+        with override_settings(CACHES={**settings.CACHES, FRAGMENT_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'private',
+        }}):
+            response = self.revalidate(self.detail_url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_html_gzipped(self):
+        """Test rendered pages are gzip-compressed for clients that accept it"""
+        plain = self.client.get(self.detail_url)
+        response = self.client.get(self.detail_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(self.revalidate(self.detail_url, response['ETag']).status_code, 304)
+
+
+class QueryBudgetTest(TestCase):
+    """
+    Test case for per-request query accounting
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        query_stats.reset()
+
+    def test_requests_recorded_per_view(self):
+        """Test query counts are aggregated under the view name"""
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        stats = query_stats.snapshot()['home']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(sum(stats['count_histogram'].values()), 2)
+        self.assertEqual(stats['over_budget'], 0)
+
+    @override_settings(ROOT_URLCONF='quora_clone.asgi_urls')
+    @shared_caches()
+    async def test_async_requests_recorded(self):
+        """Test queries run by the async ORM are counted under ASGI"""
+        await AsyncClient().get(reverse('home'))
+        stats = query_stats.snapshot()['home']
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['count_histogram'], {'<=2': 1})
+
+    @override_settings(ROOT_URLCONF='quora_clone.asgi_urls')
+    @shared_caches()
+    async def test_concurrent_async_requests_counted_apart(self):
+        """Test async requests in flight together on one connection each count only their own queries"""
+        client = AsyncClient()
+        await asyncio.gather(*(client.get(reverse('home')) for _ in range(3)))
+        stats = query_stats.snapshot()['home']
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['count_histogram'], {'<=2': 3})
+
+    @override_settings(QUERY_BUDGET=dict(settings.QUERY_BUDGET, VIEWS={'question-list': 0}))
+    def test_over_budget_logged(self):
+        """Test a request over its view's budget is logged"""
+        with self.assertLogs('core.middleware', level='WARNING') as logs:
+            self.client.get(reverse('question-list'))
+        self.assertIn('question-list', logs.output[0])
+        self.assertEqual(query_stats.snapshot()['question-list']['over_budget'], 1)
+
+    def test_query_stats_staff_only(self):
+        """Test the query histogram endpoint is only available to staff"""
+        url = reverse('query-stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.login(username='testuser', password='testpassword123')
+        self.client.get(reverse('home'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('home', response.json()['views'])
+
+
+@override_settings(RATE_LIMIT={
+    **settings.RATE_LIMIT,
+    'ENABLED': True,
+    'VIEWS': {
+        'toggle-like': {'USER': (3, 60), 'IP': (5, 60)},
+        'question-create': {'USER': (1, 6)},
+    },
+})
+class RateLimitTest(TestCase):
+    """
+    Test case for the token-bucket limits on write views
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.question = Question.objects.create(title='Limited', description='Limited', author=self.user)
+        self.answer = Answer.objects.create(question=self.question, author=self.user, content='Limited answer')
+        self.like_url = reverse('toggle-like', kwargs={'pk': self.answer.pk})
+        rate_limit.limiter_cache().clear()
+        self.now = 1000000.0
+        self.enterContext(mock.patch.object(rate_limit.time, 'time', lambda: self.now))
+
+    def like(self, client=None):
+        return (client or self.client).post(self.like_url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_burst_then_throttled(self):
+        """Test a user gets their burst, then 429 with Retry-After until a token refills"""
+        self.client.login(username='testuser', password='testpassword123')
+        for _ in range(3):
+            self.assertEqual(self.like().status_code, 200)
+        response = self.like()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(response.json()['retry_after'], 1)
+        # Turned-away requests are not charged
+        self.assertEqual(self.like().status_code, 429)
+        self.now += 1
+        self.assertEqual(self.like().status_code, 200)
+        self.assertEqual(self.like().status_code, 429)
+        self.now += 60
+        for _ in range(3):
+            self.assertEqual(self.like().status_code, 200)
+
+    def test_ip_bucket_shared_across_users(self):
+        """Test users behind one address share its bucket"""
+        clients = []
+        for i in range(2):
+            User.objects.create_user(username=f'user{i}', password='testpassword123')
+            client = Client()
+            client.login(username=f'user{i}', password='testpassword123')
+            clients.append(client)
+        statuses = [self.like(client).status_code for client in clients for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 200, 200, 200, 429])
+
+    def test_form_post_throttled(self):
+        """Test a throttled form post gets the 429 page"""
+        self.client.login(username='testuser', password='testpassword123')
+        data = {'title': 'A question', 'description': 'Asked twice'}
+        self.assertEqual(self.client.post(reverse('question-create'), data).status_code, 302)
+        response = self.client.post(reverse('question-create'), data)
+        self.assertContains(response, 'Too Many Requests', status_code=429)
+        self.assertEqual(response['Retry-After'], '10')
+        self.assertEqual(Question.objects.filter(title='A question').count(), 1)
+        # Reads are never limited
+        self.assertEqual(self.client.get(reverse('question-create')).status_code, 200)
+
+    def test_disabled(self):
+        """Test nothing is limited when rate limiting is off"""
+        self.client.login(username='testuser', password='testpassword123')
+        with override_settings(RATE_LIMIT={**settings.RATE_LIMIT, 'ENABLED': False}):
+            for _ in range(6):
+                self.assertEqual(self.like().status_code, 200)
+
+    @override_settings(ROOT_URLCONF='quora_clone.asgi_urls')
+    async def test_async_like_throttled(self):
+        """Test the async like toggle is limited the same way"""
+        client = AsyncClient()
+        await client.alogin(username='testuser', password='testpassword123')
+        statuses = [
+            (await client.post(self.like_url, headers={'X-Requested-With': 'XMLHttpRequest'})).status_code
+            for _ in range(4)
+        ]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+    def test_anonymous_sent_to_login_first(self):
+        """Test anonymous likes are sent to log in without taking the address's tokens"""
+        for _ in range(6):
+            response = self.client.post(self.like_url)
+            self.assertEqual(response.status_code, 302)
+            self.assertIn(reverse('login'), response.url)
+        self.client.login(username='testuser', password='testpassword123')
+        self.assertEqual(self.like().status_code, 200)
+
+    @override_settings(ROOT_URLCONF='quora_clone.asgi_urls')
+    async def test_async_anonymous_sent_to_login_first(self):
+        """Test the async like toggle checks login before the rate limit too"""
+        client = AsyncClient()
+        for _ in range(6):
+            response = await client.post(self.like_url)
+            self.assertEqual(response.status_code, 302)
+            self.assertIn(reverse('login'), response.url)
+        await client.alogin(username='testuser', password='testpassword123')
+        response = await client.post(self.like_url, headers={'X-Requested-With': 'XMLHttpRequest'})
+        self.assertEqual(response.status_code, 200)
+
+
+class BenchmarkCommandsTest(TestCase):
+    """
+    Test case for the synthetic dataset and view benchmark commands
+    """
+    def test_seed_and_benchmark(self):
+        """Test seeding a small skewed dataset and benchmarking views against it"""
+        call_command(
+            'seed_benchmark_data', users=20, questions=30, answers=200, likes=300,
+            hot_questions=2, hot_share=0.5, stdout=StringIO()
+        )
+        self.assertTrue(User.objects.get(username='bench_staff').is_staff)
+        self.assertEqual(Answer.objects.count(), 200)
+        hot = Question.objects.order_by('-answer_count').first()
+        self.assertGreaterEqual(hot.answer_count, 50)
+        self.assertEqual(hot.answer_count, hot.answers.count())
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command(
+                'benchmark_views', iterations=2, warmup=0, host='testserver',
+                only=['home', 'question-detail', 'toggle-like'], output=output, stdout=StringIO()
+            )
+            with open(output) as f:
+                results = json.load(f)
+        self.assertEqual(set(results['views']), {'home', 'question-detail', 'toggle-like'})
+        self.assertEqual(results['meta']['dataset']['answers'], 200)
+        self.assertIn('p99_ms', results['views']['home'])
+        # Write scenarios are rolled back
+        self.assertEqual(Like.objects.count(), 300)
+
+
+class BenchmarkServersTest(TransactionTestCase):
+    """
+    Test case for the WSGI/ASGI comparison, whose requests run in other
+    threads and so need committed data
+    """
+    def test_benchmark_servers(self):
+        """Test both servers answer every request of the read scenarios"""
+        user = User.objects.create_user(
+            username='bench_staff',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        question = Question.objects.create(title='Test Question', description='Benchmarked', author=user)
+        Answer.objects.create(question=question, author=user, content='Benchmarked answer')
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command(
+                'benchmark_servers', clients=3, requests=2, threads=2, slow_ms=0, host='testserver',
+                only=['home', 'question-detail'], output=output, stdout=StringIO()
+            )
+            with open(output) as f:
+                results = json.load(f)['scenarios']
+        self.assertEqual(set(results), {'home', 'question-detail'})
+        for servers in results.values():
+            self.assertEqual(set(servers), {'wsgi', 'asgi'})
+            for result in servers.values():
+                self.assertEqual(result['requests'], 6)
+                self.assertEqual(result['errors'], 0)
+
+
+class SQLiteProductionProfileTest(TestCase):
+    """
+    Test case for the production SQLite backend and write transactions
+    """
+    def make_connection(self, directory, **options):
+        settings_dict = dict(
+            connection.settings_dict,
+            NAME=os.path.join(directory, 'profile.sqlite3'),
+            OPTIONS=options,
+        )
+        wrapper = ProductionSQLiteWrapper(settings_dict, alias='profile_test')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pragmas_applied(self):
+        """Test the configured PRAGMAs are set on every new connection"""
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = self.make_connection(directory, **settings.SQLITE_PRODUCTION_OPTIONS)
+            with wrapper.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA busy_timeout')
+                self.assertEqual(cursor.fetchone()[0], 5000)
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            wrapper.close()
+
+    def test_immediate_transactions(self):
+        """Test transactions begin IMMEDIATE when configured"""
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = self.make_connection(directory, transaction_mode='immediate')
+            with CaptureQueriesContext(wrapper) as ctx:
+                wrapper.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+                wrapper.rollback()
+                wrapper.set_autocommit(True)
+            self.assertEqual(ctx.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+            wrapper.close()
+
+    @override_settings(WRITE_TRANSACTION={'ATTEMPTS': 3, 'BACKOFF': 0})
+    def test_write_transaction_retries_when_locked(self):
+        """Test taking the write lock is retried a bounded number of times, the view run once"""
+        calls = []
+
+        @write_transaction
+        def view(request):
+            calls.append(1)
+            return 'done'
+
+        request = mock.Mock(method='POST')
+        block = mock.MagicMock()
+        block.__enter__.side_effect = [OperationalError('database is locked')] * 2 + [None]
+        with mock.patch.object(db.transaction, 'atomic', return_value=block):
+            self.assertEqual(view(request), 'done')
+        self.assertEqual((len(calls), block.__enter__.call_count, block.__exit__.call_count), (1, 3, 1))
+
+        block.__enter__.side_effect = OperationalError('database is locked')
+        with mock.patch.object(db.transaction, 'atomic', return_value=block):
+            with self.assertRaises(OperationalError):
+                view(request)
+        self.assertEqual(len(calls), 1)
+
+    @override_settings(WRITE_TRANSACTION={'ATTEMPTS': 3, 'BACKOFF': 0})
+    def test_write_transaction_view_not_rerun(self):
+        """Test a locked error from inside the view is raised, not retried by running the view again"""
+        calls = []
+
+        @write_transaction
+        def view(request):
+            calls.append(1)
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError):
+            view(mock.Mock(method='POST'))
+        self.assertEqual(len(calls), 1)
+
+    def test_write_transaction_skips_safe_methods(self):
+        """Test GET requests run as they are, without the retrying write transaction"""
+        calls = []
+
+        @write_transaction
+        def view(request):
+            calls.append(1)
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError):
+            view(mock.Mock(method='GET'))
+        self.assertEqual(len(calls), 1)
+
+
+@override_settings(REPLICA_ROUTING={**settings.REPLICA_ROUTING, 'REPLICAS': ['replica']})
+class ReplicaRoutingTest(TestCase):
+    """
+    Test case for replica reads and read-your-writes stickiness, with two
+    separate SQLite databases standing in for the primary and the replica
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        # Only on the primary: the stand-in replica never catches up
+        self.question = Question.objects.create(
+            title='Test Question',
+            description='This is a test question',
+            author=self.user
+        )
+        self.url = reverse('question-detail', kwargs={'pk': self.question.pk})
+
+    def test_reads_go_to_replica(self):
+        """Test replicated models are read from the replica and others from the primary"""
+        token = replicas.start_request(pinned=False)
+        try:
+            self.assertEqual(router.db_for_read(Question), 'replica')
+            self.assertEqual(router.db_for_read(User), 'default')
+            self.assertFalse(Question.objects.filter(pk=self.question.pk).exists())
+        finally:
+            replicas.end_request(token)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_writes_go_to_primary_and_pin_request(self):
+        """Test writes go to the primary and later reads in the same request follow them"""
+        token = replicas.start_request(pinned=False)
+        try:
+            self.assertEqual(router.db_for_write(Answer), 'default')
+            self.assertEqual(router.db_for_read(Question), 'default')
+        finally:
+            wrote = replicas.end_request(token)
+        self.assertTrue(wrote)
+
+    def test_writer_sees_own_writes(self):
+        """Test a visitor who wrote is pinned to the primary until the cookie expires"""
+        self.client.login(username='testuser', password='testpassword123')
+        response = self.client.post(self.url, {'content': 'Fresh answer'})
+        self.assertEqual(response.status_code, 302)
+        cookie = response.cookies[settings.REPLICA_ROUTING['COOKIE']]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_ROUTING['STICKY_SECONDS'])
+
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Fresh answer')
+
+        del self.client.cookies[settings.REPLICA_ROUTING['COOKIE']]
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+
+@shared_caches()
+class SessionStorageTest(TestCase):
+    """
+    Test case for cache-backed sessions, cookie messages and session cleanup
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+
+    def test_writes_behind_to_database(self):
+        """Test a new session is saved to the database and later changes only to the cache"""
+        session = SessionStore()
+        session['step'] = 1
+        session.save()
+        self.assertEqual(Session.objects.get(pk=session.session_key).get_decoded()['step'], 1)
+
+        session = SessionStore(session.session_key)
+        session['step'] = 2
+        with self.assertNumQueries(0):
+            session.save()
+        self.assertEqual(SessionStore(session.session_key)['step'], 2)
+        self.assertEqual(Session.objects.get(pk=session.session_key).get_decoded()['step'], 1)
+
+        # Once the interval has passed, the next save writes the database again
+        session._cache.delete(session._written_key(session.session_key))
+        session['step'] = 3
+        session.save()
+        self.assertEqual(Session.objects.get(pk=session.session_key).get_decoded()['step'], 3)
+
+    def test_login_written_through(self):
+        """Test logging in and out reaches the database at once"""
+        self.client.get(reverse('home'))
+        self.client.login(username='testuser', password='testpassword123')
+        key = self.client.session.session_key
+        self.assertEqual(Session.objects.get(pk=key).get_decoded()['_auth_user_id'], str(self.user.pk))
+        self.client.get(reverse('logout'))
+        self.assertFalse(Session.objects.filter(pk=key).exists())
+
+    def test_messages_stored_in_cookie(self):
+        """Test flash messages travel in a cookie rather than the session"""
+        self.client.login(username='testuser', password='testpassword123')
+        response = self.client.get(reverse('logout'))
+        self.assertIn('messages', response.cookies)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'You have been successfully logged out.')
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions(self):
+        """Test the signed-cookie strategy keeps sessions out of the database"""
+        self.client.login(username='testuser', password='testpassword123')
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Session.objects.exists())
+
+    def test_clear_expired_sessions(self):
+        """Test expired sessions are deleted in batches and live ones kept"""
+        now = timezone.now()
+        Session.objects.bulk_create(
+            Session(session_key=f'expired{i:032d}', session_data='', expire_date=now - timedelta(days=1))
+            for i in range(5)
+        )
+        Session.objects.create(session_key='live', session_data='', expire_date=now + timedelta(days=1))
+        out = StringIO()
+        call_command('clear_expired_sessions', batch_size=2, pause=0, stdout=out)
+        self.assertIn('Deleted 5 expired session(s)', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('pk', flat=True)), ['live'])
+
+
+class StaticFilesTest(TestCase):
+    """
+    Test case for the hashed, precompressed production static files
+    """
+    def setUp(self):
+        self.client = Client()
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(
+            STATIC_ROOT=self.directory,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={
+                **settings.STORAGES,
+                'staticfiles': {'BACKEND': 'core.static_files.CompressedManifestStaticFilesStorage'},
+            },
+            STATIC_FILES={**settings.STATIC_FILES, 'SERVE': True},
+        ))
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.css_url = staticfiles_storage.url('css/style.css')
+
+    def test_pages_link_hashed_files(self):
+        """Test base.html links the content-hashed asset names"""
+        self.assertRegex(self.css_url, r'^/static/css/style\.[0-9a-f]{12}\.css$')
+        response = self.client.get(reverse('login'))
+        self.assertContains(response, self.css_url)
+        self.assertContains(response, staticfiles_storage.url('js/scripts.js'))
+
+    def test_precompressed_variant_served(self):
+        """Test the gzip variant is served to clients that accept it, with immutable caching"""
+        with open(os.path.join(settings.BASE_DIR, 'static', 'css', 'style.css'), 'rb') as f:
+            original = f.read()
+        response = self.client.get(self.css_url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(gzip.decompress(response.content), original)
+
+        response = self.client.get(self.css_url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, original)
+
+    def test_unhashed_names_cached_briefly(self):
+        """Test files requested by their plain names are not cached forever"""
+        response = self.client.get('/static/css/style.css')
+        self.assertEqual(response['Cache-Control'], f'public, max-age={settings.STATIC_FILES["UNHASHED_MAX_AGE"]}')
+        self.assertEqual(self.client.get('/static/css/missing.css').status_code, 404)
+
+    def test_accepted_encodings(self):
+        """Test Accept-Encoding parsing drops refused codings"""
+        self.assertEqual(static_files.accepted_encodings('br;q=1.0, gzip;q=0.5, identity;q=0'), {'br', 'gzip'})
+        self.assertEqual(static_files.accepted_encodings(''), set())
@@ -3,4 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.HomeView.as_view(), name='home'),
+    path('stats/cache/', views.cache_stats, name='cache-stats'),
+    path('stats/queries/', views.query_stats, name='query-stats'),
+    path('stats/tasks/', views.task_stats, name='task-stats'),
 ]
\ No newline at end of file
@@ -1,15 +1,78 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.views.generic import TemplateView
 from questions.models import Question
+from questions import freshness, ranking
+from tasks.queue import queue_stats
+from .cache import attach_versions, fragment_stats
+from .conditional import ConditionalGetMixin
+from .page_cache import tag_page
+from . import query_budget
 
-class HomeView(TemplateView):
+class HomeView(ConditionalGetMixin, TemplateView):
     """
-    Home page view displaying the latest questions
+    Home page view displaying the latest or the hottest questions
     """
     template_name = 'core/home.html'
     
-    def get_context_data(self, **kwargs):
+    def get_sort(self):
+        return 'hot' if self.request.GET.get('sort') == 'hot' else 'recent'
+
+    def get_validator_row(self):
+        return freshness.feed_summary(self.get_sort())
+
+    def get_questions(self):
+        """
+        The latest (or, with ?sort=hot, the hottest) questions for the homepage
+        """
+        if self.get_sort() == 'hot':
+            questions = ranking.hot_questions()
+        else:
+            questions = Question.objects.select_related('author').all()
+        return questions[:10]
+
+    def get_context_data(self, questions=None, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Get the latest questions for the homepage
-        context['questions'] = Question.objects.select_related('author').all()[:10]
-        return context
\ No newline at end of file
+        context['sort'] = self.get_sort()
+        if questions is None:
+            questions = self.get_questions()
+        context['questions'] = attach_versions(questions, 'question')
+        tag_page(self.request, 'question', *(question.pk for question in context['questions']))
+        tag_page(self.request, 'collection', context['sort'])
+        return context
+
+
+class AsyncHomeView(HomeView):
+    """
+    HomeView for ASGI, with the questions fetched by the async ORM
+    """
+    async def get(self, request, *args, **kwargs):
+        questions = [question async for question in self.get_questions()]
+        context = await sync_to_async(self.get_context_data)(questions=questions, **kwargs)
+        return self.render_to_response(context)
+
+
+@staff_member_required
+def cache_stats(request):
+    """
+    Fragment cache hit/miss counters for this process, for monitoring
+    """
+    return JsonResponse({'fragments': fragment_stats.snapshot()})
+
+
+@staff_member_required
+def query_stats(request):
+    """
+    Per-view SQL query count and time histograms for this process, for monitoring
+    """
+    return JsonResponse({'views': query_budget.query_stats.snapshot()})
+
+
+@staff_member_required
+def task_stats(request):
+    """
+    Background task queue depth and latency, for monitoring
+    """
+    return JsonResponse({'tasks': queue_stats()})
@@ -0,0 +1,27 @@
+from django.contrib import admin
+from questions.admin import LargeTableAdminMixin
+from .models import Notification, Inbox
+
+
+@admin.register(Notification)
+class NotificationAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    """
+    Admin configuration for the Notification model
+    """
+    list_display = ('recipient', 'verb', 'question', 'actor_count', 'unread', 'updated_at')
+    list_filter = ('verb', 'unread')
+    list_select_related = ('recipient', 'question', 'last_actor')
+    readonly_fields = ('created_at', 'updated_at')
+    raw_id_fields = ('recipient', 'question', 'last_actor')
+
+
+@admin.register(Inbox)
+class InboxAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the stored unread counts, maintained by
+    notifications.delivery rather than edited by hand
+    """
+    list_display = ('user', 'unread_count')
+    list_select_related = ('user',)
+    search_fields = ('user__username',)
+    readonly_fields = ('user', 'unread_count')
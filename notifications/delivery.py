@@ -0,0 +1,190 @@
+"""
+Fan-out-on-write delivery of notifications into per-user inboxes.
+
+Signal receivers record events with notify() on the transaction that
+caused them. When it commits, the events of the whole transaction (one
+answer, or a batch of buffered likes) are delivered together by the
+deliver_notifications task, in one write transaction with a fixed number of
+statements however many events there are. Recipients are looked up in bulk.
+Events for an object that already has an unread notification are coalesced
+into it with one UPDATE, the rest are inserted with one bulk INSERT, and
+the recipients' stored unread counts are moved with one more UPDATE.
+
+Notifications whose question or answer is deleted (hidden or removed) are
+withdrawn, and their unread ones taken off the stored counts, so the count
+and the dropdown agree.
+
+actor_count counts people rather than events: within a batch each actor
+counts once, and an event by the notification's latest actor is not counted
+again, so one user toggling a like on and off does not become "3 people".
+An actor coming back after someone else acted in between is counted again.
+"""
+import threading
+import weakref
+from collections import Counter
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from core.db import run_write_transaction
+from questions.models import Question, Answer
+from .models import Notification, Inbox
+from . import tasks
+
+
+# The batch waiting for the current transaction on each connection of this
+# thread (connections are per thread), by alias. Only the batch's on_commit
+# registration keeps it alive, so when the transaction or the savepoint that
+# created it is rolled back it is dropped here too and the next event starts
+# a new one.
+_pending = threading.local()
+
+
+def _batches():
+    if not hasattr(_pending, 'batches'):
+        _pending.batches = weakref.WeakValueDictionary()
+    return _pending.batches
+
+
+class _Batch:
+    """
+    on_commit callback holding the events of one transaction
+    """
+    def __init__(self, using):
+        self.using = using
+        self.events = []
+
+    def __call__(self):
+        batches = _batches()
+        if batches.get(self.using) is self:
+            del batches[self.using]
+        tasks.deliver_notifications.delay(self.events)
+
+
+def notify(verb, question_id, answer_id, actor_id, using=None):
+    """
+    Record that actor_id answered the question (ANSWERED) or liked the
+    answer (LIKED); delivered once the current transaction commits, with
+    the rest of its events. Events from a savepoint rolled back inside it
+    are delivered too, and dropped there if their answer is gone
+    """
+    event = [verb, question_id, answer_id, actor_id]
+    using = using or DEFAULT_DB_ALIAS
+    batches = _batches()
+    batch = batches.get(using)
+    if batch is not None:
+        batch.events.append(event)
+        return
+    batch = batches[using] = _Batch(using)
+    batch.events.append(event)
+    # Outside a transaction this delivers at once
+    transaction.on_commit(batch, using=using)
+
+
+def deliver(events):
+    """
+    Write a batch of events into the recipients' inboxes; returns the number
+    of notifications created
+    """
+    return run_write_transaction(_deliver, events)
+
+
+def _deliver(events):
+    answers = {
+        pk: (author_id, question_id)
+        for pk, author_id, question_id in Answer.objects.filter(
+            pk__in={answer_id for _, _, answer_id, _ in events}
+        ).values_list('pk', 'author_id', 'question_id')
+    }
+    question_authors = dict(Question.objects.filter(
+        pk__in={question_id for verb, question_id, _, _ in events if verb == Notification.ANSWERED}
+    ).values_list('pk', 'author_id'))
+    actors = set(User.objects.filter(pk__in={actor_id for *_, actor_id in events}).values_list('pk', flat=True))
+
+    grouped = {}
+    for verb, question_id, answer_id, actor_id in events:
+        # Rolled back, or deleted since
+        if answer_id not in answers or actor_id not in actors:
+            continue
+        if verb == Notification.ANSWERED:
+            recipient, object_id = question_authors.get(question_id), question_id
+        else:
+            (recipient, question_id), object_id = answers[answer_id], answer_id
+        if recipient is None or recipient == actor_id:
+            continue
+        entry = grouped.setdefault((recipient, verb, object_id), {'question_id': question_id, 'actors': {}})
+        # Latest actor last
+        entry['actors'].pop(actor_id, None)
+        entry['actors'][actor_id] = True
+    if not grouped:
+        return 0
+
+    existing = {}
+    last_actors = {}
+    for pk, recipient, verb, object_id, last_actor_id in Notification.objects.filter(
+        unread=True,
+        recipient_id__in={recipient for recipient, _, _ in grouped},
+        object_id__in={object_id for _, _, object_id in grouped},
+    ).values_list('pk', 'recipient_id', 'verb', 'object_id', 'last_actor_id'):
+        if (recipient, verb, object_id) in grouped:
+            existing[(recipient, verb, object_id)] = pk
+            last_actors[pk] = last_actor_id
+    if existing:
+        Notification.objects.filter(pk__in=existing.values()).update(
+            # The latest actor is already counted
+            actor_count=F('actor_count') + Case(*(
+                When(pk=pk, then=Value(len(grouped[key]['actors'].keys() - {last_actors[pk]})))
+                for key, pk in existing.items()
+            )),
+            last_actor_id=Case(*(
+                When(pk=pk, then=Value(list(grouped[key]['actors'])[-1])) for key, pk in existing.items()
+            )),
+            updated_at=timezone.now(),
+        )
+    created = Notification.objects.bulk_create([
+        Notification(
+            recipient_id=recipient,
+            verb=verb,
+            object_id=object_id,
+            question_id=entry['question_id'],
+            last_actor_id=list(entry['actors'])[-1],
+            actor_count=len(entry['actors']),
+        )
+        for (recipient, verb, object_id), entry in grouped.items()
+        if (recipient, verb, object_id) not in existing
+    ])
+
+    unread = Counter(notification.recipient_id for notification in created)
+    if unread:
+        Inbox.objects.bulk_create([Inbox(user_id=user_id) for user_id in unread], ignore_conflicts=True)
+        Inbox.objects.filter(user_id__in=unread).update(unread_count=F('unread_count') + Case(*(
+            When(user_id=user_id, then=Value(count)) for user_id, count in unread.items()
+        )))
+    return len(created)
+
+
+def mark_read(user):
+    """
+    Mark all of the user's notifications read and zero their unread count;
+    run it in a write transaction
+    """
+    Notification.objects.filter(recipient=user, unread=True).update(unread=False)
+    Inbox.objects.filter(user=user).update(unread_count=0)
+
+
+def withdraw(notifications):
+    """
+    Delete the notifications, taking their unread ones off the recipients'
+    stored counts; run it in a transaction
+    """
+    rows = list(notifications.values_list('pk', 'recipient_id', 'unread'))
+    if not rows:
+        return
+    unread = Counter(recipient for _, recipient, is_unread in rows if is_unread)
+    if unread:
+        Inbox.objects.filter(user_id__in=unread).update(unread_count=Greatest(
+            F('unread_count') - Case(*(When(user_id=user_id, then=Value(count)) for user_id, count in unread.items())),
+            Value(0),
+        ))
+    Notification.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
@@ -0,0 +1,74 @@
+from django.db import models
+from django.db.models import Q
+from django.contrib.auth.models import User
+from questions.models import Question
+
+
+class Notification(models.Model):
+    """
+    One entry in a user's inbox. Activity on the same object while its
+    notification is unread is coalesced into it ("12 people liked your answer")
+    """
+    ANSWERED = 'answered'
+    LIKED = 'liked'
+    VERB_CHOICES = [
+        (ANSWERED, 'Answered your question'),
+        (LIKED, 'Liked your answer'),
+    ]
+
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    verb = models.CharField(max_length=10, choices=VERB_CHOICES)
+    # The question answered or the answer liked: what notifications coalesce on
+    object_id = models.PositiveBigIntegerField()
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='+')
+    last_actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    actor_count = models.PositiveIntegerField(default=1)
+    unread = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Notification'
+        verbose_name_plural = 'Notifications'
+        ordering = ['-updated_at']
+        indexes = [
+            # A user's latest notifications (the dropdown) in one index range scan
+            models.Index(fields=['recipient', '-updated_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient', 'verb', 'object_id'],
+                condition=Q(unread=True),
+                name='notifications_notification_one_unread',
+            ),
+        ]
+
+    def __str__(self):
+        return self.summary()
+
+    def summary(self):
+        """
+        The notification as one sentence
+        """
+        if self.actor_count > 1:
+            who = f'{self.actor_count} people'
+        else:
+            who = self.last_actor.username if self.last_actor else 'Someone'
+        if self.verb == self.ANSWERED:
+            return f'{who} answered your question "{self.question.title}"'
+        return f'{who} liked your answer to "{self.question.title}"'
+
+
+class Inbox(models.Model):
+    """
+    Stored unread notification count for a user, so showing it needs no COUNT
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='inbox')
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Inbox'
+        verbose_name_plural = 'Inboxes'
+
+    def __str__(self):
+        return f"Inbox of user {self.user_id}"
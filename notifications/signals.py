@@ -0,0 +1,55 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from questions.models import Question, Answer
+from questions.signals import like_toggled, soft_deleted
+from .models import Notification
+from . import delivery
+
+
+@receiver(post_save, sender=Answer)
+def notify_question_author(sender, instance, created, raw=False, using=None, **kwargs):
+    """
+    Tell the question's author about a new answer
+    """
+    if created and not raw:
+        delivery.notify(Notification.ANSWERED, instance.question_id, instance.pk, instance.author_id, using=using)
+
+
+@receiver(like_toggled)
+def notify_answer_author(sender, answer, user, liked, using=None, **kwargs):
+    """
+    Tell the answer's author about a like, unless they liked it themselves
+    """
+    if liked and answer.author_id != user.pk:
+        delivery.notify(Notification.LIKED, answer.question_id, answer.pk, user.pk, using=using)
+
+
+@receiver(soft_deleted)
+def withdraw_hidden(sender, pks, **kwargs):
+    """
+    Hidden questions take their notifications with them, hidden answers their likes
+    """
+    if sender is Question:
+        delivery.withdraw(Notification.objects.filter(question_id__in=pks))
+    else:
+        delivery.withdraw(Notification.objects.filter(verb=Notification.LIKED, object_id__in=pks))
+
+
+@receiver(pre_delete, sender=Question)
+def withdraw_question_notifications(sender, instance, **kwargs):
+    """
+    Uncount the unread notifications the cascade is about to remove, unless
+    they went when the question was hidden
+    """
+    if instance.deleted_at is None:
+        delivery.withdraw(Notification.objects.filter(question=instance))
+
+
+@receiver(post_delete, sender=Answer)
+def withdraw_answer_likes(sender, instance, origin=None, **kwargs):
+    """
+    Withdraw the like notifications of a deleted answer; hidden answers had
+    theirs withdrawn already, and a deleted question's go with it
+    """
+    if instance.deleted_at is None and not isinstance(origin, Question):
+        delivery.withdraw(Notification.objects.filter(verb=Notification.LIKED, object_id=instance.pk))
@@ -0,0 +1,10 @@
+from tasks.queue import task
+from . import delivery
+
+
+@task
+def deliver_notifications(events):
+    """
+    Deliver one transaction's notification events (see notifications.delivery)
+    """
+    delivery.deliver(events)
@@ -0,0 +1,183 @@
+from io import StringIO
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from questions import deletion
+from questions.models import Question, Answer, Like
+from tasks.models import Task
+from .models import Notification, Inbox
+from . import delivery
+
+
+class NotificationTest(TestCase):
+    """
+    Test case for fan-out-on-write notifications
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        # Deliver (nothing, for a self-answer) so later events start their own batch
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question = Question.objects.create(
+                title='Test Question',
+                description='This is a test question',
+                author=self.user
+            )
+            self.answer = Answer.objects.create(
+                question=self.question,
+                author=self.user,
+                content='This is a test answer'
+            )
+        self.readers = User.objects.bulk_create(User(username=f'reader{i}') for i in range(12))
+
+    def unread(self):
+        return Inbox.objects.get(user=self.user).unread_count
+
+    def test_answer_notifies_question_author(self):
+        """Test a new answer notifies the question's author, but not for their own"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(question=self.question, author=self.user, content='Self answer')
+        self.assertFalse(Notification.objects.exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(question=self.question, author=self.readers[0], content='Answer')
+        notification = Notification.objects.get()
+        self.assertEqual(
+            (notification.recipient, notification.verb, notification.last_actor),
+            (self.user, Notification.ANSWERED, self.readers[0]),
+        )
+        self.assertEqual(notification.summary(), 'reader0 answered your question "Test Question"')
+        self.assertEqual(self.unread(), 1)
+
+    def test_likes_coalesce(self):
+        """Test likes on one answer coalesce into one unread notification"""
+        for reader in self.readers:
+            with self.captureOnCommitCallbacks(execute=True):
+                Like.objects.toggle(self.answer, reader)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 12)
+        self.assertEqual(notification.last_actor, self.readers[-1])
+        self.assertEqual(notification.summary(), '12 people liked your answer to "Test Question"')
+        self.assertEqual(self.unread(), 1)
+
+    def test_repeat_toggles_count_one_person(self):
+        """Test one user toggling a like on and off is still one person"""
+        for _ in range(5):
+            with self.captureOnCommitCallbacks(execute=True):
+                Like.objects.toggle(self.answer, self.readers[0])
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 1)
+        self.assertEqual(notification.summary(), 'reader0 liked your answer to "Test Question"')
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.apply_toggles({(self.answer.pk, self.readers[0].pk): False})
+            Like.objects.apply_toggles({(self.answer.pk, self.readers[1].pk): True})
+        self.assertEqual(Notification.objects.get().actor_count, 2)
+
+    @override_settings(DELETION={**settings.DELETION, 'BACKGROUND': False})
+    def test_deleted_targets_uncounted(self):
+        """Test hiding, purging or deleting a question or answer withdraws its notifications from the count"""
+        other = Question.objects.create(title='Other Question', author=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.toggle(self.answer, self.readers[0])
+            Answer.objects.create(question=other, author=self.readers[1], content='Answer')
+        self.assertEqual(self.unread(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            deletion.delete_question(self.question)
+        self.assertEqual(self.unread(), 1)
+        self.assertEqual(list(Notification.objects.values_list('question', flat=True)), [other.pk])
+        other.delete()
+        self.assertEqual(self.unread(), 0)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_deleted_answer_withdraws_likes(self):
+        """Test deleting a liked answer withdraws its like notification"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.toggle(self.answer, self.readers[0])
+        self.answer.delete()
+        self.assertEqual(self.unread(), 0)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_repair_counters_recounts_inbox(self):
+        """Test repair_counters brings a drifted unread count back to the unread notifications"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.toggle(self.answer, self.readers[0])
+        Inbox.objects.filter(user=self.user).update(unread_count=5)
+        call_command('repair_counters', stdout=StringIO())
+        self.assertEqual(self.unread(), 1)
+
+    def test_batch_delivered_in_fixed_statements(self):
+        """Test a transaction's events are delivered together in a fixed number of queries"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            Like.objects.apply_toggles({(self.answer.pk, reader.pk): True for reader in self.readers})
+            Answer.objects.create(question=self.question, author=self.readers[0], content='Answer')
+        batches = [callback for callback in callbacks if isinstance(callback, delivery._Batch)]
+        self.assertEqual(len(batches), 1)
+        with self.assertNumQueries(9):
+            batches[0]()
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(self.unread(), 2)
+
+    def test_rolled_back_batch_not_joined(self):
+        """Test events after a rolled back transaction go in a batch of their own and are delivered"""
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Like.objects.toggle(self.answer, self.readers[0])
+                raise RuntimeError
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.toggle(self.answer, self.readers[1])
+        notification = Notification.objects.get()
+        self.assertEqual((notification.last_actor, notification.actor_count), (self.readers[1], 1))
+
+    def test_mark_read(self):
+        """Test reading resets the counter and later activity starts a new notification"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.toggle(self.answer, self.readers[0])
+        self.client.login(username='testuser', password='testpassword123')
+        response = self.client.post(reverse('notification-read'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json(), {'unread': 0})
+        self.assertEqual(self.unread(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.toggle(self.answer, self.readers[1])
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(Notification.objects.filter(unread=True).get().actor_count, 1)
+        self.assertEqual(self.client.get(reverse('notification-count')).json(), {'unread': 1})
+
+    def test_dropdown_one_query(self):
+        """Test the dropdown lists the latest notifications with one notifications query"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.toggle(self.answer, self.readers[0])
+            Answer.objects.create(question=self.question, author=self.readers[1], content='Answer')
+        self.client.login(username='testuser', password='testpassword123')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('notification-dropdown'))
+        self.assertContains(response, 'reader1 answered your question')
+        self.assertContains(response, 'reader0 liked your answer')
+        touching = [query for query in queries.captured_queries if 'notifications_' in query['sql']]
+        self.assertEqual(len(touching), 1)
+
+    def test_deleted_rows_skipped(self):
+        """Test events whose answer is gone by delivery are dropped"""
+        delivery.deliver([[Notification.LIKED, self.question.pk, self.answer.pk + 100, self.readers[0].pk]])
+        self.assertFalse(Notification.objects.exists())
+
+    def test_login_required(self):
+        """Test the notification endpoints are for logged-in users only"""
+        self.assertEqual(self.client.get(reverse('notification-dropdown')).status_code, 302)
+        self.assertEqual(self.client.get(reverse('notification-count')).status_code, 302)
+
+    @override_settings(TASKS={**settings.TASKS, 'ENABLED': True})
+    def test_delivered_by_task_queue(self):
+        """Test delivery is queued as one task per transaction when the queue is on"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.apply_toggles({(self.answer.pk, reader.pk): True for reader in self.readers[:2]})
+        self.assertFalse(Notification.objects.exists())
+        task = Task.objects.get()
+        self.assertEqual(task.name, 'notifications.tasks.deliver_notifications')
+        self.assertEqual(len(task.args[0]), 2)
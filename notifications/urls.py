@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.notification_dropdown, name='notification-dropdown'),
+    path('unread/', views.unread_count, name='notification-count'),
+    path('read/', views.mark_read, name='notification-read'),
+]
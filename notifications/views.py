@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import redirect, render
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_POST
+from core.db import write_transaction
+from .models import Notification, Inbox
+from . import delivery
+
+
+@never_cache
+@login_required
+def unread_count(request):
+    """
+    The user's unread notification count, read from the stored counter
+    """
+    count = Inbox.objects.filter(user=request.user).values_list('unread_count', flat=True).first()
+    return JsonResponse({'unread': count or 0})
+
+
+@never_cache
+@login_required
+def notification_dropdown(request):
+    """
+    The user's latest notifications for the navbar dropdown, in one indexed query
+    """
+    notifications = (
+        Notification.objects.filter(recipient=request.user, question__deleted_at__isnull=True)
+        .select_related('question', 'last_actor')
+        .order_by('-updated_at')[:settings.NOTIFICATIONS['DROPDOWN_SIZE']]
+    )
+    return render(request, 'notifications/_dropdown.html', {'notifications': notifications})
+
+
+@require_POST
+@login_required
+@write_transaction
+def mark_read(request):
+    """
+    Mark all of the user's notifications read
+    """
+    delivery.mark_read(request.user)
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'unread': 0})
+    return redirect('home')
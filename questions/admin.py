@@ -1,69 +1,184 @@
 from django.contrib import admin
-from .models import Question, Answer, Like
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+from .models import Question, Answer, Like, Deletion
+from .pagination import EstimatedCountPaginator
+from . import deletion, search
+
+
+class IndexedSearchMixin:
+    """
+    Route changelist searches through the full-text index instead of
+    icontains scans over the text columns; an exact author username also matches
+    """
+    search_kind = None
+    search_result_limit = 1000
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        ids = [
+            hit.object_id
+            for hit in search.search(search_term, limit=self.search_result_limit, kinds=[self.search_kind])
+        ]
+        return queryset.filter(Q(pk__in=ids) | Q(author__username=search_term)), False
+
+
+class LargeTableAdminMixin:
+    """
+    Changelists for tables too large to count: estimated page counts and no
+    second COUNT(*) for the "N total" link
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class BackgroundDeleteAdminMixin:
+    """
+    Delete through questions.deletion: objects are hidden at once and their
+    rows removed in the background (followed on the Deletion changelist),
+    so the confirmation page does not collect every related row either.
+    soft_delete_function is the questions.deletion function for the model
+    """
+    soft_delete_function = None
+
+    def soft_delete(self, obj):
+        """
+        Hide the object and queue the removal of its rows
+        """
+        # Read off the class so the plain function is not bound as a method
+        function = type(self).soft_delete_function
+        if function is None:
+            raise ImproperlyConfigured(f'{type(self).__name__} must set soft_delete_function')
+        function(obj)
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        return [str(obj) for obj in objs], {self.model._meta.verbose_name_plural: len(objs)}, set(), []
+
+    def delete_model(self, request, obj):
+        self.soft_delete(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.soft_delete(obj)
+
 
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
+class QuestionAdmin(BackgroundDeleteAdminMixin, LargeTableAdminMixin, IndexedSearchMixin, admin.ModelAdmin):
     """
     Admin configuration for the Question model
     """
     list_display = ('title', 'author', 'created_at', 'updated_at', 'answer_count')
     list_filter = ('created_at', 'updated_at')
+    list_select_related = ('author',)
     search_fields = ('title', 'description', 'author__username')
-    readonly_fields = ('created_at', 'updated_at')
-    
-    def answer_count(self, obj):
-        """
-        Count answers for this question
-        """
-        return obj.answers.count()
-    answer_count.short_description = 'Answers'
+    readonly_fields = ('created_at', 'updated_at', 'answer_count')
+    raw_id_fields = ('author',)
+    search_kind = search.QUESTION
+    soft_delete_function = deletion.delete_question
 
 
 @admin.register(Answer)
-class AnswerAdmin(admin.ModelAdmin):
+class AnswerAdmin(LargeTableAdminMixin, IndexedSearchMixin, admin.ModelAdmin):
     """
     Admin configuration for the Answer model
     """
     list_display = ('question_title', 'author', 'created_at', 'updated_at', 'like_count')
     list_filter = ('created_at', 'updated_at')
+    # The related rows the columns and the row labels (__str__) show, joined in one query
+    list_select_related = ('question', 'author')
     search_fields = ('content', 'author__username', 'question__title')
-    readonly_fields = ('created_at', 'updated_at')
-    
+    readonly_fields = ('created_at', 'updated_at', 'like_count')
+    raw_id_fields = ('question', 'author')
+    search_kind = search.ANSWER
+
+    @admin.display(description='Question', ordering='question__title')
     def question_title(self, obj):
         """
         Get the title of the related question
         """
         return obj.question.title
-    question_title.short_description = 'Question'
-    
-    def like_count(self, obj):
-        """
-        Count likes for this answer
-        """
-        return obj.likes.count()
-    like_count.short_description = 'Likes'
 
 
 @admin.register(Like)
-class LikeAdmin(admin.ModelAdmin):
+class LikeAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """
     Admin configuration for the Like model
     """
     list_display = ('user', 'answer_author', 'question_title', 'created_at')
     list_filter = ('created_at',)
+    list_select_related = ('user', 'answer__author', 'answer__question')
     search_fields = ('user__username', 'answer__author__username', 'answer__question__title')
     readonly_fields = ('created_at',)
-    
+    raw_id_fields = ('answer', 'user')
+    search_result_limit = 1000
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Match likes by an exact username (the liker or the answer's author)
+        or by question through the full-text index; every branch is an
+        indexed lookup rather than an icontains scan over the joined tables
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        user_ids = list(User.objects.filter(username=search_term).values_list('pk', flat=True))
+        question_ids = [
+            hit.object_id
+            for hit in search.search(search_term, limit=self.search_result_limit, kinds=[search.QUESTION])
+        ]
+        answers = Answer.objects.filter(Q(author_id__in=user_ids) | Q(question_id__in=question_ids))
+        return queryset.filter(Q(user_id__in=user_ids) | Q(answer_id__in=answers.values('pk'))), False
+
+    @admin.display(description='Answer Author', ordering='answer__author__username')
     def answer_author(self, obj):
         """
         Get the author of the related answer
         """
         return obj.answer.author.username
-    answer_author.short_description = 'Answer Author'
-    
+
+    @admin.display(description='Question', ordering='answer__question__title')
     def question_title(self, obj):
         """
         Get the title of the related question
         """
         return obj.answer.question.title
-    question_title.short_description = 'Question'
\ No newline at end of file
+
+
+@admin.register(Deletion)
+class DeletionAdmin(admin.ModelAdmin):
+    """
+    Progress of background deletions of questions and users; read-only
+    """
+    list_display = ('label', 'kind', 'status', 'progress_display', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('label',)
+    readonly_fields = (
+        'kind', 'object_id', 'label', 'status', 'total', 'removed', 'last_error',
+        'created_at', 'updated_at', 'finished_at',
+    )
+    actions = ['resume_deletions']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Progress')
+    def progress_display(self, obj):
+        """
+        Rows removed out of the rows found when the removal started
+        """
+        return f'{obj.removed} / {obj.total} ({obj.progress:.0%})'
+
+    @admin.action(description='Resume selected unfinished deletions')
+    def resume_deletions(self, request, queryset):
+        resumed = 0
+        for pending in queryset.exclude(status=Deletion.DONE):
+            deletion.schedule(pending)
+            resumed += 1
+        self.message_user(request, f'{resumed} deletion(s) resumed')
@@ -3,4 +3,10 @@ from django.apps import AppConfig
 class QuestionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'questions'
-    verbose_name = 'Questions and Answers'
\ No newline at end of file
+    verbose_name = 'Questions and Answers'
+
+    def ready(self):
+        """
+        Import signals when app is ready
+        """
+        import questions.signals
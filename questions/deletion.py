@@ -0,0 +1,258 @@
+"""
+Deleting questions and users without holding the write lock for the cascade.
+
+delete_question() and delete_user() only hide the target: deleted_at is set
+on the question and its answers (for a user: on their questions, the answers
+under them and their own answers, and the user is deactivated), so the
+default managers leave them out at once. A Deletion row records the request
+and the purge_deletion task then removes likes, answers, questions and
+finally the user in chunks of DELETION['BATCH_SIZE'] rows, each chunk in its
+own short write transaction, pausing DELETION['PAUSE'] seconds between
+chunks so other writers get the database in between.
+
+The purge never runs in the deleting request: it is queued with the
+deleting transaction for the run_tasks worker or, with the task queue
+disabled, handed to a background thread of this process once that
+transaction has committed. The thread purges one deletion at a time; one
+it was given when the process stopped is left running in the admin,
+where it can be resumed. DELETION['BACKGROUND'] = False purges in the
+committing thread instead (for tests).
+
+Likes and answers are deleted without being loaded, a chunk at a time, and
+accounted for by likes_purged and answers_purged, whose receivers keep
+counters, user stats, caches and the search index right with a fixed number
+of statements per chunk; questions are deleted through the ORM, so the
+usual post_delete receivers do that for them. Counters include hidden rows
+until they are removed.
+"""
+import logging
+import threading
+import time
+import traceback
+from collections import Counter
+from functools import partial
+from queue import SimpleQueue
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from core.db import run_write_transaction
+from tasks import queue as task_queue
+from .models import Question, Answer, Like, Deletion
+from . import signals, tasks
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# Deletions handed to the background thread, in order
+_waiting = SimpleQueue()
+_worker = None
+
+
+def config(name):
+    """
+    Read one DELETION setting
+    """
+    return settings.DELETION[name]
+
+
+def delete_question(question):
+    """
+    Hide the question and its answers and queue the removal of their rows;
+    returns the Deletion. Run it in a write transaction
+    """
+    now = timezone.now()
+    Question.all_objects.filter(pk=question.pk).update(deleted_at=now)
+    Answer.all_objects.filter(question_id=question.pk, deleted_at__isnull=True).update(deleted_at=now)
+    question.deleted_at = now
+    signals.soft_deleted.send(sender=Question, pks=[question.pk])
+    return _queue(Deletion.QUESTION, question.pk, question.title)
+
+
+def delete_user(user):
+    """
+    Deactivate the user, hide their questions and answers and queue the
+    removal of their rows; returns the Deletion. Run it in a write transaction
+    """
+    now = timezone.now()
+    user.is_active = False
+    user.save(update_fields=['is_active'])
+    question_ids = list(Question.objects.filter(author=user).values_list('pk', flat=True))
+    # Answers under the user's questions are hidden with them
+    answers = list(Answer.objects.filter(author=user).exclude(question__author=user).values_list('pk', 'question_id'))
+    Question.objects.filter(author=user).update(deleted_at=now)
+    Answer.objects.filter(Q(author=user) | Q(question__author=user)).update(deleted_at=now)
+    signals.soft_deleted.send(sender=Question, pks=question_ids)
+    signals.soft_deleted.send(
+        sender=Answer, pks=[pk for pk, _ in answers], question_ids=[question_id for _, question_id in answers]
+    )
+    return _queue(Deletion.USER, user.pk, user.get_username())
+
+
+def _queue(kind, object_id, label):
+    deletion, _ = Deletion.objects.get_or_create(
+        kind=kind, object_id=object_id, defaults={'label': label[:255]}
+    )
+    schedule(deletion)
+    return deletion
+
+
+def schedule(deletion):
+    """
+    Have the deletion's rows purged in the background once the current
+    transaction commits
+    """
+    if task_queue.enabled():
+        # Committed together with the soft delete, so the worker never sees one without the other
+        tasks.purge_deletion.delay(deletion.pk)
+    else:
+        # Only once the deleting transaction has released the write lock
+        transaction.on_commit(partial(_hand_off, deletion.pk), using=router.db_for_write(Deletion))
+
+
+def _hand_off(deletion_id):
+    if not config('BACKGROUND'):
+        tasks.purge_deletion(deletion_id)
+        return
+    _waiting.put(deletion_id)
+    _ensure_worker()
+
+
+def _run():
+    while True:
+        deletion_id = _waiting.get()
+        try:
+            tasks.purge_deletion(deletion_id)
+        except Exception:
+            logger.exception('Purging deletion #%d failed; resume it from the admin', deletion_id)
+        finally:
+            # This thread's connections are not closed by the request cycle
+            connections.close_all()
+
+
+def _ensure_worker():
+    """
+    Start the purging thread on first use (and again in a forked worker process)
+    """
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='deletion-purge', daemon=True)
+            _worker.start()
+
+
+def purge(deletion_id):
+    """
+    Remove the rows of a deletion chunk by chunk, recording progress; run
+    again after a failure it carries on where it stopped
+    """
+    deletion = Deletion.objects.filter(pk=deletion_id).first()
+    if deletion is None or deletion.status == Deletion.DONE:
+        return
+    stages = _stages(deletion)
+    remaining = sum(queryset.count() for _, queryset in stages)
+    run_write_transaction(
+        lambda: Deletion.objects.filter(pk=deletion.pk).update(
+            status=Deletion.RUNNING, total=F('removed') + remaining, updated_at=timezone.now()
+        )
+    )
+    try:
+        for remove, queryset in stages:
+            while run_write_transaction(_remove_chunk, deletion.pk, remove, queryset):
+                # A large purge outlasts the worker's lease
+                task_queue.heartbeat()
+                time.sleep(config('PAUSE'))
+    except Exception:
+        error = traceback.format_exc()
+        run_write_transaction(
+            lambda: Deletion.objects.filter(pk=deletion.pk).update(last_error=error, updated_at=timezone.now())
+        )
+        raise
+    now = timezone.now()
+    run_write_transaction(
+        lambda: Deletion.objects.filter(pk=deletion.pk).update(
+            status=Deletion.DONE, last_error='', finished_at=now, updated_at=now
+        )
+    )
+
+
+def _stages(deletion):
+    """
+    (remove, queryset) pairs in the order they must run: each remove()
+    deletes one chunk of its queryset and returns the number of rows removed
+    """
+    if deletion.kind == Deletion.QUESTION:
+        return [
+            (_remove_likes, Like.objects.filter(answer__question_id=deletion.object_id)),
+            (_remove_answers, Answer.all_objects.filter(question_id=deletion.object_id)),
+            (_remove_questions, Question.all_objects.filter(pk=deletion.object_id)),
+        ]
+    user_id = deletion.object_id
+    return [
+        (_remove_likes, Like.objects.filter(Q(answer__author_id=user_id) | Q(answer__question__author_id=user_id))),
+        (_remove_answers, Answer.all_objects.filter(Q(author_id=user_id) | Q(question__author_id=user_id))),
+        (_withdraw_likes, Like.objects.filter(user_id=user_id)),
+        (_remove_questions, Question.all_objects.filter(author_id=user_id)),
+        (_remove_users, User.objects.filter(pk=user_id)),
+    ]
+
+
+def _remove_chunk(deletion_id, remove, queryset):
+    removed = remove(queryset, config('BATCH_SIZE'))
+    if removed:
+        Deletion.objects.filter(pk=deletion_id).update(removed=F('removed') + removed, updated_at=timezone.now())
+    return removed
+
+
+def _remove_likes(queryset, batch_size):
+    """
+    Likes on answers that are going away: deleted without loading them
+    """
+    db = router.db_for_write(Like)
+    rows = list(queryset.order_by('pk').values_list('pk', 'user_id')[:batch_size])
+    if rows:
+        Like.objects._delete_rows([pk for pk, _ in rows], db)
+        signals.likes_purged.send(sender=Like, counts=Counter(user_id for _, user_id in rows), using=db)
+    return len(rows)
+
+
+def _withdraw_likes(queryset, batch_size):
+    """
+    Likes a deleted user gave to answers that stay: taken back as unlikes
+    """
+    rows = list(queryset.order_by('pk').values_list('answer_id', 'user_id')[:batch_size])
+    if rows:
+        Like.objects.apply_toggles(dict.fromkeys(rows, False))
+    return len(rows)
+
+
+def _remove_answers(queryset, batch_size):
+    """
+    Hidden answers: deleted without loading them as models or sending
+    per-row signals, and accounted for once per chunk by answers_purged
+    """
+    db = router.db_for_write(Answer)
+    answers = list(
+        queryset.order_by('pk').values_list('pk', 'question_id', 'author_id', 'like_count')[:batch_size]
+    )
+    if answers:
+        chunk = Answer.all_objects.using(db).filter(pk__in=[pk for pk, _, _, _ in answers])
+        # Likes are purged in an earlier stage; any given since go first
+        Like.objects.purge(Like.objects.filter(answer__in=chunk), using=db)
+        chunk._raw_delete(db)
+        signals.answers_purged.send(sender=Answer, answers=answers, using=db)
+    return len(answers)
+
+
+def _remove_questions(queryset, batch_size):
+    pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+    if pks:
+        Question.all_objects.filter(pk__in=pks).delete()
+    return len(pks)
+
+
+def _remove_users(queryset, batch_size):
+    return queryset.delete()[1].get(User._meta.label, 0)
@@ -0,0 +1,35 @@
+"""
+Cheap summaries of what the question pages show, for conditional GET
+(core.conditional): any change a page would render changes its summary.
+
+Besides a primary-key lookup, the summaries read version counters from the
+fragment cache (core.cache) that questions.signals bumps whenever a
+question, an answer or a like changes, so no summary scans a table.
+"""
+from django.db.models import Max
+from core.cache import get_versions
+from .models import Question
+
+
+def question_summary(pk):
+    """
+    The question's own timestamp and answer count with the versions of its
+    card and of its answer list, which move on every answer and like; None
+    if the question does not exist
+    """
+    row = Question.objects.filter(pk=pk).order_by().values('updated_at', 'answer_count').first()
+    if row is not None:
+        row['question_version'] = get_versions('question', [pk])[pk]
+        row['answers_version'] = get_versions('answers', [pk])[pk]
+    return row
+
+
+def feed_summary(sort):
+    """
+    Newest question id, read from the end of the primary key index, and the
+    version of the feed in that sort order
+    """
+    return {
+        'newest': Question.all_objects.aggregate(newest=Max('pk'))['newest'],
+        'version': get_versions('feed', [sort])[sort],
+    }
@@ -0,0 +1,180 @@
+"""
+Write-behind buffer for like toggles (LIKE_BUFFER['ENABLED']).
+
+Toggles are recorded in this process's memory as the state each (answer,
+user) pair should end up in, so a like and an unlike in between flushes
+cancel out, and a background thread writes them every FLUSH_INTERVAL
+seconds (sooner once BATCH_SIZE pairs are waiting) in batches through
+LikeManager.apply_toggles: one transaction and a handful of statements per
+batch instead of one transaction per click.
+
+Until a toggle is flushed the toggling user sees it through toggle() and
+pending_state(), and like counts include the pending toggles of this process.
+Toggles still buffered when the process is killed without exiting are lost.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter
+from itertools import islice
+from django.conf import settings
+from django.db import connections, router
+from core.db import run_write_transaction
+from .models import Like
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# (answer_id, user_id) -> [liked, stored], stored being the state in the
+# database when the pair was first toggled (None once that is not known)
+_pending = {}
+# The batch being written: still the effective state until it is committed
+_flushing = {}
+# Pending change to each answer's stored like count
+_deltas = Counter()
+_flushing_deltas = Counter()
+_wake = threading.Event()
+_worker = None
+
+
+def config(name):
+    """
+    Read one LIKE_BUFFER setting
+    """
+    return settings.LIKE_BUFFER[name]
+
+
+def _effective(key):
+    entry = _pending.get(key) or _flushing.get(key)
+    return None if entry is None else entry[0]
+
+
+def toggle(answer, user):
+    """
+    Like the answer for the user, or unlike it if already liked, in the
+    buffer; returns True if the answer is now liked by the user. The
+    answer's like_count is kept in step, as by LikeManager.toggle().
+    """
+    key = (answer.pk, user.pk)
+    with _lock:
+        current = _effective(key)
+    if current is None:
+        current = Like.objects.using(router.db_for_write(Like)).filter(answer=answer, user=user).exists()
+
+    with _lock:
+        # Another request by the same user may have got here first
+        effective = _effective(key)
+        if key in _pending:
+            stored = _pending[key][1]
+        elif effective is not None:
+            # Written by the flush in progress
+            stored = effective
+        else:
+            stored = effective = current
+        liked = not effective
+        if liked == stored:
+            # Back to what is stored: nothing left to write
+            _pending.pop(key, None)
+        else:
+            _pending[key] = [liked, stored]
+        _deltas[answer.pk] += 1 if liked else -1
+        waiting = len(_pending)
+    answer.like_count = max(answer.like_count + (1 if liked else -1), 0)
+
+    if waiting >= config('BATCH_SIZE'):
+        if config('FLUSH_INTERVAL'):
+            _wake.set()
+        else:
+            flush()
+    _ensure_worker()
+    return liked
+
+
+def pending_state(user_id, answer_ids):
+    """
+    The user's buffered like state for the given answers, and the pending
+    change to each answer's count: ({answer_id: liked}, {answer_id: delta})
+    """
+    with _lock:
+        liked = {}
+        for answer_id in answer_ids:
+            state = _effective((answer_id, user_id))
+            if state is not None:
+                liked[answer_id] = state
+        deltas = {
+            answer_id: _deltas[answer_id] + _flushing_deltas[answer_id]
+            for answer_id in answer_ids
+            if _deltas[answer_id] or _flushing_deltas[answer_id]
+        }
+    return liked, deltas
+
+
+def flush():
+    """
+    Write everything buffered so far, in batches of BATCH_SIZE; returns the
+    number of likes added or removed. On failure the unwritten toggles are
+    put back to be retried.
+    """
+    global _pending, _flushing, _deltas, _flushing_deltas
+    with _lock:
+        if _flushing or not _pending:
+            # Another thread is already flushing, or there is nothing to do
+            return 0
+        _flushing, _pending = _pending, {}
+        _flushing_deltas, _deltas = _deltas, Counter()
+    changed = 0
+    try:
+        items = iter(list(_flushing.items()))
+        while batch := dict(islice(items, config('BATCH_SIZE'))):
+            changed += run_write_transaction(
+                Like.objects.apply_toggles, {key: entry[0] for key, entry in batch.items()}
+            )
+    except Exception:
+        with _lock:
+            # Batches are applied as target states, so retrying written ones is harmless
+            for key, (liked, stored) in _flushing.items():
+                if key in _pending:
+                    # What is stored is unknown now: keep the newer toggle
+                    _pending[key][1] = None
+                else:
+                    _pending[key] = [liked, None]
+            _deltas.update(_flushing_deltas)
+            _flushing, _flushing_deltas = {}, Counter()
+        raise
+    with _lock:
+        _flushing, _flushing_deltas = {}, Counter()
+    return changed
+
+
+def _run():
+    while True:
+        _wake.wait(config('FLUSH_INTERVAL') or None)
+        _wake.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception('Flushing buffered likes failed; retrying on the next run')
+        finally:
+            # This thread's connections are not closed by the request cycle
+            connections.close_all()
+
+
+def _ensure_worker():
+    """
+    Start the flushing thread on first use (and again in a forked worker process)
+    """
+    global _worker
+    if not config('FLUSH_INTERVAL') or (_worker is not None and _worker.is_alive()):
+        return
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='like-buffer-flush', daemon=True)
+            _worker.start()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception('Flushing buffered likes at exit failed; %d toggle(s) lost', len(_pending))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from questions import ranking
+
+
+class Command(BaseCommand):
+    """
+    Periodic job for the hot question ranking; run it from cron every hour or so
+    """
+    help = 'Rebase hot scores onto a new epoch and prune questions that have gone cold'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute all scores from stored questions, answers and likes',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows to read and insert per batch when rebuilding',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            scored = ranking.rebuild(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt hot scores for {scored} question(s)'))
+        else:
+            pruned = ranking.decay()
+            self.stdout.write(self.style.SUCCESS(f'Decayed hot scores, pruned {pruned} cold question(s)'))
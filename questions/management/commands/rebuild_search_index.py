@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from questions import search
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the full-text search index from the questions and answers tables
+    """
+    help = 'Rebuild the search index, streaming rows in primary-key batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of rows to read and index per batch',
+        )
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        total = search.rebuild_index(backend, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {total} document(s) with {type(backend).__name__}'
+        ))
@@ -0,0 +1,141 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.contrib.auth.models import User
+from accounts.models import UserStats
+from notifications.models import Notification, Inbox
+from questions.models import Question, Answer, Like
+
+
+class Command(BaseCommand):
+    """
+    Recompute the denormalized counters and repair any rows that have drifted
+    """
+    help = (
+        'Recompute stored answer and like counters, per-user stats and '
+        'unread notification counts and repair rows that have drifted'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drifted rows, do not write anything',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows to repair per UPDATE statement',
+        )
+
+    def handle(self, *args, **options):
+        # Hidden rows count until questions.deletion purges them, which is
+        # when it takes them off the counters
+        actual = Coalesce(Subquery(
+            Answer.all_objects.filter(question=OuterRef('pk'))
+            .order_by()
+            .values('question')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ), 0)
+        self.repair(
+            'answer_count',
+            Question.all_objects.order_by(),
+            actual,
+            options['batch_size'],
+            options['dry_run'],
+        )
+
+        actual = Coalesce(Subquery(
+            Like.objects.filter(answer=OuterRef('pk'))
+            .order_by()
+            .values('answer')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ), 0)
+        self.repair(
+            'like_count',
+            Answer.all_objects.order_by(),
+            actual,
+            options['batch_size'],
+            options['dry_run'],
+        )
+
+        self.create_missing_stats(options['batch_size'], options['dry_run'])
+        for counter, manager, field in (
+            ('questions_asked', Question.all_objects, 'author'),
+            ('answers_written', Answer.all_objects, 'author'),
+            ('likes_received', Like.objects, 'answer__author'),
+            ('likes_given', Like.objects, 'user'),
+        ):
+            actual = Coalesce(Subquery(
+                manager.filter(**{field: OuterRef('pk')})
+                .order_by()
+                .values(field)
+                .annotate(total=Count('pk'))
+                .values('total')
+            ), 0)
+            self.repair(
+                counter,
+                UserStats.objects.order_by(),
+                actual,
+                options['batch_size'],
+                options['dry_run'],
+            )
+
+        actual = Coalesce(Subquery(
+            Notification.objects.filter(recipient=OuterRef('pk'), unread=True)
+            .order_by()
+            .values('recipient')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ), 0)
+        self.repair(
+            'unread_count',
+            Inbox.objects.order_by(),
+            actual,
+            options['batch_size'],
+            options['dry_run'],
+        )
+
+    def create_missing_stats(self, batch_size, dry_run):
+        """
+        Give users created in bulk (which skips the signals) an empty stats
+        row for the counters to be repaired into
+        """
+        missing = list(User.objects.filter(stats__isnull=True).values_list('pk', flat=True))
+        label = UserStats._meta.label
+        if dry_run or not missing:
+            self.stdout.write(f'{label}: {len(missing)} missing row(s)')
+            return
+
+        for start in range(0, len(missing), batch_size):
+            with transaction.atomic():
+                UserStats.objects.bulk_create(
+                    (UserStats(user_id=pk) for pk in missing[start:start + batch_size]),
+                    ignore_conflicts=True,
+                )
+        self.stdout.write(self.style.SUCCESS(f'{label}: created {len(missing)} missing row(s)'))
+
+    def repair(self, counter, queryset, actual, batch_size, dry_run):
+        """
+        Find rows whose stored counter differs from the recomputed value and
+        fix them in bounded batches
+        """
+        drifted = list(
+            queryset.annotate(actual=actual)
+            .exclude(**{counter: F('actual')})
+            .values_list('pk', flat=True)
+        )
+        label = f'{queryset.model._meta.label}.{counter}'
+        if dry_run or not drifted:
+            self.stdout.write(f'{label}: {len(drifted)} drifted row(s)')
+            return
+
+        for start in range(0, len(drifted), batch_size):
+            batch = drifted[start:start + batch_size]
+            with transaction.atomic():
+                queryset.filter(pk__in=batch).update(**{counter: actual})
+        self.stdout.write(self.style.SUCCESS(f'{label}: repaired {len(drifted)} row(s)'))
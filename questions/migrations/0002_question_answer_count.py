@@ -0,0 +1,35 @@
+# Generated by Django 5.0.5 on 2026-10-18 09:55
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_answer_count(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Question = apps.get_model("questions", "Question")
+    Answer = apps.get_model("questions", "Answer")
+    counts = (
+        Answer.objects.filter(question=OuterRef("pk"))
+        .order_by()
+        .values("question")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Question.objects.using(db_alias).update(answer_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("questions", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="answer_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_answer_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.5 on 2026-10-18 10:04
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_like_count(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Answer = apps.get_model("questions", "Answer")
+    Like = apps.get_model("questions", "Like")
+    counts = (
+        Like.objects.filter(answer=OuterRef("pk"))
+        .order_by()
+        .values("answer")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Answer.objects.using(db_alias).update(like_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("questions", "0002_question_answer_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="answer",
+            name="like_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_like_count, migrations.RunPython.noop),
+    ]
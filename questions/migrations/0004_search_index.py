@@ -0,0 +1,42 @@
+# Generated by Django 5.0.5 on 2026-10-18 10:31
+
+from django.db import OperationalError, migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS questions_search_index USING fts5("
+                "question_id UNINDEXED, title, body, tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5: the in-memory backend is used instead
+            return
+        cursor.execute(
+            "INSERT INTO questions_search_index (rowid, question_id, title, body) "
+            "SELECT id * 2, id, title, description FROM questions_question"
+        )
+        cursor.execute(
+            "INSERT INTO questions_search_index (rowid, question_id, title, body) "
+            "SELECT id * 2 + 1, question_id, '', content FROM questions_answer"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS questions_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("questions", "0003_answer_like_count"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.5 on 2026-10-18 10:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("questions", "0004_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HotScore",
+            fields=[
+                (
+                    "question",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="hotness",
+                        serialize=False,
+                        to="questions.question",
+                    ),
+                ),
+                ("score", models.FloatField(default=0.0)),
+                ("epoch", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Hot Score",
+                "verbose_name_plural": "Hot Scores",
+                "indexes": [
+                    models.Index(fields=["-score"], name="questions_h_score_62227f_idx")
+                ],
+            },
+        ),
+    ]
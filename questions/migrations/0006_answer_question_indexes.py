@@ -0,0 +1,29 @@
+# Generated by Django 5.0.5 on 2026-10-18 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("questions", "0005_hotscore"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="answer",
+            name="questions_a_questio_fe80e9_idx",
+        ),
+        migrations.AddIndex(
+            model_name="answer",
+            index=models.Index(
+                fields=["question", "created_at"], name="questions_a_questio_3215d7_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="answer",
+            index=models.Index(
+                fields=["question", "like_count"], name="questions_a_questio_f4535c_idx"
+            ),
+        ),
+    ]
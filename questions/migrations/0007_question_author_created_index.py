@@ -0,0 +1,25 @@
+# Generated by Django 5.0.5 on 2026-10-18 10:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("questions", "0006_answer_question_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="question",
+            name="questions_q_author__0c91b6_idx",
+        ),
+        migrations.AddIndex(
+            model_name="question",
+            index=models.Index(
+                fields=["author", "-created_at"], name="questions_q_author__17798a_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.5 on 2026-10-18 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("questions", "0008_soft_delete"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="hotscore",
+            index=models.Index(fields=["epoch"], name="questions_h_epoch_fe6791_idx"),
+        ),
+    ]
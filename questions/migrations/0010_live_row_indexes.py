@@ -0,0 +1,55 @@
+# Generated by Django 5.0.5 on 2026-10-18 13:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("questions", "0009_hotscore_epoch_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="answer",
+            name="questions_a_created_0b9f16_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="answer",
+            name="questions_a_questio_3215d7_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="answer",
+            name="questions_a_questio_f4535c_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="question",
+            name="questions_q_created_7d8295_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="question",
+            name="questions_q_author__17798a_idx",
+        ),
+        migrations.AddIndex(
+            model_name="answer",
+            index=models.Index(condition=models.Q(("deleted_at__isnull", True)), fields=["-created_at"], name="questions_a_live_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="answer",
+            index=models.Index(condition=models.Q(("deleted_at__isnull", True)), fields=["question", "created_at"], name="questions_a_live_q_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="answer",
+            index=models.Index(condition=models.Q(("deleted_at__isnull", True)), fields=["question", "like_count"], name="questions_a_live_q_likes_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="question",
+            index=models.Index(condition=models.Q(("deleted_at__isnull", True)), fields=["-created_at"], name="questions_q_live_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="question",
+            index=models.Index(condition=models.Q(("deleted_at__isnull", True)), fields=["author", "-created_at"], name="questions_q_live_author_idx"),
+        ),
+    ]
@@ -1,7 +1,24 @@
-from django.db import models
+from django.db import models, connections, router, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.constants import OnConflict
 from django.contrib.auth.models import User
 from django.urls import reverse
 
+
+# Rows not soft-deleted (see questions.deletion)
+LIVE = Q(deleted_at__isnull=True)
+
+
+class LiveManager(models.Manager):
+    """
+    Default manager leaving out soft-deleted rows (see questions.deletion);
+    all_objects still sees them
+    """
+    def get_queryset(self):
+        return super().get_queryset().filter(LIVE)
+
+
 class Question(models.Model):
     """
     Model representing a user's question
@@ -9,16 +26,26 @@ class Question(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='questions')
+    # Denormalized count of answers, maintained by questions.signals
+    answer_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set when the question is deleted; its rows are removed in the background
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
     
     class Meta:
         verbose_name = 'Question'
         verbose_name_plural = 'Questions'
         ordering = ['-created_at']
+        # Partial on live rows, which is what LiveManager reads: hidden rows
+        # are skipped by the index rather than filtered out row by row
         indexes = [
-            models.Index(fields=['-created_at']),
-            models.Index(fields=['author']),
+            models.Index(fields=['-created_at'], condition=LIVE, name='questions_q_live_created_idx'),
+            # A user's recent questions (profile pages) in one index range scan
+            models.Index(fields=['author', '-created_at'], condition=LIVE, name='questions_q_live_author_idx'),
         ]
     
     def __str__(self):
@@ -26,10 +53,13 @@ class Question(models.Model):
     
     def get_absolute_url(self):
         return reverse('question-detail', kwargs={'pk': self.pk})
-    
-    @property
-    def answer_count(self):
-        return self.answers.count()
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            # Likes go first in one statement, so the cascade does not load and delete them in batches
+            Like.objects.purge(Like.objects.filter(answer__question=self), using=using)
+            return super().delete(using=using, keep_parents=keep_parents)
 
 
 class Answer(models.Model):
@@ -39,25 +69,200 @@ class Answer(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='answers')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='answers')
     content = models.TextField()
+    # Denormalized count of likes, maintained by Like.objects.toggle() and questions.signals
+    like_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set when the answer, its question or its author is deleted
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
     
     class Meta:
         verbose_name = 'Answer'
         verbose_name_plural = 'Answers'
         ordering = ['-created_at']
+        # Live rows only, as for Question
         indexes = [
-            models.Index(fields=['-created_at']),
-            models.Index(fields=['question']),
+            models.Index(fields=['-created_at'], condition=LIVE, name='questions_a_live_created_idx'),
+            # Serve a question's answers newest/oldest first and most liked first
+            models.Index(fields=['question', 'created_at'], condition=LIVE, name='questions_a_live_q_created_idx'),
+            models.Index(fields=['question', 'like_count'], condition=LIVE, name='questions_a_live_q_likes_idx'),
             models.Index(fields=['author']),
         ]
     
     def __str__(self):
         return f"Answer by {self.author.username} on '{self.question.title}'"
-    
-    @property
-    def like_count(self):
-        return self.likes.count()
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            # As for Question.delete()
+            Like.objects.purge(Like.objects.filter(answer=self), using=using)
+            return super().delete(using=using, keep_parents=keep_parents)
+
+
+class LikeManager(models.Manager):
+    """
+    Manager for likes with a write path that avoids read-before-write
+    """
+    def toggle(self, answer, user):
+        """
+        Like the answer for the user, or unlike it if already liked.
+
+        Tries a delete first and, only when no row was removed, an
+        insert-or-ignore, so the like table sees at most two statements; the
+        answer's stored counter is adjusted with a database-side increment,
+        never below zero, inside the same transaction. An unlike is a delete and the counter
+        update, a like the empty delete, the insert and the counter update.
+        Returns True if the answer is now liked by the user.
+        """
+        from .signals import like_toggled
+
+        db = router.db_for_write(self.model)
+        with transaction.atomic(using=db):
+            if self._delete_row(answer, user, db):
+                liked, delta = False, -1
+            else:
+                # A concurrent like of the same pair leaves nothing to count
+                liked, delta = True, int(self._insert_or_ignore(answer, user, db))
+
+            if delta:
+                # Clamped at zero as in apply_toggles, should the counter have drifted
+                Answer.objects.using(db).filter(pk=answer.pk).update(
+                    like_count=Greatest(F('like_count') + delta, Value(0))
+                )
+                answer.like_count = max(answer.like_count + delta, 0)
+                like_toggled.send(
+                    sender=self.model, answer=answer, user=user, liked=liked, using=db
+                )
+        return liked
+
+    def apply_toggles(self, targets):
+        """
+        Write a batch of buffered toggles, given as {(answer_id, user_id): liked}.
+
+        Each pair is brought to the target state, so a batch can be applied
+        again safely: missing likes are added with one bulk insert-or-ignore,
+        unwanted ones removed with one delete and the answers' counters moved
+        with one UPDATE. like_toggled is sent for every like that actually
+        changed. Run it in a transaction; returns the number of changes.
+        """
+        from .signals import like_toggled
+
+        db = router.db_for_write(self.model)
+        answer_ids = {answer_id for answer_id, _ in targets}
+        user_ids = {user_id for _, user_id in targets}
+        existing = {
+            (answer_id, user_id): pk
+            for pk, answer_id, user_id in self.using(db)
+            .filter(answer_id__in=answer_ids, user_id__in=user_ids)
+            .values_list('pk', 'answer_id', 'user_id')
+        }
+        # Answers or users deleted since the toggle are skipped
+        answers = Answer.all_objects.using(db).only(
+            'question_id', 'author_id', 'like_count', 'deleted_at'
+        ).in_bulk(answer_ids)
+        users = set(User.objects.using(db).filter(pk__in=user_ids).values_list('pk', flat=True))
+        added = [
+            key for key, liked in targets.items()
+            if liked and key not in existing and key[0] in answers
+            and answers[key[0]].deleted_at is None and key[1] in users
+        ]
+        removed = [key for key, liked in targets.items() if not liked and key in existing]
+
+        self.using(db).bulk_create(
+            [self.model(answer_id=answer_id, user_id=user_id) for answer_id, user_id in added],
+            ignore_conflicts=True,
+        )
+        self._delete_rows([existing[key] for key in removed], db)
+
+        deltas = {}
+        for answer_id, _ in added:
+            deltas[answer_id] = deltas.get(answer_id, 0) + 1
+        for answer_id, _ in removed:
+            deltas[answer_id] = deltas.get(answer_id, 0) - 1
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if deltas:
+            Answer.objects.using(db).filter(pk__in=deltas).update(like_count=Greatest(
+                F('like_count') + Case(*(When(pk=pk, then=Value(delta)) for pk, delta in deltas.items())),
+                Value(0),
+            ))
+        for (answer_id, user_id), liked in [*((key, True) for key in added), *((key, False) for key in removed)]:
+            answer = answers[answer_id]
+            answer.like_count = max(answer.like_count + (1 if liked else -1), 0)
+            like_toggled.send(sender=self.model, answer=answer, user=User(pk=user_id), liked=liked, using=db)
+        return len(added) + len(removed)
+
+    def purge(self, likes, using=None):
+        """
+        Delete the likes in the queryset ahead of their answers with one
+        DELETE by subquery, without loading them as models or sending
+        per-row signals; likes_purged carries the per-user counts, taken
+        with one GROUP BY. Returns the number removed
+        """
+        from .signals import likes_purged
+
+        db = using or router.db_for_write(self.model)
+        likes = likes.using(db).order_by()
+        counts = dict(likes.values_list('user_id').annotate(Count('pk')))
+        if not counts:
+            return 0
+        removed = likes._raw_delete(db)
+        likes_purged.send(sender=self.model, counts=counts, using=db)
+        return removed
+
+    def _insert_or_ignore(self, answer, user, db):
+        """
+        Insert the like row unless it already exists, returning whether a row was written
+        """
+        connection = connections[db]
+        opts = self.model._meta
+        like = self.model(answer=answer, user=user)
+        fields = [f for f in opts.concrete_fields if not f.primary_key]
+        params = [f.get_db_prep_save(f.pre_save(like, add=True), connection) for f in fields]
+        sql = '%s %s (%s) VALUES (%s) %s' % (
+            connection.ops.insert_statement(on_conflict=OnConflict.IGNORE),
+            connection.ops.quote_name(opts.db_table),
+            ', '.join(connection.ops.quote_name(f.column) for f in fields),
+            ', '.join(['%s'] * len(fields)),
+            connection.ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount > 0
+
+    def _delete_row(self, answer, user, db):
+        """
+        Delete the like row without loading it first, returning the number of rows removed
+        """
+        connection = connections[db]
+        opts = self.model._meta
+        sql = 'DELETE FROM %s WHERE %s = %%s AND %s = %%s' % (
+            connection.ops.quote_name(opts.db_table),
+            connection.ops.quote_name(opts.get_field('answer').column),
+            connection.ops.quote_name(opts.get_field('user').column),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [answer.pk, user.pk])
+            return cursor.rowcount
+
+    def _delete_rows(self, pks, db):
+        """
+        Delete like rows by primary key without loading them or sending signals
+        """
+        if not pks:
+            return
+        connection = connections[db]
+        opts = self.model._meta
+        sql = 'DELETE FROM %s WHERE %s IN (%s)' % (
+            connection.ops.quote_name(opts.db_table),
+            connection.ops.quote_name(opts.pk.column),
+            ', '.join(['%s'] * len(pks)),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, pks)
 
 
 class Like(models.Model):
@@ -67,6 +272,8 @@ class Like(models.Model):
     answer = models.ForeignKey(Answer, on_delete=models.CASCADE, related_name='likes')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='likes')
     created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = LikeManager()
     
     class Meta:
         verbose_name = 'Like'
@@ -79,4 +286,81 @@ class Like(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.user.username} likes answer by {self.answer.author.username}"
\ No newline at end of file
+        return f"{self.user.username} likes answer by {self.answer.author.username}"
+
+
+class HotScore(models.Model):
+    """
+    Materialized hot-ranking score for a question, maintained by questions.ranking
+    """
+    question = models.OneToOneField(
+        Question, on_delete=models.CASCADE, primary_key=True, related_name='hotness'
+    )
+    # Decayed activity expressed relative to epoch; see questions.ranking
+    score = models.FloatField(default=0.0)
+    epoch = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Hot Score'
+        verbose_name_plural = 'Hot Scores'
+        indexes = [
+            models.Index(fields=['-score']),
+            models.Index(fields=['epoch']),
+        ]
+
+    def __str__(self):
+        return f"Hot score {self.score:.3f} for question {self.question_id}"
+
+
+class Deletion(models.Model):
+    """
+    Background removal of a deleted question or user and the rows under it,
+    chunk by chunk (see questions.deletion); the admin shows its progress
+    """
+    QUESTION = 'question'
+    USER = 'user'
+    KIND_CHOICES = [
+        (QUESTION, 'Question'),
+        (USER, 'User'),
+    ]
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    # What was deleted, for display once the row itself is gone
+    label = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # Rows to remove, counted when the removal starts, and removed so far
+    total = models.PositiveIntegerField(default=0)
+    removed = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Deletion'
+        verbose_name_plural = 'Deletions'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='questions_deletion_unique_target'),
+        ]
+
+    def __str__(self):
+        return f"Deletion of {self.kind} '{self.label}'"
+
+    @property
+    def progress(self):
+        """
+        Share of the rows removed so far, from 0 to 1
+        """
+        if self.status == self.DONE:
+            return 1.0
+        return min(self.removed / self.total, 1.0) if self.total else 0.0
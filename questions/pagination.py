@@ -0,0 +1,242 @@
+import base64
+import datetime
+import json
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max, Min, Q, QuerySet
+from django.utils.functional import cached_property
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder that keeps full microsecond precision on datetimes, which
+    DjangoJSONEncoder truncates and keyset comparisons depend on
+    """
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class InvalidCursor(InvalidPage):
+    """
+    Raised when a cursor cannot be decoded or does not match the ordering
+    """
+    pass
+
+
+class CursorPage:
+    """
+    A single page of results produced by CursorPaginator
+    """
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} item(s)>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset paginator over a queryset ordered by a fixed, unique tuple of fields.
+
+    Pages are located with a WHERE clause on the ordering columns instead of an
+    OFFSET, so every page costs the same index range scan and no COUNT(*) is
+    ever issued. Cursors are opaque, URL-safe tokens carrying the ordering
+    values of the row at the edge of the page and the direction to move in.
+    """
+    def __init__(self, queryset, ordering, per_page):
+        self.ordering = tuple(ordering)
+        self.queryset = queryset.order_by(*self.ordering)
+        self.per_page = per_page
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in self.ordering
+        ]
+
+    def page(self, cursor=None):
+        """
+        Return the page addressed by the cursor, or the first page if there is none
+        """
+        queryset, forward, has_before = self._page_query(cursor)
+        return self._build_page(list(queryset), forward=forward, has_before=has_before)
+
+    async def apage(self, cursor=None):
+        """
+        Async version of page()
+        """
+        queryset, forward, has_before = self._page_query(cursor)
+        rows = [obj async for obj in queryset]
+        return self._build_page(rows, forward=forward, has_before=has_before)
+
+    def page_at_offset(self, number):
+        """
+        Return a page by number without counting the table, for shallow
+        legacy page-number links; the returned page carries cursors for
+        onward navigation
+        """
+        return self._build_offset_page(list(self._offset_query(number)), number)
+
+    async def apage_at_offset(self, number):
+        """
+        Async version of page_at_offset()
+        """
+        rows = [obj async for obj in self._offset_query(number)]
+        return self._build_offset_page(rows, number)
+
+    def encode_cursor(self, obj, direction):
+        """
+        Build an opaque cursor pointing just past obj in the given direction
+        """
+        values = [self._value_of(obj, name) for name, _ in self.fields]
+        payload = json.dumps([direction, values], cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """
+        Decode a cursor into its direction and ordering values
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (TypeError, ValueError):
+            raise InvalidCursor('Invalid cursor')
+        if direction not in ('next', 'prev') or not isinstance(values, list) \
+                or len(values) != len(self.fields):
+            raise InvalidCursor('Invalid cursor')
+        try:
+            return direction, [
+                self._to_python(name, value) for (name, _), value in zip(self.fields, values)
+            ]
+        except ValidationError:
+            raise InvalidCursor('Invalid cursor')
+
+    def _page_query(self, cursor):
+        """
+        The look-ahead query for a cursor page, its direction and whether
+        rows exist before it
+        """
+        if not cursor:
+            return self.queryset[:self.per_page + 1], True, False
+
+        direction, values = self.decode_cursor(cursor)
+        forward = direction == 'next'
+        queryset = self.queryset.filter(self._keyset_filter(values, forward))
+        if not forward:
+            queryset = queryset.reverse()
+        return queryset[:self.per_page + 1], forward, True
+
+    def _offset_query(self, number):
+        offset = (number - 1) * self.per_page
+        return self.queryset[offset:offset + self.per_page + 1]
+
+    def _build_offset_page(self, rows, number):
+        if number > 1 and not rows:
+            raise InvalidPage('That page contains no results')
+        return self._build_page(rows, forward=True, has_before=number > 1)
+
+    def _build_page(self, rows, forward, has_before):
+        """
+        Trim the look-ahead row and work out which neighbouring pages exist
+        """
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+            has_next, has_previous = has_before, has_more
+        else:
+            has_next, has_previous = has_more, has_before
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(rows[-1], 'next')
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(rows[0], 'prev')
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def _keyset_filter(self, values, forward):
+        """
+        Build the lexicographic "row comes after the cursor" condition.
+
+        The leading column gets a plain range bound as well, which lets the
+        database answer the query with an index range scan.
+        """
+        lead, lead_descending = self.fields[0]
+        bound = 'lte' if lead_descending == forward else 'gte'
+        condition = Q()
+        for i, (name, descending) in enumerate(self.fields):
+            lookup = 'lt' if descending == forward else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[i]})
+            for (prev_name, _), prev_value in zip(self.fields[:i], values[:i]):
+                term &= Q(**{prev_name: prev_value})
+            condition |= term
+        return Q(**{f'{lead}__{bound}': values[0]}) & condition
+
+    def _value_of(self, obj, name):
+        for part in name.split('__'):
+            obj = getattr(obj, 'pk' if part == 'pk' else part)
+        return obj
+
+    def _to_python(self, name, value):
+        opts = self.queryset.model._meta
+        parts = name.split('__')
+        for part in parts[:-1]:
+            opts = opts.get_field(part).related_model._meta
+        field = opts.pk if parts[-1] == 'pk' else opts.get_field(parts[-1])
+        return field.to_python(value)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Page-number paginator that never counts more than exact_count_limit rows.
+
+    Up to the limit the count is exact, from a COUNT(*) over a LIMITed
+    subquery. Past it a queryset filtered no further than its model's
+    default manager (e.g. one leaving out soft-deleted rows) is estimated
+    from the table's primary key range (two index lookups), which is close
+    for append-mostly tables; a filtered one reports the limit, so only its
+    first pages are reachable until the filter is narrowed.
+    """
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        bounded = queryset.order_by()[:self.exact_count_limit + 1].count()
+        if bounded <= self.exact_count_limit or self.is_filtered(queryset):
+            return min(bounded, self.exact_count_limit)
+        return max(self.estimate(queryset), bounded)
+
+    def is_filtered(self, queryset):
+        """
+        Whether the queryset has conditions beyond its default manager's own
+        """
+        return queryset.query.where != queryset.model._default_manager.all().query.where
+
+    def estimate(self, queryset):
+        # The whole table, so MIN and MAX are read straight off the primary key index
+        queryset = queryset.model._base_manager.using(queryset.db).order_by()
+        # Separate queries: SQLite only answers a lone MIN() or MAX() from the index
+        high = queryset.aggregate(value=Max('pk'))['value'] or 0
+        low = queryset.aggregate(value=Min('pk'))['value'] or 0
+        return high - low + 1
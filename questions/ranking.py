@@ -0,0 +1,158 @@
+"""
+Hot question ranking.
+
+A question's hotness is the sum of the weights of its activity (being asked,
+answered, liked), each decayed exponentially with a configurable half-life.
+Scores are stored scaled to a shared epoch:
+
+    score = sum(weight * 2 ** ((t - epoch) / half_life))
+
+Every row is scaled by the same factor, so ordering by the stored column is
+the same as ordering by the current decayed value, and recording activity is
+a single atomic increment of one row. The periodic decay job moves the epoch
+forward, rescales all rows to it (keeping the floats bounded) and prunes
+questions that have gone cold, which drops them from the hot feed.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from core.cache import bump_version
+from .models import Question, Answer, Like, HotScore
+
+_epoch = None
+
+
+def config(name):
+    """
+    Read one HOT_RANKING setting
+    """
+    return settings.HOT_RANKING[name]
+
+
+def boost(when, epoch):
+    """
+    Scale factor of an event at `when` relative to `epoch`
+    """
+    hours = (when - epoch).total_seconds() / 3600
+    return 2 ** (hours / config('HALF_LIFE_HOURS'))
+
+
+def current_epoch(refresh=False):
+    """
+    The epoch scores are currently expressed against, cached per process
+    """
+    global _epoch
+    if _epoch is None or refresh:
+        _epoch = HotScore.objects.aggregate(epoch=Max('epoch'))['epoch'] or timezone.now()
+    return _epoch
+
+
+def record_activity(question_id, weight, when=None):
+    """
+    Add (or, for negative weights, remove) activity on a question.
+
+    The common path is one UPDATE guarded by the epoch the process believes
+    is current; if a decay run has moved the epoch meanwhile, the epoch is
+    re-read and the update retried, and a question without a row gets one.
+    """
+    when = when or timezone.now()
+    for attempt in range(2):
+        epoch = current_epoch(refresh=attempt > 0)
+        delta = weight * boost(when, epoch)
+        score = F('score') + delta
+        if weight < 0:
+            score = Greatest(score, Value(0.0))
+        if HotScore.objects.filter(question_id=question_id, epoch=epoch).update(score=score):
+            return
+    if weight <= 0:
+        return
+
+    with transaction.atomic():
+        row, created = HotScore.objects.select_for_update().get_or_create(
+            question_id=question_id, defaults={'score': delta, 'epoch': epoch}
+        )
+        if not created:
+            # Row left on an older epoch by a concurrent insert; bring it across
+            row.score = row.score * boost(row.epoch, epoch) + delta
+            row.epoch = epoch
+            row.save(update_fields=['score', 'epoch'])
+
+
+def record_new_question(question_id, weight, when=None):
+    """
+    Give a question that has just been created its first score with a single
+    INSERT; it cannot have a row yet, so record_activity's update is skipped.
+    With no guarded update to catch a stale epoch, the epoch is re-read rather
+    than taken from the process cache, which a decay run may have moved past
+    """
+    when = when or timezone.now()
+    epoch = current_epoch(refresh=True)
+    HotScore.objects.create(question_id=question_id, score=weight * boost(when, epoch), epoch=epoch)
+
+
+def decay(now=None):
+    """
+    Rebase every score onto a new epoch and prune cold questions.
+    Returns the number of rows pruned.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        epochs = list(HotScore.objects.order_by().values_list('epoch', flat=True).distinct())
+        for epoch in epochs:
+            HotScore.objects.filter(epoch=epoch).update(
+                score=F('score') * boost(epoch, now), epoch=now
+            )
+        pruned, _ = HotScore.objects.filter(score__lt=config('PRUNE_BELOW')).delete()
+    current_epoch(refresh=True)
+    if pruned:
+        bump_version('feed', 'hot')
+    return pruned
+
+
+def rebuild(now=None, batch_size=500):
+    """
+    Recompute every score from the stored questions, answers and likes within
+    the retention window. Returns the number of questions scored.
+    """
+    now = now or timezone.now()
+    # Activity older than this has decayed below the prune threshold anyway
+    horizon = now - timedelta(hours=config('HALF_LIFE_HOURS') * config('RETENTION_HALF_LIVES'))
+    scores = {}
+
+    def add(question_id, weight, when):
+        scores[question_id] = scores.get(question_id, 0.0) + weight * boost(when, now)
+
+    sources = (
+        (Question.objects.filter(created_at__gte=horizon).values_list('pk', 'created_at'), 'QUESTION_WEIGHT'),
+        (Answer.objects.filter(created_at__gte=horizon).values_list('question_id', 'created_at'), 'ANSWER_WEIGHT'),
+        (Like.objects.filter(created_at__gte=horizon).values_list('answer__question_id', 'created_at'), 'LIKE_WEIGHT'),
+    )
+    for queryset, weight in sources:
+        for question_id, when in queryset.iterator(chunk_size=batch_size):
+            add(question_id, config(weight), when)
+
+    rows = [
+        HotScore(question_id=question_id, score=score, epoch=now)
+        for question_id, score in scores.items()
+        if score >= config('PRUNE_BELOW')
+    ]
+    with transaction.atomic():
+        HotScore.objects.all().delete()
+        HotScore.objects.bulk_create(rows, batch_size=batch_size)
+    current_epoch(refresh=True)
+    bump_version('feed', 'hot')
+    return len(rows)
+
+
+def hot_questions():
+    """
+    Questions ordered by hotness, served from the score index
+    """
+    return (
+        Question.objects.select_related('author')
+        .filter(hotness__isnull=False)
+        .order_by('-hotness__score', '-pk')
+    )
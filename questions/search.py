@@ -0,0 +1,409 @@
+"""
+Full-text search over questions and answers.
+
+Two interchangeable backends implement the same small interface:
+
+* SQLiteFTSBackend keeps an FTS5 virtual table inside the main database, so
+  index writes share the transaction of the row being saved and queries get
+  BM25 ranking, snippets and prefix matching from SQLite itself.
+* InMemoryBackend is a pure-Python inverted index for databases without FTS5.
+  It lives in the process, is filled lazily on first use and is kept current
+  by the same signals.
+
+The backend is chosen with settings.SEARCH_BACKEND ('auto', 'sqlite_fts' or
+'memory'); 'auto' uses FTS5 whenever the index table exists.
+"""
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.html import escape
+
+SearchHit = namedtuple('SearchHit', 'kind object_id question_id snippet score')
+
+QUESTION = 'question'
+ANSWER = 'answer'
+
+FTS_TABLE = 'questions_search_index'
+
+# Title matches count this many times more than body matches
+TITLE_WEIGHT = 5.0
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def doc_key(kind, object_id):
+    """
+    Pack a document's kind and id into a single integer key (FTS5 rowid)
+    """
+    return object_id * 2 + (1 if kind == ANSWER else 0)
+
+
+def split_key(key):
+    return (ANSWER if key % 2 else QUESTION), key // 2
+
+
+def question_document(question):
+    return (QUESTION, question.pk, question.pk, question.title, question.description)
+
+
+def answer_document(answer):
+    return (ANSWER, answer.pk, answer.question_id, '', answer.content)
+
+
+def _render_snippet(text):
+    """
+    Escape a snippet and turn the match markers into <mark> tags
+    """
+    return escape(text).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+class BaseSearchBackend:
+    """
+    Interface shared by the search backends
+    """
+    def index(self, kind, object_id, question_id, title, body):
+        raise NotImplementedError
+
+    def bulk_index(self, documents):
+        for document in documents:
+            self.index(*document)
+
+    def remove(self, kind, object_id):
+        raise NotImplementedError
+
+    def bulk_remove(self, kind, object_ids):
+        for object_id in object_ids:
+            self.remove(kind, object_id)
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search(self, query, limit=20, kinds=None):
+        """
+        Return up to limit SearchHits for the query, best match first
+        """
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    Search backend on an SQLite FTS5 virtual table
+    """
+    def index(self, kind, object_id, question_id, title, body):
+        self.bulk_index([(kind, object_id, question_id, title, body)])
+
+    def bulk_index(self, documents):
+        rows = [
+            (doc_key(kind, object_id), question_id, title or '', body or '')
+            for kind, object_id, question_id, title, body in documents
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows]
+            )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, question_id, title, body) '
+                f'VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove(self, kind, object_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [doc_key(kind, object_id)])
+
+    def bulk_remove(self, kind, object_ids):
+        keys = [doc_key(kind, object_id) for object_id in object_ids]
+        if not keys:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(keys))})', keys
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def search(self, query, limit=20, kinds=None):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        sql = (
+            f"SELECT rowid, question_id, "
+            f"snippet({FTS_TABLE}, -1, %s, %s, '…', 16), "
+            f"bm25({FTS_TABLE}, 0, %s, 1.0) AS rank "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+        )
+        params = [_MARK_START, _MARK_END, TITLE_WEIGHT, match]
+        if kinds and len(set(kinds)) == 1:
+            sql += ' AND rowid %% 2 = %s'
+            params.append(1 if ANSWER in kinds else 0)
+        sql += ' ORDER BY rank LIMIT %s'
+        params.append(limit)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        hits = []
+        for key, question_id, snippet, rank in rows:
+            kind, object_id = split_key(key)
+            hits.append(SearchHit(kind, object_id, question_id, _render_snippet(snippet), -rank))
+        return hits
+
+    @staticmethod
+    def match_expression(query):
+        """
+        Turn free text into an FTS5 query: every word must match, as a prefix
+        """
+        return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+
+class InMemoryBackend(BaseSearchBackend):
+    """
+    Pure-Python inverted index with BM25 ranking and prefix matching
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._reset()
+
+    def _reset(self):
+        self._docs = {}
+        self._postings = defaultdict(dict)
+        self._lengths = {}
+        self._total_length = 0
+        self._terms = []
+        self._terms_dirty = False
+
+    def index(self, kind, object_id, question_id, title, body):
+        self._defer(self._index, kind, object_id, question_id, title, body)
+
+    def remove(self, kind, object_id):
+        self._defer(self._remove, doc_key(kind, object_id))
+
+    def bulk_remove(self, kind, object_ids):
+        keys = [doc_key(kind, object_id) for object_id in object_ids]
+        self._defer(lambda: [self._remove(key) for key in keys])
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._loaded = True
+
+    def bulk_index(self, documents):
+        with self._lock:
+            self._loaded = True
+            for document in documents:
+                self._index(*document)
+
+    def _defer(self, func, *args):
+        """
+        Apply an index change once the surrounding transaction commits, so a
+        rollback never leaves phantom documents in the process-local index
+        """
+        def apply():
+            with self._lock:
+                if self._loaded:
+                    func(*args)
+        transaction.on_commit(apply)
+
+    def _index(self, kind, object_id, question_id, title, body):
+        key = doc_key(kind, object_id)
+        self._remove(key)
+        title_tokens, body_tokens = tokenize(title), tokenize(body)
+        weights = defaultdict(float)
+        for token in title_tokens:
+            weights[token] += TITLE_WEIGHT
+        for token in body_tokens:
+            weights[token] += 1.0
+        for token, weight in weights.items():
+            if token not in self._postings:
+                self._terms_dirty = True
+            self._postings[token][key] = weight
+        length = len(title_tokens) + len(body_tokens)
+        self._docs[key] = (question_id, title or '', body or '', tuple(weights))
+        self._lengths[key] = length
+        self._total_length += length
+
+    def _remove(self, key):
+        document = self._docs.pop(key, None)
+        if document is None:
+            return
+        for token in document[3]:
+            postings = self._postings[token]
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[token]
+                self._terms_dirty = True
+        self._total_length -= self._lengths.pop(key)
+
+    def _expand(self, prefix):
+        """
+        All indexed terms starting with prefix, via binary search over the sorted vocabulary
+        """
+        if self._terms_dirty:
+            self._terms = sorted(self._postings)
+            self._terms_dirty = False
+        start = bisect_left(self._terms, prefix)
+        matches = []
+        for term in self._terms[start:]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if not self._loaded:
+                rebuild_index(self)
+
+    def search(self, query, limit=20, kinds=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            count = len(self._docs)
+            if not count:
+                return []
+            average_length = self._total_length / count or 1.0
+            scores = None
+            for token in tokens:
+                token_scores = defaultdict(float)
+                for term in self._expand(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for key, tf in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._lengths[key] / average_length)
+                        token_scores[key] += idf * tf * (self.k1 + 1) / (tf + norm)
+                # Every word has to match, as with the FTS5 backend
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {key: scores[key] + value for key, value in token_scores.items() if key in scores}
+                if not scores:
+                    return []
+
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+            hits = []
+            for key, score in ranked:
+                kind, object_id = split_key(key)
+                if kinds and kind not in kinds:
+                    continue
+                question_id, title, body, _ = self._docs[key]
+                hits.append(SearchHit(kind, object_id, question_id, self._snippet(title, body, tokens), score))
+                if len(hits) >= limit:
+                    break
+            return hits
+
+    @staticmethod
+    def _snippet(title, body, tokens, size=16):
+        """
+        A window of words around the first match in the body (or the title
+        when only the title matches), with matches marked
+        """
+        def matches(word):
+            return any(w.startswith(t) for w in tokenize(word) for t in tokens)
+
+        words = body.split()
+        first = next((i for i, word in enumerate(words) if matches(word)), None)
+        if first is None:
+            words = title.split() or words
+            first = next((i for i, word in enumerate(words) if matches(word)), 0)
+        start = max(first - size // 4, 0)
+        window = words[start:start + size]
+        marked = [f'{_MARK_START}{w}{_MARK_END}' if matches(w) else w for w in window]
+        text = ' '.join(marked)
+        if start > 0:
+            text = '…' + text
+        if start + size < len(words):
+            text += '…'
+        return _render_snippet(text)
+
+
+def iter_documents(batch_size=500):
+    """
+    Stream index documents for every question and answer in primary-key
+    batches, so a rebuild never holds more than one batch in memory
+    """
+    from .models import Question, Answer
+
+    sources = (
+        (Question, ('pk', 'pk', 'title', 'description'), QUESTION),
+        (Answer, ('pk', 'question_id', 'content'), ANSWER),
+    )
+    for model, fields, kind in sources:
+        last_pk = 0
+        while True:
+            rows = list(
+                model.objects.filter(pk__gt=last_pk).order_by('pk').values_list(*fields)[:batch_size]
+            )
+            if not rows:
+                break
+            if kind == QUESTION:
+                batch = [(kind, pk, pk, title, body) for pk, _, title, body in rows]
+            else:
+                batch = [(kind, pk, question_id, '', body) for pk, question_id, body in rows]
+            yield batch
+            last_pk = rows[-1][0]
+
+
+def rebuild_index(backend=None, batch_size=500):
+    """
+    Clear the index and refill it from the database; returns the document count
+    """
+    backend = backend or get_backend()
+    total = 0
+    with transaction.atomic():
+        backend.clear()
+    for batch in iter_documents(batch_size):
+        with transaction.atomic():
+            backend.bulk_index(batch)
+        total += len(batch)
+    return total
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def fts_available():
+    """
+    Whether the FTS5 index table exists in the default database
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def get_backend():
+    """
+    Return the configured search backend, creating it on first use
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                choice = settings.SEARCH_BACKEND
+                if choice == 'auto':
+                    choice = 'sqlite_fts' if fts_available() else 'memory'
+                _backend = SQLiteFTSBackend() if choice == 'sqlite_fts' else InMemoryBackend()
+    return _backend
+
+
+def search(query, limit=20, kinds=None):
+    return get_backend().search(query, limit=limit, kinds=kinds)
@@ -0,0 +1,355 @@
+from collections import Counter
+from functools import partial
+from django.db import transaction
+from django.db.models import Case, F, QuerySet, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+from .models import Question, Answer, Like
+from . import ranking, search, tasks
+from tasks import queue
+from core.cache import bump_version
+from core.page_cache import purge_tag
+
+# Sent once for every like or unlike, whichever write path produced it.
+# Receivers get the answer, the user, liked (bool) and the database alias.
+like_toggled = Signal()
+
+# Sent when questions or answers are soft-deleted (questions.deletion), with
+# the pks hidden and, for answers, the pks of their questions.
+soft_deleted = Signal()
+
+# Sent when likes are removed in bulk along with their answers, with
+# counts: {user_id: likes of theirs removed}, and the database alias.
+likes_purged = Signal()
+
+# Sent when a chunk of answers is removed in bulk by the deletion purge
+# (questions.deletion), without per-row post_delete, with answers: a list of
+# (pk, question_id, author_id, like_count), and the database alias.
+answers_purged = Signal()
+
+
+def _is_cascade_from(origin, model, pk=None):
+    """
+    Check whether a delete was started from the given parent object (or a
+    queryset of that model), in which case the parent row is going away too.
+    With no pk, any instance of the model counts.
+    """
+    if isinstance(origin, QuerySet):
+        return origin.model is model
+    return isinstance(origin, model) and (pk is None or origin.pk == pk)
+
+
+def _adjust_cached_counter(instance, relation, counter, delta):
+    """
+    Keep an already-loaded parent object in step with the stored counter
+    so callers holding it do not need a refresh_from_db()
+    """
+    field = instance._meta.get_field(relation)
+    if field.is_cached(instance):
+        parent = getattr(instance, relation)
+        setattr(parent, counter, max(getattr(parent, counter) + delta, 0))
+
+
+@receiver(post_save, sender=Answer)
+def increment_answer_count(sender, instance, created, raw=False, **kwargs):
+    """
+    Increment the parent question's answer counter when an answer is created
+    """
+    if not created or raw:
+        return
+    Question.objects.filter(pk=instance.question_id).update(
+        answer_count=F('answer_count') + 1
+    )
+    _adjust_cached_counter(instance, 'question', 'answer_count', 1)
+
+
+@receiver(post_delete, sender=Answer)
+def decrement_answer_count(sender, instance, origin=None, **kwargs):
+    """
+    Decrement the parent question's answer counter when an answer is deleted,
+    unless the question itself is being deleted
+    """
+    if _is_cascade_from(origin, Question, instance.question_id):
+        return
+    Question.objects.filter(pk=instance.question_id, answer_count__gt=0).update(
+        answer_count=F('answer_count') - 1
+    )
+    _adjust_cached_counter(instance, 'question', 'answer_count', -1)
+
+
+@receiver(answers_purged)
+def uncount_purged_answers(sender, answers, using=None, **kwargs):
+    """
+    Take a purged chunk of answers off their questions' counters in one
+    UPDATE; questions that are being purged themselves are left alone
+    """
+    counts = Counter(question_id for _, question_id, _, _ in answers)
+    Question.objects.using(using).filter(pk__in=counts).update(answer_count=Greatest(
+        F('answer_count') - Case(*(When(pk=pk, then=Value(count)) for pk, count in counts.items())),
+        Value(0),
+    ))
+
+
+@receiver(post_save, sender=Like)
+def increment_like_count(sender, instance, created, raw=False, using=None, **kwargs):
+    """
+    Increment the answer's like counter for likes created through the ORM
+    """
+    if not created or raw:
+        return
+    Answer.objects.using(using).filter(pk=instance.answer_id).update(
+        like_count=F('like_count') + 1
+    )
+    _adjust_cached_counter(instance, 'answer', 'like_count', 1)
+    like_toggled.send(
+        sender=Like, answer=instance.answer, user=instance.user, liked=True, using=using
+    )
+
+
+@receiver(post_delete, sender=Like)
+def decrement_like_count(sender, instance, origin=None, using=None, **kwargs):
+    """
+    Decrement the answer's like counter for likes deleted through the ORM,
+    unless the answer (or its question) is being deleted as well
+    """
+    if _is_cascade_from(origin, Answer, instance.answer_id) or _is_cascade_from(origin, Question):
+        return
+    Answer.objects.using(using).filter(pk=instance.answer_id, like_count__gt=0).update(
+        like_count=F('like_count') - 1
+    )
+    _adjust_cached_counter(instance, 'answer', 'like_count', -1)
+    like_toggled.send(
+        sender=Like, answer=instance.answer, user=instance.user, liked=False, using=using
+    )
+
+
+def _refresh_search(kind, pk, document=None):
+    """
+    Update the search index for one object, in the background when the task
+    queue is on; document is None for a deleted object
+    """
+    if queue.enabled():
+        tasks.refresh_search_document.delay(kind, pk)
+    elif document is None:
+        search.get_backend().remove(kind, pk)
+    else:
+        search.get_backend().index(*document)
+
+
+def _remove_search(kind, pks):
+    """
+    Drop many objects from the search index at once, in the background when
+    the task queue is on
+    """
+    if not pks:
+        return
+    if queue.enabled():
+        tasks.remove_search_documents.delay(kind, list(pks))
+    else:
+        search.get_backend().bulk_remove(kind, pks)
+
+
+@receiver(post_save, sender=Question)
+def index_question(sender, instance, raw=False, **kwargs):
+    """
+    Add or refresh the question in the search index
+    """
+    if not raw:
+        _refresh_search(search.QUESTION, instance.pk, search.question_document(instance))
+
+
+@receiver(post_save, sender=Answer)
+def index_answer(sender, instance, raw=False, **kwargs):
+    """
+    Add or refresh the answer in the search index
+    """
+    if not raw:
+        _refresh_search(search.ANSWER, instance.pk, search.answer_document(instance))
+
+
+@receiver(post_delete, sender=Question)
+def unindex_question(sender, instance, **kwargs):
+    """
+    Drop a deleted question from the search index
+    """
+    _refresh_search(search.QUESTION, instance.pk)
+
+
+@receiver(post_delete, sender=Answer)
+def unindex_answer(sender, instance, **kwargs):
+    """
+    Drop a deleted answer from the search index
+    """
+    _refresh_search(search.ANSWER, instance.pk)
+
+
+@receiver(soft_deleted)
+def unindex_soft_deleted(sender, pks, **kwargs):
+    """
+    Drop hidden questions and answers from the search index at once rather
+    than when their rows are purged; answers under a hidden question go
+    with it, as results only show live questions
+    """
+    _remove_search(search.QUESTION if sender is Question else search.ANSWER, pks)
+
+
+@receiver(answers_purged)
+def unindex_purged_answers(sender, answers, **kwargs):
+    """
+    Drop a purged chunk of answers from the search index; those hidden on
+    their own went already, those under a hidden question go here
+    """
+    _remove_search(search.ANSWER, [pk for pk, _, _, _ in answers])
+
+
+@receiver(post_save, sender=Question)
+def rank_new_question(sender, instance, created, raw=False, **kwargs):
+    """
+    Give a new question its initial hot score
+    """
+    if created and not raw:
+        ranking.record_new_question(instance.pk, ranking.config('QUESTION_WEIGHT'), when=instance.created_at)
+
+
+@receiver(post_save, sender=Answer)
+def rank_new_answer(sender, instance, created, raw=False, **kwargs):
+    """
+    Count a new answer towards its question's hot score
+    """
+    if created and not raw:
+        ranking.record_activity(instance.question_id, ranking.config('ANSWER_WEIGHT'))
+
+
+@receiver(like_toggled)
+def rank_like(sender, answer, liked, **kwargs):
+    """
+    Count a like (or take back an unlike) towards the question's hot score
+    """
+    weight = ranking.config('LIKE_WEIGHT')
+    ranking.record_activity(answer.question_id, weight if liked else -weight)
+
+
+def _after_commit(*invalidations, using=None):
+    """
+    Apply cache invalidations once the surrounding transaction commits: made
+    before, a reader in between could cache the old rows under the new
+    version and serve them until the next write
+    """
+    def apply():
+        for invalidate in invalidations:
+            invalidate()
+    transaction.on_commit(apply, using=using)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_fragments(sender, instance, using=None, **kwargs):
+    """
+    Edits make the cached question card stale
+    """
+    _after_commit(partial(bump_version, 'question', instance.pk), using=using)
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def invalidate_answer_fragments(sender, instance, using=None, **kwargs):
+    """
+    Edits make the answer card and its question's answer list stale; new or
+    removed answers also change the question card's count
+    """
+    _after_commit(
+        partial(bump_version, 'answer', instance.pk),
+        partial(bump_version, 'answers', instance.question_id),
+        partial(bump_version, 'question', instance.question_id),
+        using=using,
+    )
+
+
+@receiver(like_toggled)
+def invalidate_liked_answer_fragments(sender, answer, using=None, **kwargs):
+    """
+    Likes change the like count shown in the question's answer list
+    """
+    _after_commit(partial(bump_version, 'answers', answer.question_id), using=using)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def purge_question_list_pages(sender, instance, created=True, using=None, **kwargs):
+    """
+    New and deleted questions change which questions the cached list pages
+    show; edits are covered by the question's own tag
+    """
+    if created:
+        _after_commit(
+            partial(purge_tag, 'collection', 'recent'),
+            partial(purge_tag, 'collection', 'hot'),
+            using=using,
+        )
+
+
+@receiver(answers_purged)
+def invalidate_purged_answers(sender, answers, using=None, **kwargs):
+    """
+    A purged chunk changes its questions' counts and answer lists (hidden
+    answers are gone from both already, but the counts include them until
+    now), both feeds and the hot pages; each invalidated once per chunk
+    """
+    invalidations = []
+    for pk in {question_id for _, question_id, _, _ in answers}:
+        invalidations += [partial(bump_version, 'answers', pk), partial(bump_version, 'question', pk)]
+    invalidations += [
+        partial(bump_version, 'feed', 'recent'),
+        partial(bump_version, 'feed', 'hot'),
+        partial(purge_tag, 'collection', 'hot'),
+    ]
+    _after_commit(*invalidations, using=using)
+
+
+@receiver(soft_deleted)
+def invalidate_soft_deleted(sender, pks, question_ids=(), **kwargs):
+    """
+    Hidden questions and answers go from the cached cards and list pages as
+    soon as the hiding commits
+    """
+    if sender is Question:
+        invalidations = [partial(bump_version, 'question', pk) for pk in pks]
+        invalidations.append(partial(purge_tag, 'collection', 'recent'))
+    else:
+        invalidations = [partial(bump_version, 'answer', pk) for pk in pks]
+        for pk in set(question_ids):
+            invalidations += [partial(bump_version, 'answers', pk), partial(bump_version, 'question', pk)]
+    invalidations.append(partial(purge_tag, 'collection', 'hot'))
+    _after_commit(*invalidations)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+@receiver(soft_deleted)
+def invalidate_feed_validators(sender, using=None, **kwargs):
+    """
+    Questions and answers change what both feeds show (titles, answer
+    counts, the hot order), so their conditional GET validators move on
+    """
+    _after_commit(partial(bump_version, 'feed', 'recent'), partial(bump_version, 'feed', 'hot'), using=using)
+
+
+@receiver(like_toggled)
+def invalidate_hot_feed_validator(sender, using=None, **kwargs):
+    """
+    Likes only move questions around the hot feed
+    """
+    _after_commit(partial(bump_version, 'feed', 'hot'), using=using)
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+@receiver(like_toggled)
+def purge_hot_pages(sender, using=None, **kwargs):
+    """
+    Answers and likes move questions around the hot feed
+    """
+    _after_commit(partial(purge_tag, 'collection', 'hot'), using=using)
@@ -0,0 +1,37 @@
+from tasks.queue import task
+from .models import Question, Answer
+from . import deletion, search
+
+
+@task(dedup=True)
+def refresh_search_document(kind, pk):
+    """
+    Bring the search document of a question or answer in line with the
+    database: index it as stored now, or drop it if the row is gone
+    """
+    if kind == search.QUESTION:
+        obj = Question.objects.filter(pk=pk).first()
+        document = obj and search.question_document(obj)
+    else:
+        obj = Answer.objects.filter(pk=pk).first()
+        document = obj and search.answer_document(obj)
+    if document:
+        search.get_backend().index(*document)
+    else:
+        search.get_backend().remove(kind, pk)
+
+
+@task()
+def remove_search_documents(kind, pks):
+    """
+    Drop the search documents of questions or answers that were hidden or removed
+    """
+    search.get_backend().bulk_remove(kind, pks)
+
+
+@task(dedup=True)
+def purge_deletion(deletion_id):
+    """
+    Remove the rows of a deleted question or user in chunks (see questions.deletion)
+    """
+    deletion.purge(deletion_id)
@@ -1,8 +1,26 @@
-from django.test import TestCase, Client
+from io import StringIO
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, Client, AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.db import OperationalError, connection
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
-from .models import Question, Answer, Like
+from accounts.models import UserStats
+from tasks.models import Task
+from tasks.queue import Worker
+from datetime import timedelta
+from .models import Question, Answer, Like, HotScore, Deletion
+from core.testing import shared_caches
+from .admin import BackgroundDeleteAdminMixin
 from .forms import QuestionForm, AnswerForm
+from .pagination import EstimatedCountPaginator
+from . import deletion, like_buffer, ranking, search
 
 class QuestionModelTest(TestCase):
     """
@@ -348,6 +366,1030 @@ class AnswerAndLikeViewsTest(TestCase):
         self.assertFalse(response.json()['liked'])
         self.assertEqual(response.json()['like_count'], 0)
 
+    @shared_caches()
+    def test_answer_state(self):
+        """Test the like-state endpoint reports hearts, counts and edit rights in one query"""
+        other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpassword123'
+        )
+        other_answer = Answer.objects.create(
+            question=self.question, author=other_user, content='Another answer'
+        )
+        Like.objects.toggle(self.answer, self.user)
+        self.client.login(username='testuser', password='testpassword123')
+        url = reverse('answer-state') + f'?ids={self.answer.pk},{other_answer.pk}'
+        with self.assertNumQueries(2):  # user (the session is cached), answers
+            data = self.client.get(url).json()
+        self.assertTrue(data['authenticated'])
+        self.assertEqual(data['answers'][str(self.answer.pk)], {'liked': True, 'like_count': 1, 'editable': True})
+        self.assertEqual(data['answers'][str(other_answer.pk)], {'liked': False, 'like_count': 0, 'editable': False})
+
+    def test_answer_state_anonymous_and_invalid(self):
+        """Test anonymous users get counts only and bad ids are rejected"""
+        data = self.client.get(reverse('answer-state') + f'?ids={self.answer.pk}').json()
+        self.assertFalse(data['authenticated'])
+        self.assertFalse(data['answers'][str(self.answer.pk)]['liked'])
+        self.assertEqual(self.client.get(reverse('answer-state') + '?ids=1,x').status_code, 400)
+
+    def test_detail_page_same_for_every_viewer(self):
+        """Test the answer list is cached once per question, not per user"""
+        self.client.login(username='testuser', password='testpassword123')
+        Like.objects.toggle(self.answer, self.user)
+        self.client.get(self.question_detail_url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.question_detail_url)
+        self.assertContains(response, 'data-answer-id="%d"' % self.answer.pk)
+        self.assertNotContains(response, 'like-button active')
+        # Past the conditional GET validator, which aggregates the answers
+        self.assertFalse(any('FROM "questions_answer"' in q['sql'] for q in ctx.captured_queries[1:]))
+
+
+class AnswerCounterTest(TestCase):
+    """
+    Test case for the stored answer counter on Question
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpassword123'
+        )
+        self.question = Question.objects.create(
+            title='Test Question',
+            description='This is a test question',
+            author=self.user
+        )
+        self.question_detail_url = reverse('question-detail', kwargs={'pk': self.question.pk})
+
+    def test_counter_follows_posts_and_deletes(self):
+        """Test posting and deleting answers keeps the counter in sync"""
+        self.client.login(username='testuser', password='testpassword123')
+        self.client.post(self.question_detail_url, {'content': 'First answer'})
+        self.client.post(self.question_detail_url, {'content': 'Second answer'})
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.answer_count, 2)
+
+        answer = self.question.answers.first()
+        self.client.post(reverse('answer-delete', kwargs={'pk': answer.pk}))
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.answer_count, 1)
+
+    def test_counter_follows_user_cascade(self):
+        """Test deleting a user decrements counters on other users' questions"""
+        Answer.objects.create(question=self.question, author=self.other_user, content='Answer')
+        Answer.objects.create(question=self.question, author=self.user, content='Answer')
+        self.other_user.delete()
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.answer_count, 1)
+
+    def test_question_delete_cascades(self):
+        """Test deleting a question with answers removes everything"""
+        Answer.objects.create(question=self.question, author=self.other_user, content='Answer')
+        self.question.delete()
+        self.assertFalse(Answer.objects.exists())
+
+    def test_repair_counters_command(self):
+        """Test the repair command fixes drifted counters"""
+        Answer.objects.create(question=self.question, author=self.user, content='Answer')
+        Question.objects.update(answer_count=7)
+        out = StringIO()
+        call_command('repair_counters', '--dry-run', stdout=out)
+        self.assertIn('1 drifted row', out.getvalue())
+        call_command('repair_counters', stdout=out)
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.answer_count, 1)
+
+    def test_list_pages_use_constant_queries(self):
+        """Test list pages do not issue a query per question card"""
+        def count_queries(url):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return len(ctx)
+
+        self.client.login(username='testuser', password='testpassword123')
+        urls = [reverse('question-list'), reverse('home'), reverse('profile')]
+        # The first request caches the logged-in user
+        count_queries(urls[0])
+        baseline = [count_queries(url) for url in urls]
+        for i in range(9):
+            question = Question.objects.create(title=f'Question {i}', author=self.user)
+            Answer.objects.create(question=question, author=self.other_user, content='Answer')
+        self.assertEqual([count_queries(url) for url in urls], baseline)
+
+
+class LikeCounterTest(TestCase):
+    """
+    Test case for the stored like counter on Answer
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.question = Question.objects.create(
+            title='Test Question',
+            description='This is a test question',
+            author=self.user
+        )
+        self.answer = Answer.objects.create(
+            question=self.question,
+            author=self.user,
+            content='This is a test answer'
+        )
+
+    def test_toggle_updates_counter(self):
+        """Test toggling twice likes then unlikes and keeps the counter in sync"""
+        self.assertTrue(Like.objects.toggle(self.answer, self.user))
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.like_count, 1)
+        self.assertFalse(Like.objects.toggle(self.answer, self.user))
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.like_count, 0)
+        self.assertFalse(Like.objects.exists())
+
+    def test_unlike_never_below_zero(self):
+        """Test an unlike leaves a drifted counter at zero rather than negative"""
+        Like.objects.toggle(self.answer, self.user)
+        Answer.objects.filter(pk=self.answer.pk).update(like_count=0)
+        self.assertFalse(Like.objects.toggle(self.answer, self.user))
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.like_count, 0)
+
+    def test_toggle_statements(self):
+        """Test a toggle touches the like table at most twice and an unlike is a delete and the counter update"""
+        def statements():
+            # Leave out the writes of like_toggled receivers (ranking, stats)
+            with CaptureQueriesContext(connection) as ctx:
+                Like.objects.toggle(self.answer, self.user)
+            return [
+                q['sql'] for q in ctx.captured_queries
+                if Like._meta.db_table in q['sql'] or Answer._meta.db_table in q['sql']
+            ]
+
+        liked = statements()
+        self.assertEqual(len([sql for sql in liked if Like._meta.db_table in sql]), 2)
+        self.assertEqual(len(liked), 3)
+        unliked = statements()
+        self.assertEqual(len(unliked), 2)
+        self.assertTrue(unliked[0].startswith('DELETE'))
+
+    def test_user_delete_decrements_counter(self):
+        """Test deleting a liker decrements counters through the cascade"""
+        other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpassword123'
+        )
+        Like.objects.toggle(self.answer, other_user)
+        other_user.delete()
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.like_count, 0)
+
+    def test_detail_view_does_not_load_likes(self):
+        """Test the detail page reads counts without selecting like rows"""
+        Like.objects.toggle(self.answer, self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('question-detail', kwargs={'pk': self.question.pk}))
+        self.assertContains(response, 'likes-count-%d' % self.answer.pk)
+        self.assertFalse(any(Like._meta.db_table in q['sql'] for q in ctx.captured_queries))
+
+
+@override_settings(LIKE_BUFFER={'ENABLED': True, 'FLUSH_INTERVAL': 0, 'BATCH_SIZE': 100})
+class LikeBufferTest(TestCase):
+    """
+    Test case for the write-behind like buffer
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.question = Question.objects.create(
+            title='Test Question',
+            description='This is a test question',
+            author=self.user
+        )
+        self.answer = Answer.objects.create(
+            question=self.question,
+            author=self.user,
+            content='This is a test answer'
+        )
+        self.like_url = reverse('toggle-like', kwargs={'pk': self.answer.pk})
+        self.state_url = reverse('answer-state') + f'?ids={self.answer.pk}'
+        self.addCleanup(like_buffer.flush)
+
+    def readers(self, count):
+        return User.objects.bulk_create(User(username=f'reader{i}') for i in range(count))
+
+    def test_toggle_buffered_until_flush(self):
+        """Test a buffered like is reported at once and written by the flush"""
+        self.client.login(username='testuser', password='testpassword123')
+        data = self.client.post(self.like_url, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+        self.assertEqual((data['liked'], data['like_count']), (True, 1))
+        self.assertFalse(Like.objects.exists())
+        state = self.client.get(self.state_url).json()['answers'][str(self.answer.pk)]
+        self.assertEqual((state['liked'], state['like_count']), (True, 1))
+
+        self.assertEqual(like_buffer.flush(), 1)
+        self.assertTrue(Like.objects.filter(answer=self.answer, user=self.user).exists())
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.like_count, 1)
+        self.assertEqual(UserStats.objects.get(user=self.user).likes_given, 1)
+        state = self.client.get(self.state_url).json()['answers'][str(self.answer.pk)]
+        self.assertEqual((state['liked'], state['like_count']), (True, 1))
+
+    def test_like_then_unlike_cancels(self):
+        """Test a like and an unlike between flushes write nothing"""
+        self.assertTrue(like_buffer.toggle(self.answer, self.user))
+        self.assertFalse(like_buffer.toggle(self.answer, self.user))
+        self.assertEqual(self.answer.like_count, 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(like_buffer.flush(), 0)
+
+    def test_flush_batches_writes(self):
+        """Test many toggles are written with one insert and one delete"""
+        readers = self.readers(5)
+        Like.objects.toggle(self.answer, readers[0])
+        for reader in readers:
+            like_buffer.toggle(self.answer, reader)
+        self.assertEqual(self.answer.like_count, 1 + 4 - 1)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(like_buffer.flush(), 5)
+        writes = [q['sql'].split()[0] for q in ctx.captured_queries if 'questions_like"' in q['sql'].split('(')[0]]
+        self.assertEqual(writes.count('INSERT'), 1)
+        self.assertEqual(writes.count('DELETE'), 1)
+        self.assertEqual(
+            set(Like.objects.values_list('user_id', flat=True)), {reader.pk for reader in readers[1:]}
+        )
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.like_count, 4)
+
+    def test_apply_toggles_is_idempotent(self):
+        """Test applying a batch twice, or for a deleted answer, changes nothing more"""
+        other = Answer.objects.create(question=self.question, author=self.user, content='Gone soon')
+        targets = {(self.answer.pk, self.user.pk): True, (other.pk, self.user.pk): True}
+        other.delete()
+        self.assertEqual(Like.objects.apply_toggles(targets), 1)
+        self.assertEqual(Like.objects.apply_toggles(targets), 0)
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.like_count, 1)
+
+    def test_failed_flush_retried(self):
+        """Test toggles survive a failed flush and are written by the next one"""
+        like_buffer.toggle(self.answer, self.user)
+        with mock.patch.object(Like.objects, 'apply_toggles', side_effect=OperationalError('disk I/O error')):
+            with self.assertRaises(OperationalError):
+                like_buffer.flush()
+        self.assertEqual(like_buffer.pending_state(self.user.pk, [self.answer.pk]), ({self.answer.pk: True}, {self.answer.pk: 1}))
+        self.assertEqual(like_buffer.flush(), 1)
+        self.assertEqual(Like.objects.count(), 1)
+
+    @override_settings(LIKE_BUFFER={'ENABLED': True, 'FLUSH_INTERVAL': 0, 'BATCH_SIZE': 3})
+    def test_full_buffer_flushed(self):
+        """Test the buffer is written as soon as a batch is waiting"""
+        for reader in self.readers(3):
+            like_buffer.toggle(self.answer, reader)
+        self.assertEqual(Like.objects.count(), 3)
+
+
+@override_settings(DELETION={**settings.DELETION, 'BACKGROUND': False})
+class DeletionTest(TestCase):
+    """
+    Test case for soft deletion with the rows removed in the background
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpassword123'
+        )
+        self.question = Question.objects.create(
+            title='Test Question',
+            description='This is a test question',
+            author=self.user
+        )
+        self.answers = [
+            Answer.objects.create(question=self.question, author=self.other_user, content=f'Answer {i}')
+            for i in range(3)
+        ]
+        for answer in self.answers:
+            Like.objects.toggle(answer, self.user)
+            Like.objects.toggle(answer, self.other_user)
+        self.delete_url = reverse('question-delete', kwargs={'pk': self.question.pk})
+
+    def test_delete_view_removes_everything(self):
+        """Test deleting a question removes its rows and keeps stats right"""
+        self.client.login(username='testuser', password='testpassword123')
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(self.delete_url)
+        self.assertRedirects(response, reverse('question-list'))
+        # Only hidden by the request's transaction; removed once it has committed
+        self.assertEqual(Answer.all_objects.count(), 3)
+        self.assertEqual(Deletion.objects.get().status, Deletion.PENDING)
+        for callback in callbacks:
+            callback()
+        self.assertFalse(Question.all_objects.exists())
+        self.assertFalse(Answer.all_objects.exists())
+        self.assertFalse(Like.objects.exists())
+        deletion = Deletion.objects.get()
+        self.assertEqual((deletion.status, deletion.total, deletion.removed), (Deletion.DONE, 10, 10))
+        stats = UserStats.objects.get(user=self.other_user)
+        self.assertEqual((stats.answers_written, stats.likes_given, stats.likes_received), (0, 0, 0))
+        self.assertEqual(UserStats.objects.get(user=self.user).questions_asked, 0)
+
+    @override_settings(
+        TASKS={**settings.TASKS, 'ENABLED': True},
+        DELETION={**settings.DELETION, 'BATCH_SIZE': 2, 'PAUSE': 0},
+    )
+    def test_hidden_at_once_then_purged_in_chunks(self):
+        """Test a deleted question disappears at once and is purged by the worker"""
+        self.client.login(username='testuser', password='testpassword123')
+        self.client.post(self.delete_url)
+        self.assertFalse(Question.objects.exists())
+        self.assertFalse(Answer.objects.exists())
+        self.assertEqual(Answer.all_objects.count(), 3)
+        detail_url = reverse('question-detail', kwargs={'pk': self.question.pk})
+        self.assertEqual(self.client.get(detail_url).status_code, 404)
+        self.assertEqual(Deletion.objects.get().status, Deletion.PENDING)
+
+        Worker().run(burst=True)
+        self.assertFalse(Question.all_objects.exists())
+        self.assertFalse(Like.objects.exists())
+        deletion = Deletion.objects.get()
+        self.assertEqual((deletion.status, deletion.removed, deletion.progress), (Deletion.DONE, 10, 1.0))
+
+    @override_settings(DELETION={**settings.DELETION, 'BATCH_SIZE': 2, 'PAUSE': 0.5})
+    def test_purge_pauses_between_chunks(self):
+        """Test the purge pauses after every chunk"""
+        with self.captureOnCommitCallbacks():
+            job = deletion.delete_question(self.question)
+        with mock.patch.object(deletion.time, 'sleep') as sleep:
+            deletion.purge(job.pk)
+        # Six likes, three answers and the question, two rows at a time
+        self.assertEqual(sleep.call_count, 3 + 2 + 1)
+        sleep.assert_called_with(0.5)
+
+    @override_settings(DELETION={**settings.DELETION, 'BACKGROUND': True})
+    def test_purge_handed_to_thread(self):
+        """Test with the task queue disabled the deleting request leaves the purge to a background thread"""
+        self.client.login(username='testuser', password='testpassword123')
+        with mock.patch.object(deletion, '_ensure_worker') as ensure_worker:
+            with mock.patch.object(deletion, 'purge') as purge:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post(self.delete_url)
+        job = Deletion.objects.get()
+        purge.assert_not_called()
+        ensure_worker.assert_called_once_with()
+        self.assertEqual(deletion._waiting.get_nowait(), job.pk)
+        self.assertEqual((job.status, Answer.all_objects.count()), (Deletion.PENDING, 3))
+
+    def test_purge_resumes_after_failure(self):
+        """Test a failed purge records the error and carries on when run again"""
+        with override_settings(TASKS={**settings.TASKS, 'ENABLED': True}):
+            deletion.delete_question(self.question)
+        job = Deletion.objects.get()
+        with mock.patch.object(deletion, '_remove_answers', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                deletion.purge(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.removed), (Deletion.RUNNING, 6))
+        self.assertIn('database is locked', job.last_error)
+        deletion.purge(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.removed, job.total), (Deletion.DONE, 10, 10))
+
+    def test_admin_user_delete(self):
+        """Test deleting a user in the admin removes their content and likes"""
+        other_question = Question.objects.create(title='Other Question', author=self.other_user)
+        own_answer = Answer.objects.create(question=other_question, author=self.user, content='Mine')
+        Like.objects.toggle(own_answer, self.other_user)
+        User.objects.create_superuser('admin', 'admin@example.com', 'adminpassword123')
+        self.client.login(username='admin', password='adminpassword123')
+        url = reverse('admin:auth_user_delete', args=[self.user.pk])
+        self.assertContains(self.client.get(url), 'testuser')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'post': 'yes'})
+
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(list(Question.all_objects.all()), [other_question])
+        self.assertFalse(Answer.all_objects.exists())
+        self.assertFalse(Like.objects.exists())
+        stats = UserStats.objects.get(user=self.other_user)
+        self.assertEqual((stats.likes_given, stats.likes_received), (0, 0))
+        self.assertEqual(Deletion.objects.get(kind=Deletion.USER).status, Deletion.DONE)
+
+    @override_settings(TASKS={**settings.TASKS, 'ENABLED': True})
+    def test_admin_question_delete_action(self):
+        """Test the admin's bulk delete action hides questions and queues their removal"""
+        User.objects.create_superuser('admin', 'admin@example.com', 'adminpassword123')
+        self.client.login(username='admin', password='adminpassword123')
+        self.client.post(reverse('admin:questions_question_changelist'), {
+            'action': 'delete_selected', '_selected_action': [self.question.pk], 'post': 'yes',
+        })
+        self.assertFalse(Question.objects.exists())
+        self.assertTrue(Question.all_objects.exists())
+        self.assertEqual(Deletion.objects.get().kind, Deletion.QUESTION)
+
+    def test_admin_without_soft_delete_function(self):
+        """Test an admin using the background delete mixin must say how its model is deleted"""
+        class AnswerDeleteAdmin(BackgroundDeleteAdminMixin, admin.ModelAdmin):
+            pass
+
+        model_admin = AnswerDeleteAdmin(Answer, admin.site)
+        answer = Answer.objects.create(question=self.question, author=self.user, content='Mine')
+        with self.assertRaises(ImproperlyConfigured):
+            model_admin.delete_model(None, answer)
+        self.assertTrue(Question.objects.filter(pk=self.question.pk).exists())
+
+    @override_settings(TASKS={**settings.TASKS, 'ENABLED': True})
+    def test_user_delete_hides_content(self):
+        """Test a deleted user's questions and answers are hidden before the purge"""
+        other_question = Question.objects.create(title='Other Question', author=self.other_user)
+        Answer.objects.create(question=other_question, author=self.user, content='Mine')
+        deletion.delete_user(self.user)
+        self.assertEqual(list(Question.objects.all()), [other_question])
+        self.assertFalse(Answer.objects.filter(question=other_question).exists())
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+        self.assertTrue(Task.objects.filter(status=Task.QUEUED).exists())
+
+    @override_settings(TASKS={**settings.TASKS, 'ENABLED': True})
+    def test_repair_between_hide_and_purge(self):
+        """Test repair_counters run before the purge leaves the purge to take hidden rows off"""
+        other_question = Question.objects.create(title='Other Question', author=self.other_user)
+        Answer.objects.create(question=other_question, author=self.other_user, content='Stays')
+        Answer.objects.create(question=other_question, author=self.user, content='Goes')
+        deletion.delete_user(self.user)
+        call_command('repair_counters', stdout=StringIO())
+        other_question.refresh_from_db()
+        self.assertEqual(other_question.answer_count, 2)
+
+        deletion.purge(Deletion.objects.get().pk)
+        other_question.refresh_from_db()
+        self.assertEqual(other_question.answer_count, 1)
+        stats = UserStats.objects.get(user=self.other_user)
+        self.assertEqual((stats.questions_asked, stats.answers_written), (1, 1))
+        output = StringIO()
+        call_command('repair_counters', '--dry-run', stdout=output)
+        self.assertNotRegex(output.getvalue(), r': [1-9]\d* drifted')
+
+    def test_answers_purged_in_bulk(self):
+        """Test a chunk of answers is removed with the same queries whatever its size, counters kept right"""
+        other_question = Question.objects.create(title='Other Question', author=self.other_user)
+        for i in range(4):
+            answer = Answer.objects.create(question=other_question, author=self.user, content=f'Kubernetes {i}')
+            Like.objects.toggle(answer, self.other_user)
+        self.assertEqual(len(search.search('kubernetes')), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.all_objects.filter(question=other_question).update(deleted_at=timezone.now())
+            Answer.all_objects.filter(question=self.question).update(deleted_at=timezone.now())
+
+        queries = []
+        for question in (self.question, other_question):
+            hidden = Answer.all_objects.filter(question=question)
+            with self.captureOnCommitCallbacks(execute=True):
+                with CaptureQueriesContext(connection) as captured:
+                    deletion._remove_answers(hidden, batch_size=10)
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+        self.assertFalse(Answer.all_objects.exists())
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(search.search('kubernetes'), [])
+        self.question.refresh_from_db()
+        other_question.refresh_from_db()
+        self.assertEqual((self.question.answer_count, other_question.answer_count), (0, 0))
+        for user in (self.user, self.other_user):
+            stats = UserStats.objects.get(user=user)
+            self.assertEqual((stats.answers_written, stats.likes_given, stats.likes_received), (0, 0, 0))
+
+    def test_admin_progress(self):
+        """Test the deletion changelist shows progress"""
+        with self.captureOnCommitCallbacks(execute=True):
+            deletion.delete_question(self.question)
+        User.objects.create_superuser('admin', 'admin@example.com', 'adminpassword123')
+        self.client.login(username='admin', password='adminpassword123')
+        response = self.client.get(reverse('admin:questions_deletion_changelist'))
+        self.assertContains(response, '10 / 10 (100%)')
+
+
+@override_settings(ANSWERS_PER_PAGE=2)
+class AnswerPaginationTest(TestCase):
+    """
+    Test case for paginated, sortable answers on the question page
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.question = Question.objects.create(
+            title='Test Question',
+            description='This is a test question',
+            author=self.user
+        )
+        self.answers = [
+            Answer.objects.create(question=self.question, author=self.user, content=f'Answer number {i}')
+            for i in range(5)
+        ]
+        Like.objects.toggle(self.answers[2], self.user)
+        self.detail_url = reverse('question-detail', kwargs={'pk': self.question.pk})
+        self.fragment_url = reverse('question-answers', kwargs={'pk': self.question.pk})
+
+    def walk(self, sort):
+        """Collect answer ids page by page through the load-more fragments"""
+        response = self.client.get(self.detail_url, {'sort': sort})
+        page = response.context['answer_page']
+        seen = [answer.pk for answer in page]
+        while page.has_next():
+            response = self.client.get(self.fragment_url, {'sort': sort, 'cursor': page.next_cursor})
+            page = response.context['answer_page']
+            seen += [answer.pk for answer in page]
+        return seen
+
+    def test_sorts_walk_every_answer(self):
+        """Test each ordering pages through every answer exactly once"""
+        newest = [answer.pk for answer in reversed(self.answers)]
+        self.assertEqual(self.walk('newest'), newest)
+        self.assertEqual(self.walk('oldest'), newest[::-1])
+        top = self.walk('top')
+        self.assertEqual(top[0], self.answers[2].pk)
+        self.assertEqual(sorted(top), sorted(newest))
+
+    def test_first_page_only(self):
+        """Test the question page renders one page and a load-more link"""
+        response = self.client.get(self.detail_url)
+        self.assertContains(response, 'Answer number 4')
+        self.assertNotContains(response, 'Answer number 2')
+        self.assertContains(response, 'load-more-answers')
+
+    def test_fragment_has_no_layout(self):
+        """Test the load-more endpoint returns only the answer cards"""
+        response = self.client.get(self.fragment_url)
+        self.assertTemplateUsed(response, 'questions/_answer_list.html')
+        self.assertNotContains(response, '<html')
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is a 404"""
+        response = self.client.get(self.fragment_url, {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(ROOT_URLCONF='quora_clone.asgi_urls', ANSWERS_PER_PAGE=2)
+class AsyncViewsTest(TestCase):
+    """
+    Test case for the async views served under ASGI
+    """
+    def setUp(self):
+        self.client = AsyncClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.question = Question.objects.create(
+            title='Test Question',
+            description='This is a test question',
+            author=self.user
+        )
+        self.answers = [
+            Answer.objects.create(question=self.question, author=self.user, content=f'Answer number {i}')
+            for i in range(3)
+        ]
+        self.detail_url = reverse('question-detail', kwargs={'pk': self.question.pk})
+
+    async def test_question_list(self):
+        """Test the async question list in page-number mode"""
+        for query in ('', '?page=1', '?page=last', '?sort=hot'):
+            response = await self.client.get(reverse('question-list') + query)
+            self.assertContains(response, 'Test Question')
+        for query in ('?page=2', '?page=0', '?page=abc'):
+            response = await self.client.get(reverse('question-list') + query)
+            self.assertEqual(response.status_code, 404)
+
+    @override_settings(QUESTION_LIST_PAGINATION='cursor')
+    async def test_question_list_cursor(self):
+        """Test the async question list in cursor mode"""
+        for query in ('', '?cursor=', '?page=1', '?sort=hot'):
+            response = await self.client.get(reverse('question-list') + query)
+            self.assertContains(response, 'Test Question')
+        for query in ('?page=2', '?cursor=bad'):
+            response = await self.client.get(reverse('question-list') + query)
+            self.assertEqual(response.status_code, 404)
+
+    async def test_question_detail(self):
+        """Test the async question page shows the first page of answers"""
+        response = await self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Answer number 2')
+        self.assertNotContains(response, 'Answer number 0')
+        self.assertTrue(response.context['answer_page'].has_next())
+        response = await self.client.get(self.detail_url + '?cursor=bad')
+        self.assertEqual(response.status_code, 404)
+        response = await self.client.get(reverse('question-detail', kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_question_detail_cached_answers_not_queried(self):
+        """Test the async question page only queries answers when their fragment misses"""
+        # Driven from this thread, so the ORM calls run on the captured connection
+        get = async_to_sync(self.client.get)
+        get(self.detail_url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = get(self.detail_url)
+        self.assertContains(response, 'Answer number 2')
+        answer_select = 'SELECT "%s".' % Answer._meta.db_table
+        self.assertFalse(any(q['sql'].startswith(answer_select) for q in ctx.captured_queries))
+
+    async def test_post_answer(self):
+        """Test posting an answer through the async question view"""
+        await self.client.aforce_login(self.user)
+        response = await self.client.post(self.detail_url, {'content': 'Async answer'})
+        self.assertRedirects(response, self.detail_url, fetch_redirect_response=False)
+        self.assertTrue(await Answer.objects.filter(content='Async answer').aexists())
+
+    async def test_home(self):
+        """Test the async home page lists the latest questions"""
+        response = await self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Test Question')
+
+    async def test_toggle_like(self):
+        """Test the async like toggle requires login and toggles the like"""
+        url = reverse('toggle-like', kwargs={'pk': self.answers[0].pk})
+        response = await self.client.post(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('login'), response.url)
+
+        await self.client.aforce_login(self.user)
+        response = await self.client.post(url, headers={'X-Requested-With': 'XMLHttpRequest'})
+        self.assertEqual(response.json(), {'status': 'success', 'liked': True, 'like_count': 1})
+        response = await self.client.post(url, headers={'X-Requested-With': 'XMLHttpRequest'})
+        self.assertEqual(response.json(), {'status': 'success', 'liked': False, 'like_count': 0})
+
+
+@override_settings(QUESTION_LIST_PAGINATION='cursor')
+class QuestionCursorPaginationTest(TestCase):
+    """
+    Test case for keyset pagination on the question list
+    """
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('question-list')
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        Question.objects.bulk_create([
+            Question(title=f'Question {i}', author=self.user) for i in range(25)
+        ])
+        # Identical timestamps force the id tie-breaker to do the work
+        Question.objects.update(created_at=timezone.now())
+
+    def walk(self):
+        """Follow next cursors from the first page and collect question ids"""
+        seen, url = [], self.url
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(q.pk for q in response.context['questions'])
+            page = response.context['page_obj']
+            url = f'{self.url}?cursor={page.next_cursor}' if page.has_next() else None
+        return seen
+
+    def test_walks_every_question_once(self):
+        """Test following cursors visits each question exactly once in order"""
+        expected = list(Question.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(self.walk(), expected)
+
+    def test_no_count_query(self):
+        """Test cursor pages never run COUNT(*)"""
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+        self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+
+    def test_stable_when_questions_arrive(self):
+        """Test a new question does not shift the next page"""
+        page = self.client.get(self.url).context['page_obj']
+        second = [q.pk for q in self.client.get(f'{self.url}?cursor={page.next_cursor}').context['questions']]
+        Question.objects.create(title='Brand new', author=self.user)
+        again = [q.pk for q in self.client.get(f'{self.url}?cursor={page.next_cursor}').context['questions']]
+        self.assertEqual(second, again)
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Test stepping forward then back lands on the same page"""
+        first = self.client.get(self.url).context['page_obj']
+        second = self.client.get(f'{self.url}?cursor={first.next_cursor}').context['page_obj']
+        back = self.client.get(f'{self.url}?cursor={second.previous_cursor}').context['page_obj']
+        self.assertEqual([q.pk for q in back], [q.pk for q in first])
+        self.assertFalse(back.has_previous())
+
+    def test_page_numbers(self):
+        """Test shallow page numbers still work and deep or bogus ones 404"""
+        response = self.client.get(f'{self.url}?page=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['page_obj'].has_previous())
+        self.assertEqual(self.client.get(f'{self.url}?page=5000').status_code, 404)
+        self.assertEqual(self.client.get(f'{self.url}?cursor=garbage').status_code, 404)
+
+
+class SearchTest(TestCase):
+    """
+    Test case for full-text search
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.question = Question.objects.create(
+            title='How do I deploy Django?',
+            description='Looking for a <b>production</b> setup',
+            author=self.user
+        )
+        self.answer = Answer.objects.create(
+            question=self.question,
+            author=self.user,
+            content='Use gunicorn behind nginx'
+        )
+        self.search_url = reverse('question-search')
+
+    def test_search_view_finds_questions_and_answers(self):
+        """Test the search page returns ranked question and answer hits"""
+        response = self.client.get(self.search_url, {'q': 'deploy'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['hit'].kind for r in response.context['results']], ['question'])
+        response = self.client.get(self.search_url, {'q': 'gunic'})
+        self.assertEqual([r['hit'].object_id for r in response.context['results']], [self.answer.pk])
+        self.assertContains(response, '<mark>gunicorn</mark>')
+
+    def test_snippets_are_escaped(self):
+        """Test user content in snippets is HTML-escaped"""
+        response = self.client.get(self.search_url, {'q': 'production'})
+        self.assertContains(response, '&lt;b&gt;')
+
+    def test_index_follows_edits_and_deletes(self):
+        """Test saving and deleting rows keeps the index in sync"""
+        self.question.title = 'How do I host Flask?'
+        self.question.save()
+        self.assertEqual(search.search('deploy'), [])
+        self.assertEqual(len(search.search('flask')), 1)
+        self.answer.delete()
+        self.assertEqual(search.search('gunicorn'), [])
+
+    def test_soft_deleted_answers_not_found(self):
+        """Test an answer hidden by its author's deletion drops out of results before the purge"""
+        other_user = User.objects.create_user(username='otheruser', password='testpassword123')
+        Answer.objects.create(question=self.question, author=other_user, content='Use uvicorn behind nginx')
+        self.assertEqual(len(search.search('uvicorn')), 1)
+        deletion.delete_user(other_user)
+        self.assertTrue(Answer.all_objects.filter(author=other_user).exists())
+        self.assertEqual(search.search('uvicorn'), [])
+        response = self.client.get(self.search_url, {'q': 'uvicorn'})
+        self.assertEqual(response.context['results'], [])
+        response = self.client.get(self.search_url, {'q': 'nginx'})
+        self.assertEqual([r['hit'].object_id for r in response.context['results']], [self.answer.pk])
+
+    def test_in_memory_backend(self):
+        """Test the pure-Python fallback ranks, filters and prefix-matches"""
+        Question.objects.create(title='Deploying static files', author=self.user)
+        backend = search.InMemoryBackend()
+        search.rebuild_index(backend, batch_size=1)
+        hits = backend.search('depl')
+        self.assertEqual(len(hits), 2)
+        self.assertEqual(backend.search('deploy django')[0].object_id, self.question.pk)
+        self.assertEqual(backend.search('gunicorn', kinds=[search.QUESTION]), [])
+        self.assertEqual(backend.search('nothing matches'), [])
+
+    def test_rebuild_command(self):
+        """Test the rebuild command repopulates a cleared index"""
+        search.get_backend().clear()
+        out = StringIO()
+        call_command('rebuild_search_index', '--batch-size', '1', stdout=out)
+        self.assertIn('Indexed 2 document(s)', out.getvalue())
+        self.assertEqual(len(search.search('nginx')), 1)
+
+    def test_admin_search_uses_index(self):
+        """Test admin changelist search goes through the index"""
+        User.objects.create_superuser('admin', 'admin@example.com', 'adminpassword123')
+        self.client.login(username='admin', password='adminpassword123')
+        response = self.client.get(reverse('admin:questions_question_changelist'), {'q': 'deplo'})
+        self.assertEqual(list(response.context['cl'].queryset), [self.question])
+
+
+class HotRankingTest(TestCase):
+    """
+    Test case for the materialized hot question ranking
+    """
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.quiet = Question.objects.create(title='Quiet question', author=self.user)
+        self.busy = Question.objects.create(title='Busy question', author=self.user)
+
+    def score(self, question):
+        return HotScore.objects.get(question=question).score
+
+    def test_activity_raises_score(self):
+        """Test answers and likes increase the question's score, unlikes lower it"""
+        before = self.score(self.busy)
+        answer = Answer.objects.create(question=self.busy, author=self.user, content='Answer')
+        after_answer = self.score(self.busy)
+        self.assertGreater(after_answer, before)
+        Like.objects.toggle(answer, self.user)
+        self.assertGreater(self.score(self.busy), after_answer)
+        Like.objects.toggle(answer, self.user)
+        self.assertAlmostEqual(self.score(self.busy), after_answer, places=3)
+        self.assertEqual(list(ranking.hot_questions())[0], self.busy)
+
+    def test_recent_activity_outranks_old_activity(self):
+        """Test identical activity ranks lower the longer ago it happened"""
+        HotScore.objects.all().delete()
+        now = timezone.now()
+        ranking.record_activity(self.quiet.pk, 10, when=now - timedelta(days=2))
+        ranking.record_activity(self.busy.pk, 10, when=now)
+        self.assertEqual(list(ranking.hot_questions()), [self.busy, self.quiet])
+
+    def test_decay_rebases_and_prunes(self):
+        """Test the decay job keeps the order and drops cold questions"""
+        HotScore.objects.all().delete()
+        now = timezone.now()
+        ranking.record_activity(self.quiet.pk, 1, when=now - timedelta(days=30))
+        ranking.record_activity(self.busy.pk, 5, when=now)
+        pruned = ranking.decay(now=now)
+        self.assertEqual(pruned, 1)
+        self.assertEqual(list(ranking.hot_questions()), [self.busy])
+        self.assertAlmostEqual(self.score(self.busy), 5.0, places=3)
+
+    def test_new_question_inserts_score(self):
+        """Test a new question gets its score with an epoch lookup and one insert, no guarded update"""
+        with CaptureQueriesContext(connection) as ctx:
+            question = Question.objects.create(title='New question', author=self.user)
+        statements = [q['sql'] for q in ctx.captured_queries if HotScore._meta.db_table in q['sql']]
+        self.assertEqual(len(statements), 2)
+        self.assertTrue(statements[0].startswith('SELECT MAX'))
+        self.assertTrue(statements[1].startswith('INSERT'))
+        self.assertGreater(self.score(question), 0)
+
+    def test_new_question_after_decay(self):
+        """Test a question asked after a decay run is scored against the new epoch"""
+        Answer.objects.create(question=self.busy, author=self.user, content='Answer')
+        first = Question.objects.create(title='First new question', author=self.user)
+        ranking.decay()
+        # This process still caches the epoch from a week ago
+        ranking._epoch = timezone.now() - timedelta(days=7)
+        second = Question.objects.create(title='Second new question', author=self.user)
+        self.assertEqual(HotScore.objects.get(question=second).epoch, HotScore.objects.get(question=first).epoch)
+        self.assertAlmostEqual(self.score(second), ranking.config('QUESTION_WEIGHT'), places=3)
+        self.assertEqual(list(ranking.hot_questions())[0], self.busy)
+
+    def test_stale_epoch_is_refreshed(self):
+        """Test a process holding an outdated epoch still records activity"""
+        ranking.decay()
+        before = self.score(self.busy)
+        ranking._epoch = timezone.now() - timedelta(days=1)
+        ranking.record_activity(self.busy.pk, 1)
+        self.assertGreater(self.score(self.busy), before)
+
+    def test_hot_sort_views(self):
+        """Test the hot feed on the list and home pages"""
+        Answer.objects.create(question=self.quiet, author=self.user, content='Answer')
+        for url in (reverse('question-list'), reverse('home')):
+            response = self.client.get(url, {'sort': 'hot'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['sort'], 'hot')
+            self.assertEqual(list(response.context['questions'])[0], self.quiet)
+
+    def test_rebuild_command(self):
+        """Test the decay command can rebuild scores from scratch"""
+        HotScore.objects.all().delete()
+        out = StringIO()
+        call_command('decay_hot_scores', '--rebuild', stdout=out)
+        self.assertIn('2 question(s)', out.getvalue())
+        self.assertEqual(HotScore.objects.count(), 2)
+
+
+class AdminChangelistTest(TestCase):
+    """
+    Test case for the question, answer and like admin changelists
+    """
+    def setUp(self):
+        self.client = Client()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'adminpassword123')
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.client.login(username='admin', password='adminpassword123')
+        self.question = Question.objects.create(title='Deploying Django', author=self.user)
+        self.answers = [
+            Answer.objects.create(question=self.question, author=self.user, content=f'Answer {i}')
+            for i in range(3)
+        ]
+        Like.objects.toggle(self.answers[0], self.admin)
+
+    def add_rows(self):
+        users = User.objects.bulk_create(
+            User(username=f'reader{i}', email=f'reader{i}@example.com') for i in range(10)
+        )
+        questions = Question.objects.bulk_create(
+            Question(title=f'Question {i}', author=user) for i, user in enumerate(users)
+        )
+        answers = Answer.objects.bulk_create(
+            Answer(question=question, author=user, content='Seeded')
+            for question, user in zip(questions, users)
+        )
+        Like.objects.bulk_create(Like(answer=answer, user=user) for answer, user in zip(answers, users))
+
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_changelists_run_constant_queries(self):
+        """Test changelists do not issue a query per row"""
+        urls = [
+            reverse('admin:questions_question_changelist'),
+            reverse('admin:questions_answer_changelist'),
+            reverse('admin:questions_like_changelist'),
+        ]
+        # The first request caches the logged-in user
+        self.count_queries(urls[0])
+        baseline = [self.count_queries(url) for url in urls]
+        self.add_rows()
+        Like.objects.toggle(self.answers[1], self.user)
+        self.assertEqual([self.count_queries(url) for url in urls], baseline)
+
+    def test_computed_columns_sortable(self):
+        """Test the columns from related rows can be sorted by"""
+        url = reverse('admin:questions_like_changelist')
+        response = self.client.get(url, {'o': '2'})
+        self.assertContains(response, 'testuser')
+        self.assertEqual(response.context['cl'].result_list[0].answer.question.title, 'Deploying Django')
+        response = self.client.get(reverse('admin:questions_answer_changelist'), {'o': '-1'})
+        self.assertContains(response, 'Deploying Django')
+
+    def test_like_search(self):
+        """Test like search matches usernames exactly and questions through the index"""
+        url = reverse('admin:questions_like_changelist')
+        self.add_rows()
+        for term in ('admin', 'testuser', 'deploying'):
+            response = self.client.get(url, {'q': term})
+            self.assertEqual([like.user for like in response.context['cl'].result_list], [self.admin])
+        response = self.client.get(url, {'q': 'reader3'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_estimated_count(self):
+        """Test large tables are counted up to a limit and estimated past it"""
+        self.add_rows()
+        paginator = EstimatedCountPaginator(Like.objects.order_by('pk'), 5)
+        self.assertEqual(paginator.count, 11)
+        paginator = EstimatedCountPaginator(Like.objects.order_by('pk'), 5)
+        paginator.exact_count_limit = 4
+        ids = Like.objects.values_list('pk', flat=True)
+        self.assertEqual(paginator.count, max(ids) - min(ids) + 1)
+        paginator = EstimatedCountPaginator(Like.objects.filter(user__is_active=True), 5)
+        paginator.exact_count_limit = 4
+        self.assertEqual(paginator.count, 4)
+        self.assertEqual(paginator.num_pages, 1)
+
+    def test_estimated_count_ignores_soft_delete_filter(self):
+        """Test the live-rows filter of the default manager does not stop the estimate"""
+        self.add_rows()
+        ids = Answer.all_objects.values_list('pk', flat=True)
+        paginator = EstimatedCountPaginator(Answer.objects.select_related('question', 'author').order_by('-pk'), 5)
+        paginator.exact_count_limit = 4
+        self.assertEqual(paginator.count, max(ids) - min(ids) + 1)
+        paginator = EstimatedCountPaginator(Answer.objects.filter(content='Seeded'), 5)
+        paginator.exact_count_limit = 4
+        self.assertEqual(paginator.count, 4)
+
 
 class FormTests(TestCase):
     """
@@ -4,7 +4,9 @@ from . import views
 urlpatterns = [
     # Question views
     path('', views.QuestionListView.as_view(), name='question-list'),
+    path('search/', views.QuestionSearchView.as_view(), name='question-search'),
     path('<int:pk>/', views.QuestionDetailView.as_view(), name='question-detail'),
+    path('<int:pk>/answers/', views.QuestionAnswersView.as_view(), name='question-answers'),
     path('new/', views.QuestionCreateView.as_view(), name='question-create'),
     path('<int:pk>/update/', views.QuestionUpdateView.as_view(), name='question-update'),
     path('<int:pk>/delete/', views.QuestionDeleteView.as_view(), name='question-delete'),
@@ -13,4 +15,5 @@ urlpatterns = [
     path('answer/<int:pk>/update/', views.update_answer, name='answer-update'),
     path('answer/<int:pk>/delete/', views.delete_answer, name='answer-delete'),
     path('answer/<int:pk>/like/', views.toggle_like, name='toggle-like'),
+    path('answer/state/', views.answer_state, name='answer-state'),
 ]
\ No newline at end of file
@@ -1,7 +1,10 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import asyncio
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.views.generic import (
     ListView, 
     DetailView, 
@@ -9,12 +12,29 @@ from django.views.generic import (
     UpdateView,
     DeleteView
 )
-from django.urls import reverse_lazy, reverse
-from django.http import HttpResponseRedirect, JsonResponse
+from django.urls import reverse_lazy
+from django.db.models import Exists, OuterRef, Value
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.cache import never_cache
+from django.utils.decorators import method_decorator
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponseRedirect, JsonResponse
 from .models import Question, Answer, Like
 from .forms import QuestionForm, AnswerForm
+from .pagination import CursorPaginator
+from core.cache import attach_versions
+from core.conditional import ConditionalGetMixin
+from core.db import run_write_transaction, write_transaction
+from core.page_cache import tag_page
+from core.rate_limit import rate_limit
+from . import deletion, freshness, like_buffer, ranking, search
 
-class QuestionListView(ListView):
+# Upper bound on answers whose state can be asked for in one request
+ANSWER_STATE_MAX_IDS = 100
+
+
+class QuestionListView(ConditionalGetMixin, ListView):
     """
     View for listing all questions with pagination
     """
@@ -22,41 +42,258 @@ class QuestionListView(ListView):
     template_name = 'questions/question_list.html'
     context_object_name = 'questions'
     paginate_by = 10
+    cursor_ordering = ('-created_at', '-id')
+    hot_cursor_ordering = ('-hotness__score', '-id')
+
+    def get_sort(self):
+        """
+        'hot' ranks by the materialized hot score, anything else lists newest first
+        """
+        return 'hot' if self.request.GET.get('sort') == 'hot' else 'recent'
+
+    def get_validator_row(self):
+        return freshness.feed_summary(self.get_sort())
     
     def get_queryset(self):
         """
-        Get all questions with prefetched author and answer count
+        Get all questions with their authors; the answer count is stored on the row
+        """
+        if self.get_sort() == 'hot':
+            return ranking.hot_questions()
+        return Question.objects.select_related('author').all()
+
+    def uses_cursor_pagination(self):
+        """
+        Cursor mode is opted into via settings, and always honoured when a cursor is given
+        """
+        return (
+            settings.QUESTION_LIST_PAGINATION == 'cursor'
+            or 'cursor' in self.request.GET
+        )
+
+    def get_cursor_paginator(self, queryset, page_size):
+        ordering = self.hot_cursor_ordering if self.get_sort() == 'hot' else self.cursor_ordering
+        return CursorPaginator(queryset, ordering, page_size)
+
+    def get_cursor_target(self):
+        """
+        The page asked for in cursor mode, as (page number, cursor): old
+        page-number links keep working for shallow pages
+        """
+        cursor = self.request.GET.get('cursor')
+        page_number = self.request.GET.get(self.page_kwarg)
+        if not cursor and page_number:
+            number = int(page_number)
+            if not 1 <= number <= settings.QUESTION_LIST_MAX_PAGE:
+                raise InvalidPage('Page number out of range')
+            return number, None
+        return None, cursor
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Paginate by keyset on (created_at, id) in cursor mode, otherwise by page number
         """
-        return Question.objects.select_related('author').prefetch_related('answers').all()
+        self.cursor_pagination = self.uses_cursor_pagination()
+        if not self.cursor_pagination:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = self.get_cursor_paginator(queryset, page_size)
+        try:
+            number, cursor = self.get_cursor_target()
+            page = paginator.page_at_offset(number) if number else paginator.page(cursor)
+        except (InvalidPage, ValueError) as e:
+            raise Http404(f'Invalid page: {e}')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['questions'] = attach_versions(context['questions'], 'question')
+        tag_page(self.request, 'question', *(question.pk for question in context['questions']))
+        tag_page(self.request, 'collection', self.get_sort())
+        context['cursor_pagination'] = self.cursor_pagination
+        context['sort'] = self.get_sort()
+        # Carried on pagination links so paging stays within the chosen sort
+        context['sort_query'] = 'sort=hot&' if context['sort'] == 'hot' else ''
+        return context
+
+
+class AsyncQuestionListView(QuestionListView):
+    """
+    QuestionListView for ASGI, paginated with the async ORM; in page-number
+    mode the total count and the page rows are fetched concurrently
+    """
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        self.paginated = await self.apaginate_queryset(
+            self.object_list, self.get_paginate_by(self.object_list)
+        )
+        context = await sync_to_async(self.get_context_data)()
+        return self.render_to_response(context)
+
+    def paginate_queryset(self, queryset, page_size):
+        # Already done with the async ORM in get()
+        return self.paginated
+
+    async def apaginate_queryset(self, queryset, page_size):
+        self.cursor_pagination = self.uses_cursor_pagination()
+        try:
+            if not self.cursor_pagination:
+                return await self.apaginate_by_number(queryset, page_size)
+            paginator = self.get_cursor_paginator(queryset, page_size)
+            number, cursor = self.get_cursor_target()
+            page = await (paginator.apage_at_offset(number) if number else paginator.apage(cursor))
+        except (InvalidPage, ValueError) as e:
+            raise Http404(f'Invalid page: {e}')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    async def apaginate_by_number(self, queryset, page_size):
+        """
+        ListView's page-number pagination without waiting for the count
+        before fetching the page
+        """
+        paginator = self.get_paginator(
+            queryset,
+            page_size,
+            orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty(),
+        )
+        page_number = self.request.GET.get(self.page_kwarg) or 1
+        if page_number == 'last':
+            paginator.count = await queryset.acount()
+            number = paginator.num_pages
+        else:
+            number = int(page_number)
+        if number < 1:
+            raise InvalidPage('That page number is less than 1')
+
+        # Orphans may be pulled onto the last page, which only the count can tell
+        bottom = (number - 1) * page_size
+        window = queryset[bottom:bottom + page_size + paginator.orphans]
+        if page_number == 'last':
+            rows = [obj async for obj in window]
+        else:
+            paginator.count, rows = await asyncio.gather(
+                queryset.acount(), self.afetch(window)
+            )
+        number = paginator.validate_number(number)
+        top = bottom + page_size
+        if top + paginator.orphans >= paginator.count:
+            top = paginator.count
+        page = paginator._get_page(rows[:top - bottom], number, paginator)
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    @staticmethod
+    async def afetch(queryset):
+        return [obj async for obj in queryset]
+
+
+class QuestionSearchView(ListView):
+    """
+    View for full-text search over questions and answers
+    """
+    template_name = 'questions/search.html'
+    context_object_name = 'results'
+    paginate_by = 10
+    # Upper bound on ranked hits fetched from the index for one query
+    max_results = 200
+
+    def get_queryset(self):
+        """
+        Look the query up in the search index and attach the matching questions
+        """
+        self.query = self.request.GET.get('q', '').strip()
+        if not self.query:
+            return []
+        hits = search.search(self.query, limit=self.max_results)
+        questions = Question.objects.select_related('author').in_bulk(
+            {hit.question_id for hit in hits}
+        )
+        return [
+            {'hit': hit, 'question': questions[hit.question_id]}
+            for hit in hits if hit.question_id in questions
+        ]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
+        return context
+
+
+class AnswerPageMixin:
+    """
+    One cursor-paginated page of a question's answers, in the order picked
+    with ?sort=, for the question page and its "load more" fragment.
+
+    The answer list is the same for every viewer (per-user like state is
+    hydrated client-side from answer-state) and cached per question, sort and
+    cursor, so the page is fetched lazily, only when that fragment renders.
+    """
+    answer_orderings = {
+        'newest': ('-created_at', '-id'),
+        'oldest': ('created_at', 'id'),
+        'top': ('-like_count', '-id'),
+    }
+    default_answer_sort = 'newest'
+
+    def get_answer_sort(self):
+        sort = self.request.GET.get('sort')
+        return sort if sort in self.answer_orderings else self.default_answer_sort
+
+    def get_answer_paginator(self, question_id):
+        return CursorPaginator(
+            Answer.objects.filter(question_id=question_id).select_related('author'),
+            self.answer_orderings[self.get_answer_sort()],
+            settings.ANSWERS_PER_PAGE,
+        )
+
+    def get_answer_cursor(self, paginator):
+        """
+        The requested cursor, rejected up front if bad rather than while rendering
+        """
+        cursor = self.request.GET.get('cursor') or None
+        if cursor:
+            try:
+                paginator.decode_cursor(cursor)
+            except InvalidPage as e:
+                raise Http404(f'Invalid page: {e}')
+        return cursor
+
+    def get_answer_page(self, paginator, cursor):
+        page = paginator.page(cursor)
+        page.object_list = attach_versions(page.object_list, 'answer')
+        return page
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        paginator = self.get_answer_paginator(self.object.pk)
+        cursor = self.get_answer_cursor(paginator)
+        context['answer_page'] = SimpleLazyObject(lambda: self.get_answer_page(paginator, cursor))
+        context['answer_sort'] = self.get_answer_sort()
+        context['answer_cursor'] = cursor or ''
+        tag_page(self.request, 'question', self.object.pk)
+        tag_page(self.request, 'answers', self.object.pk)
+        return context
 
 
-class QuestionDetailView(DetailView):
+@method_decorator(rate_limit('question-detail'), name='post')
+@method_decorator(write_transaction, name='post')
+class QuestionDetailView(ConditionalGetMixin, AnswerPageMixin, DetailView):
     """
     View for displaying question details with answers
     """
     model = Question
+    queryset = Question.objects.select_related('author')
     template_name = 'questions/question_detail.html'
     context_object_name = 'question'
+
+    def get_validator_row(self):
+        return freshness.question_summary(self.kwargs[self.pk_url_kwarg])
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
         # Add form for submitting a new answer
         context['answer_form'] = AnswerForm()
-        
-        # Get answers with prefetched authors and likes
-        answers = self.object.answers.select_related('author').prefetch_related('likes').all()
-        
-        # Add user's likes to context if user is authenticated
-        if self.request.user.is_authenticated:
-            user_likes = set(Like.objects.filter(
-                user=self.request.user, 
-                answer__in=answers
-            ).values_list('answer_id', flat=True))
-            
-            context['user_likes'] = user_likes
-        
-        context['answers'] = answers
         return context
     
     def post(self, request, *args, **kwargs):
@@ -73,6 +310,8 @@ class QuestionDetailView(DetailView):
             answer = form.save(commit=False)
             answer.question = question
             answer.author = request.user
+            # The answer and the question's counter are saved together in
+            # the view's write transaction
             answer.save()
             messages.success(request, 'Your answer has been added successfully!')
         else:
@@ -82,6 +321,51 @@ class QuestionDetailView(DetailView):
         return redirect('question-detail', pk=question.pk)
 
 
+class AsyncQuestionDetailView(QuestionDetailView):
+    """
+    QuestionDetailView for ASGI: the question and the viewer are fetched
+    concurrently with the async ORM. The page of answers stays lazy, as in
+    the sync view, so it is only queried when its cached fragment misses.
+    Posting an answer stays synchronous, since a transaction cannot span
+    async ORM calls.
+    """
+    async def get(self, request, *args, **kwargs):
+        # The viewer is resolved here so rendering the navigation does not look it up again
+        self.object, request.user = await asyncio.gather(
+            aget_object_or_404(self.get_queryset(), pk=kwargs[self.pk_url_kwarg]),
+            request.auser(),
+        )
+        context = await sync_to_async(self.get_context_data)(object=self.object)
+        return self.render_to_response(context)
+
+    async def post(self, request, *args, **kwargs):
+        return await sync_to_async(super().post)(request, *args, **kwargs)
+
+
+class QuestionAnswersView(AnswerPageMixin, DetailView):
+    """
+    HTML fragment with the next page of a question's answers, for "load more"
+    """
+    model = Question
+    template_name = 'questions/_answer_list.html'
+    context_object_name = 'question'
+
+
+class SingleFetchObjectMixin:
+    """
+    Fetch the view's object once per request, so the permission check in
+    test_func and the view itself share one query
+    """
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, '_fetched_object'):
+            self._fetched_object = super().get_object()
+        return self._fetched_object
+
+
+@method_decorator(rate_limit('question-create'), name='post')
+@method_decorator(write_transaction, name='post')
 class QuestionCreateView(LoginRequiredMixin, CreateView):
     """
     View for creating a new question
@@ -99,7 +383,8 @@ class QuestionCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class QuestionUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+@method_decorator(write_transaction, name='post')
+class QuestionUpdateView(LoginRequiredMixin, UserPassesTestMixin, SingleFetchObjectMixin, UpdateView):
     """
     View for updating an existing question
     """
@@ -120,10 +405,11 @@ class QuestionUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         Check if the current user is the author of the question
         """
         question = self.get_object()
-        return self.request.user == question.author
+        return self.request.user.pk == question.author_id
 
 
-class QuestionDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+@method_decorator(write_transaction, name='post')
+class QuestionDeleteView(LoginRequiredMixin, UserPassesTestMixin, SingleFetchObjectMixin, DeleteView):
     """
     View for deleting a question
     """
@@ -131,39 +417,42 @@ class QuestionDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     template_name = 'questions/question_confirm_delete.html'
     success_url = reverse_lazy('question-list')
     
-    def delete(self, request, *args, **kwargs):
+    def form_valid(self, form):
         """
-        Show success message after deletion
+        Hide the question at once and leave its answers and likes to be
+        removed in the background
         """
+        deletion.delete_question(self.object)
         messages.success(self.request, 'Your question has been deleted.')
-        return super().delete(request, *args, **kwargs)
+        return HttpResponseRedirect(self.get_success_url())
     
     def test_func(self):
         """
         Check if the current user is the author of the question
         """
         question = self.get_object()
-        return self.request.user == question.author
+        return self.request.user.pk == question.author_id
 
 
 @login_required
+@write_transaction
 def update_answer(request, pk):
     """
     View for updating an answer
     """
-    answer = get_object_or_404(Answer, pk=pk)
+    answer = get_object_or_404(Answer.objects.select_related('question'), pk=pk)
     
     # Check if the user is the author
-    if request.user != answer.author:
+    if request.user.pk != answer.author_id:
         messages.error(request, "You cannot edit someone else's answer.")
-        return redirect('question-detail', pk=answer.question.pk)
+        return redirect('question-detail', pk=answer.question_id)
     
     if request.method == 'POST':
         form = AnswerForm(request.POST, instance=answer)
         if form.is_valid():
             form.save()
             messages.success(request, 'Your answer has been updated successfully!')
-            return redirect('question-detail', pk=answer.question.pk)
+            return redirect('question-detail', pk=answer.question_id)
     else:
         form = AnswerForm(instance=answer)
     
@@ -174,15 +463,16 @@ def update_answer(request, pk):
 
 
 @login_required
+@write_transaction
 def delete_answer(request, pk):
     """
     View for deleting an answer
     """
     answer = get_object_or_404(Answer, pk=pk)
-    question_pk = answer.question.pk
+    question_pk = answer.question_id
     
     # Check if the user is the author
-    if request.user != answer.author:
+    if request.user.pk != answer.author_id:
         messages.error(request, "You cannot delete someone else's answer.")
     else:
         answer.delete()
@@ -191,33 +481,104 @@ def delete_answer(request, pk):
     return redirect('question-detail', pk=question_pk)
 
 
-@login_required
-def toggle_like(request, pk):
+@never_cache
+def answer_state(request):
     """
-    View for toggling like on an answer
-    AJAX-compatible endpoint for liking/unliking
+    Like state and counts for the answers given as ?ids=1,2,3, in one query.
+    Lets cached answer lists show the current user's hearts and edit links.
     """
-    answer = get_object_or_404(Answer, pk=pk)
+    try:
+        ids = {int(pk) for pk in request.GET.get('ids', '').split(',') if pk}
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid answer ids'}, status=400)
+    if len(ids) > ANSWER_STATE_MAX_IDS:
+        return JsonResponse({'status': 'error', 'message': 'Too many answer ids'}, status=400)
+
     user = request.user
-    
-    # Check if the user already liked this answer
-    like_exists = Like.objects.filter(answer=answer, user=user).exists()
-    
-    if like_exists:
-        # Unlike
-        Like.objects.filter(answer=answer, user=user).delete()
-        liked = False
+    if user.is_authenticated:
+        liked = Exists(Like.objects.filter(answer=OuterRef('pk'), user=user))
     else:
-        # Like
-        Like.objects.create(answer=answer, user=user)
-        liked = True
-    
-    # Return JSON response for AJAX or redirect for non-AJAX
+        liked = Value(False)
+    rows = Answer.objects.filter(pk__in=ids).annotate(liked=liked).values_list(
+        'pk', 'like_count', 'liked', 'author_id'
+    )
+    # Toggles still in the write-behind buffer
+    buffered, deltas = like_buffer.pending_state(user.pk, ids) if like_buffer.config('ENABLED') else ({}, {})
+    return JsonResponse({
+        'status': 'success',
+        'authenticated': user.is_authenticated,
+        'answers': {
+            pk: {
+                'liked': buffered.get(pk, bool(is_liked)),
+                'like_count': max(like_count + deltas.get(pk, 0), 0),
+                'editable': author_id == user.pk,
+            }
+            for pk, like_count, is_liked, author_id in rows
+        },
+    })
+
+
+def like_response(request, answer, liked):
+    """
+    JSON for AJAX like toggles, otherwise a redirect back to the question
+    """
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
         return JsonResponse({
             'status': 'success',
             'liked': liked,
             'like_count': answer.like_count
         })
+    return redirect('question-detail', pk=answer.question_id)
+
+
+def _toggle_answer_like(pk, user):
+    answer = get_object_or_404(Answer, pk=pk)
+    return answer, Like.objects.toggle(answer, user)
+
+
+def _buffer_answer_like(pk, user):
+    answer = get_object_or_404(Answer, pk=pk)
+    stored = answer.like_count
+    liked = like_buffer.toggle(answer, user)
+    # Everyone's toggles still waiting in this process count too, as in answer_state
+    _, deltas = like_buffer.pending_state(user.pk, [answer.pk])
+    answer.like_count = max(stored + deltas.get(answer.pk, 0), 0)
+    return answer, liked
+
+
+@login_required
+@rate_limit('toggle-like')
+def toggle_like(request, pk):
+    """
+    View for toggling like on an answer
+    AJAX-compatible endpoint for liking/unliking
+    """
+    if like_buffer.config('ENABLED'):
+        # Recorded in the write-behind buffer; no write transaction here
+        answer, liked = _buffer_answer_like(pk, request.user)
+    else:
+        answer, liked = run_write_transaction(_toggle_answer_like, pk, request.user)
+    
+    # Return JSON response for AJAX or redirect for non-AJAX
+    return like_response(request, answer, liked)
+
+
+async def atoggle_like(request, pk):
+    """
+    toggle_like for ASGI: the login check runs on the event loop and only
+    the write transaction takes a thread. As in toggle_like, anonymous
+    requests are sent to log in before they reach the rate limit
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    return await _atoggle_like(request, pk, user)
+
+
+@rate_limit('toggle-like')
+async def _atoggle_like(request, pk, user):
+    if like_buffer.config('ENABLED'):
+        answer, liked = await sync_to_async(_buffer_answer_like)(pk, user)
     else:
-        return redirect('question-detail', pk=answer.question.pk)
\ No newline at end of file
+        answer, liked = await sync_to_async(run_write_transaction)(_toggle_answer_like, pk, user)
+    return like_response(request, answer, liked)
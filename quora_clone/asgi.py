@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "quora_clone.settings")
+# Serve the hot endpoints with their native async views (quora_clone.asgi_urls)
+os.environ.setdefault("ASYNC_VIEWS", "true")
 
 application = get_asgi_application()
@@ -0,0 +1,18 @@
+"""
+URL configuration used under ASGI (see ASYNC_VIEWS in settings).
+
+The hot read and like endpoints are swapped for their native async
+versions; every other URL is shared with quora_clone.urls. Paths and names
+match, so reverse() gives the same URLs under either server.
+"""
+from django.urls import path
+from core import views as core_views
+from questions import views as question_views
+from . import urls
+
+urlpatterns = [
+    path('', core_views.AsyncHomeView.as_view(), name='home'),
+    path('questions/', question_views.AsyncQuestionListView.as_view(), name='question-list'),
+    path('questions/<int:pk>/', question_views.AsyncQuestionDetailView.as_view(), name='question-detail'),
+    path('questions/answer/<int:pk>/like/', question_views.atoggle_like, name='toggle-like'),
+] + urls.urlpatterns
@@ -30,6 +30,8 @@ INSTALLED_APPS = [
     'accounts',
     'core',
     'questions',
+    'notifications',
+    'tasks',
     
     # Third-party apps
     'crispy_forms',
@@ -38,6 +40,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.StaticFilesMiddleware',
+    # Below the static files, which are served precompressed, and above the
+    # page cache, so cached pages are stored once and compressed per client
+    'django.middleware.gzip.GZipMiddleware',
+    'core.middleware.AnonymousPageCacheMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -46,7 +55,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'quora_clone.urls'
+# quora_clone/asgi.py turns ASYNC_VIEWS on, which routes the home page, the
+# question list and page and the like toggle to native async views; under
+# WSGI the synchronous ones are used, since async views would each need
+# their own event loop there.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'false').lower() == 'true'
+
+ROOT_URLCONF = 'quora_clone.asgi_urls' if ASYNC_VIEWS else 'quora_clone.urls'
 
 TEMPLATES = [
     {
@@ -76,6 +91,146 @@ DATABASES = {
     }
 }
 
+# SQLITE_PROFILE=production switches to core.backends.sqlite3, which applies
+# these PRAGMAs on every connection: WAL lets readers run alongside the single
+# writer, synchronous=NORMAL is durable across crashes in WAL mode, and
+# busy_timeout makes writers queue for the lock instead of failing at once.
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'default')
+
+SQLITE_PRODUCTION_OPTIONS = {
+    'pragmas': {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        # Negative values are KiB: a 64 MiB page cache per connection
+        'cache_size': -64 * 1024,
+        'temp_store': 'memory',
+    },
+}
+
+if SQLITE_PROFILE == 'production':
+    DATABASES['default'].update({
+        'ENGINE': 'core.backends.sqlite3',
+        'OPTIONS': SQLITE_PRODUCTION_OPTIONS,
+    })
+
+# Read replicas: DATABASE_REPLICAS lists database files kept in sync with the
+# primary (e.g. by Litestream or LiteFS), each becoming a replicaN alias that
+# reads of REPLICA_ROUTING['MODELS'] are spread over. Without it a stand-in
+# 'replica' alias points at a second local file for the tests; it serves no
+# reads unless listed in REPLICA_ROUTING['REPLICAS'].
+DATABASE_REPLICAS = [name for name in os.environ.get('DATABASE_REPLICAS', '').split(',') if name]
+
+for i, name in enumerate(DATABASE_REPLICAS or [BASE_DIR / 'db.replica.sqlite3'], start=1):
+    alias = f'replica{i}' if DATABASE_REPLICAS else 'replica'
+    DATABASES[alias] = {**DATABASES['default'], 'NAME': name}
+
+DATABASE_ROUTERS = ['core.replicas.PrimaryReplicaRouter']
+
+# After writing, a visitor reads from the primary for STICKY_SECONDS (via a
+# cookie set by core.middleware.ReplicaStickinessMiddleware)
+REPLICA_ROUTING = {
+    'REPLICAS': [f'replica{i}' for i in range(1, len(DATABASE_REPLICAS) + 1)],
+    'MODELS': ('questions.question', 'questions.answer', 'questions.like', 'accounts.profile', 'accounts.userstats'),
+    'STICKY_SECONDS': 10,
+    'COOKIE': 'pin_primary',
+}
+
+# Write views (core.db.write_transaction) run in one BEGIN IMMEDIATE transaction;
+# the BEGIN (not the view) is retried this many times with jittered exponential
+# backoff while the database is locked
+WRITE_TRANSACTION = {
+    'ATTEMPTS': 3,
+    'BACKOFF': 0.05,
+}
+
+# Caches
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Local memory by default; point FRAGMENT_CACHE_BACKEND / PAGE_CACHE_BACKEND at
+# 'file' or 'memcached' (with *_LOCATION) in production so all workers share them.
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+
+FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND', 'locmem')
+PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'locmem')
+SESSION_CACHE_BACKEND = os.environ.get('SESSION_CACHE_BACKEND', 'locmem')
+# Rate limit counters need an atomic incr(): locmem or memcached, not file
+RATE_LIMIT_CACHE_BACKEND = os.environ.get('RATE_LIMIT_CACHE_BACKEND', 'locmem')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS['locmem'],
+    },
+    'fragments': {
+        'BACKEND': CACHE_BACKENDS[FRAGMENT_CACHE_BACKEND],
+        'LOCATION': os.environ.get('FRAGMENT_CACHE_LOCATION', 'fragments'),
+        'TIMEOUT': None,
+        'OPTIONS': {} if FRAGMENT_CACHE_BACKEND == 'memcached' else {'MAX_ENTRIES': 10000},
+    },
+    'pages': {
+        'BACKEND': CACHE_BACKENDS[PAGE_CACHE_BACKEND],
+        'LOCATION': os.environ.get('PAGE_CACHE_LOCATION', 'pages'),
+        'OPTIONS': {} if PAGE_CACHE_BACKEND == 'memcached' else {'MAX_ENTRIES': 2000},
+    },
+    # Sessions and logged-in users (see SESSION_STRATEGY and AUTH_USER_CACHE)
+    'sessions': {
+        'BACKEND': CACHE_BACKENDS[SESSION_CACHE_BACKEND],
+        'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', 'sessions'),
+        'TIMEOUT': None,
+        'OPTIONS': {} if SESSION_CACHE_BACKEND == 'memcached' else {'MAX_ENTRIES': 10000},
+    },
+    # Token-bucket counters for write views (see RATE_LIMIT)
+    'ratelimit': {
+        'BACKEND': CACHE_BACKENDS[RATE_LIMIT_CACHE_BACKEND],
+        'LOCATION': os.environ.get('RATE_LIMIT_CACHE_LOCATION', 'ratelimit'),
+        'OPTIONS': {} if RATE_LIMIT_CACHE_BACKEND == 'memcached' else {'MAX_ENTRIES': 50000},
+    },
+}
+
+# Seconds a rendered question/answer card stays in the fragment cache
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Full-page cache for logged-out readers (core.middleware.AnonymousPageCacheMiddleware).
+# Pages are fresh for TIMEOUT seconds unless something they show changes; stale
+# pages are still served for up to STALE_TIMEOUT while one request re-renders them.
+PAGE_CACHE = {
+    'ENABLED': os.environ.get('PAGE_CACHE_ENABLED', 'false').lower() == 'true',
+    'VIEWS': ('home', 'question-list', 'question-detail', 'question-answers'),
+    'TIMEOUT': 5 * 60,
+    'STALE_TIMEOUT': 60 * 60,
+    'LOCK_TIMEOUT': 30,
+    'BYPASS_COOKIES': ('messages',),
+}
+
+# Token buckets for write views (core.rate_limit), per user and per client IP:
+# (burst, tokens refilled per minute) for each view by URL name. Requests over
+# the limit get 429 with Retry-After. Behind a reverse proxy set IP_HEADER to
+# the META key it puts the client address in (e.g. HTTP_X_REAL_IP).
+RATE_LIMIT = {
+    'ENABLED': os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true',
+    'IP_HEADER': os.environ.get('RATE_LIMIT_IP_HEADER') or None,
+    'VIEWS': {
+        'toggle-like': {'USER': (30, 60), 'IP': (120, 240)},
+        'question-detail': {'USER': (5, 10), 'IP': (20, 40)},
+        'question-create': {'USER': (5, 5), 'IP': (20, 20)},
+    },
+}
+
+# ETags for the home page, the question list and question pages
+# (core.conditional), so revalidating clients and proxies get 304s; pages
+# carrying one-off flash messages are always rendered in full. The ETags are
+# built from fragment cache versions, so they are only sent once
+# FRAGMENT_CACHE_BACKEND is shared ('file' or 'memcached'), never with 'locmem'.
+CONDITIONAL_GET = {
+    'ENABLED': os.environ.get('CONDITIONAL_GET_ENABLED', 'true').lower() == 'true',
+    'BYPASS_COOKIES': ('messages',),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -114,6 +269,35 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# STATIC_MODE=production collects files under content-hashed names with gzip
+# (and, with the brotli package installed, brotli) variants, and
+# core.middleware.StaticFilesMiddleware serves them from STATIC_ROOT with
+# immutable far-future caching. Run collectstatic on every deploy.
+STATIC_MODE = os.environ.get('STATIC_MODE', 'development')
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'core.static_files.CompressedManifestStaticFilesStorage'
+            if STATIC_MODE == 'production'
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
+
+STATIC_FILES = {
+    'SERVE': STATIC_MODE == 'production',
+    # Seconds browsers may cache hashed files, and files under their plain names
+    'MAX_AGE': 365 * 24 * 60 * 60,
+    'UNHASHED_MAX_AGE': 60,
+    'COMPRESS_EXTENSIONS': ('.css', '.js', '.svg', '.json', '.txt', '.map', '.xml', '.html'),
+    # Files smaller than this are not worth a compressed copy
+    'COMPRESS_MIN_SIZE': 256,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -123,7 +307,119 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+# Sessions. SESSION_STRATEGY picks where they live:
+#   'cache' (default): core.sessions, served from the 'sessions' cache, with a
+#       database copy written on login/logout and otherwise at most every
+#       SESSION_WRITE_BEHIND_SECONDS. Needs a shared SESSION_CACHE_BACKEND:
+#       with 'locmem' a logout would only reach the worker that handled it,
+#       so 'db' is used instead
+#   'signed_cookies': the session is a signed (not encrypted) cookie and
+#       nothing is stored on the server
+#   'db': Django's plain database sessions
+SESSION_ENGINES = {
+    'cache': 'core.sessions',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+    'db': 'django.contrib.sessions.backends.db',
+}
+
+SESSION_STRATEGY = os.environ.get('SESSION_STRATEGY', 'cache')
+if SESSION_STRATEGY == 'cache' and SESSION_CACHE_BACKEND == 'locmem':
+    SESSION_STRATEGY = 'db'
+SESSION_ENGINE = SESSION_ENGINES[SESSION_STRATEGY]
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_WRITE_BEHIND_SECONDS = 300
+
+# Flash messages travel in a cookie instead of being written to the session
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 # Authentication settings
+AUTHENTICATION_BACKENDS = ['accounts.backends.CachedModelBackend']
+
+# The logged-in user is cached for TIMEOUT seconds and dropped when saved;
+# only when the ALIAS cache is shared between workers (not locmem)
+AUTH_USER_CACHE = {
+    'ALIAS': 'sessions',
+    'TIMEOUT': 300,
+}
+
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
-LOGIN_URL = 'login'
\ No newline at end of file
+LOGIN_URL = 'login'
+
+# Question list pagination: 'offset' (page numbers) or 'cursor' (keyset on created_at, id)
+QUESTION_LIST_PAGINATION = os.environ.get('QUESTION_LIST_PAGINATION', 'offset')
+
+# Deepest page number still served by OFFSET in cursor mode
+QUESTION_LIST_MAX_PAGE = 20
+
+# Answers shown per page on a question, and per "load more"
+ANSWERS_PER_PAGE = 20
+
+# Full-text search backend: 'auto' (SQLite FTS5 when available), 'sqlite_fts' or 'memory'
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+
+# Write-behind buffering of like toggles (questions.like_buffer): toggles are
+# coalesced in each process and written by a background thread every
+# FLUSH_INTERVAL seconds, or as soon as BATCH_SIZE pairs are waiting
+LIKE_BUFFER = {
+    'ENABLED': os.environ.get('LIKE_BUFFER_ENABLED', 'false').lower() == 'true',
+    'FLUSH_INTERVAL': 1.0,
+    'BATCH_SIZE': 500,
+}
+
+# Background removal of deleted questions and users (questions.deletion):
+# rows per chunk, each chunk its own write transaction, the pause between
+# chunks that lets other writers in, and whether, with the task queue
+# disabled, a thread of the process purges (False: the committing thread)
+DELETION = {
+    'BATCH_SIZE': 500,
+    'PAUSE': 0.05,
+    'BACKGROUND': True,
+}
+
+# Notifications (notifications app): how many the navbar dropdown shows
+NOTIFICATIONS = {
+    'DROPDOWN_SIZE': 10,
+}
+
+# Background task queue (tasks app), stored in the database and run by
+# `python manage.py run_tasks`. Disabled, queued calls run at once in the
+# request as before. Failed tasks are retried MAX_ATTEMPTS times in all,
+# waiting BACKOFF seconds, doubling up to MAX_BACKOFF; a running task not
+# heard from (tasks.queue.heartbeat) for LEASE_SECONDS is taken to be lost
+# with its worker and requeued, and finished tasks are kept
+# KEEP_DONE_SECONDS for the latency metrics.
+TASKS = {
+    'ENABLED': os.environ.get('TASKS_ENABLED', 'false').lower() == 'true',
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 2.0,
+    'MAX_BACKOFF': 600,
+    'LEASE_SECONDS': 300,
+    'KEEP_DONE_SECONDS': 24 * 60 * 60,
+    'POLL_INTERVAL': 1.0,
+}
+
+# Hot question ranking: activity weights, decay half-life and pruning of cold questions
+HOT_RANKING = {
+    'HALF_LIFE_HOURS': 12,
+    'QUESTION_WEIGHT': 1.0,
+    'ANSWER_WEIGHT': 3.0,
+    'LIKE_WEIGHT': 1.0,
+    # Questions whose decayed score falls below this drop out of the hot feed
+    'PRUNE_BELOW': 0.05,
+    # How many half-lives of history a full rebuild looks back over
+    'RETENTION_HALF_LIVES': 10,
+}
+
+# Per-request SQL query budgets (core.middleware.QueryBudgetMiddleware).
+# Requests running more queries than their view's budget are logged with the
+# repeated query shapes; per-view histograms are at /stats/queries/ for staff.
+QUERY_BUDGET = {
+    'ENABLED': os.environ.get('QUERY_BUDGET_ENABLED', 'true').lower() == 'true',
+    'DEFAULT': 15,
+    'VIEWS': {
+        'admin:questions_answer_changelist': 25,
+        'admin:questions_like_changelist': 25,
+        'admin:questions_question_changelist': 25,
+    },
+}
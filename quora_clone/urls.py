@@ -6,4 +6,5 @@ urlpatterns = [
     path('', include('core.urls')),
     path('accounts/', include('accounts.urls')),
     path('questions/', include('questions.urls')),
+    path('notifications/', include('notifications.urls')),
 ]
\ No newline at end of file
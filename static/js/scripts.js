@@ -0,0 +1,119 @@
+// Read the CSRF token from its cookie rather than rendering it into the
+// page, so pages stay identical for every anonymous reader and cacheable
+function getCookie(name) {
+    const match = document.cookie.match(new RegExp('(?:^|; )' + name + '=([^;]*)'));
+    return match ? decodeURIComponent(match[1]) : null;
+}
+
+function showLikeState(likeBtn, liked) {
+    likeBtn.toggleClass('active', liked);
+    likeBtn.html(liked ? '<i class="bi bi-heart-fill"></i>' : '<i class="bi bi-heart"></i>');
+}
+
+// Answer lists are rendered the same for everyone; fetch this user's
+// hearts, current counts and edit links for the answers in scope; the
+// endpoint's URL is rendered by base.html into <body data-answer-state-url>
+function hydrateAnswers(scope) {
+    const answerIds = scope.find('.like-button[data-answer-id]').map(function() {
+        return $(this).data('answer-id');
+    }).get();
+    if (!answerIds.length) {
+        return;
+    }
+    $.getJSON($('body').data('answer-state-url'), {ids: answerIds.join(',')}, function(data) {
+        $.each(data.answers, function(answerId, state) {
+            const likeBtn = $(`.like-button[data-answer-id="${answerId}"]`);
+            $(`#likes-count-${answerId}`).text(state.like_count);
+            if (data.authenticated) {
+                likeBtn.removeClass('disabled');
+                showLikeState(likeBtn, state.liked);
+            }
+            if (state.editable) {
+                $(`.answer-actions[data-answer-id="${answerId}"]`).removeClass('d-none');
+            }
+        });
+    });
+}
+
+function showUnreadNotifications(count) {
+    $('#notifications-badge').text(count).toggleClass('d-none', !count);
+}
+
+// The unread badge comes from a stored counter; the notifications
+// themselves are only fetched when the dropdown is opened, which marks
+// them read
+function setUpNotifications(menu) {
+    $.getJSON(menu.data('count-url'), function(data) {
+        showUnreadNotifications(data.unread);
+    });
+    menu.on('show.bs.dropdown', function() {
+        $('#notifications-list').load(menu.data('list-url'), function() {
+            if ($('#notifications-badge').hasClass('d-none')) {
+                return;
+            }
+            $.ajax({
+                type: 'POST',
+                url: menu.data('read-url'),
+                headers: {
+                    'X-CSRFToken': getCookie('csrftoken'),
+                    'X-Requested-With': 'XMLHttpRequest'
+                },
+                success: function(data) {
+                    showUnreadNotifications(data.unread);
+                }
+            });
+        });
+    });
+}
+
+$(document).ready(function() {
+    hydrateAnswers($(document));
+
+    const notificationsMenu = $('#notifications-menu');
+    if (notificationsMenu.length) {
+        setUpNotifications(notificationsMenu);
+    }
+
+    // Append the next page of answers in place of the "load more" link
+    $(document).on('click', '.load-more-answers', function(e) {
+        e.preventDefault();
+        const container = $(this).closest('.load-more');
+        $.get($(this).data('fragment-url'), function(html) {
+            const page = $('<div>').html(html);
+            container.replaceWith(page);
+            hydrateAnswers(page);
+        });
+    });
+
+    // Handle like button clicks with AJAX
+    $(document).on('click', '.like-button:not(.disabled)', function(e) {
+        e.preventDefault();
+        const likeBtn = $(this);
+        const answerId = likeBtn.data('answer-id');
+        const likesCountSpan = $(`#likes-count-${answerId}`);
+        
+        $.ajax({
+            type: 'POST',
+            url: `/questions/answer/${answerId}/like/`,
+            headers: {
+                'X-CSRFToken': getCookie('csrftoken'),
+                'X-Requested-With': 'XMLHttpRequest'
+            },
+            success: function(data) {
+                // Update likes count and the heart icon
+                likesCountSpan.text(data.like_count);
+                showLikeState(likeBtn, data.liked);
+            },
+            error: function(xhr, status, error) {
+                if (xhr.status === 429) {
+                    // Rate limited: rest the button until a like is allowed again
+                    const wait = parseInt(xhr.getResponseHeader('Retry-After'), 10) || 1;
+                    likeBtn.addClass('disabled');
+                    setTimeout(() => likeBtn.removeClass('disabled'), wait * 1000);
+                    return;
+                }
+                console.error("Error toggling like:", error);
+            }
+        });
+    });
+});
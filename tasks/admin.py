@@ -0,0 +1,23 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('name', 'dedup_key')
+    show_full_result_count = False
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'worker', 'last_error')
+    actions = ['retry_tasks']
+
+    @admin.action(description='Retry selected failed tasks now')
+    def retry_tasks(self, request, queryset):
+        retried = 0
+        for task in queryset.filter(status=Task.FAILED):
+            task.max_attempts = task.attempts + 1
+            task.save(update_fields=['max_attempts'])
+            Task.objects.requeue(task, timezone.now())
+            retried += 1
+        self.message_user(request, f'{retried} task(s) queued to run again')
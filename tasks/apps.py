@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+class TasksConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'tasks'
+    verbose_name = 'Background Tasks'
+
+    def ready(self):
+        """
+        Import every app's tasks module so workers can find the task functions
+        """
+        autodiscover_modules('tasks')
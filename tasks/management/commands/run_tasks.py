@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from tasks import queue
+
+
+class Command(BaseCommand):
+    """
+    Background worker for the task queue; run one or more next to the web server
+    """
+    help = 'Run queued background tasks on a thread pool until interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Tasks to run at once',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=None,
+            help="Seconds to wait when the queue is empty (default TASKS['POLL_INTERVAL'])",
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once no task is due instead of waiting for more',
+        )
+
+    def handle(self, *args, **options):
+        worker = queue.Worker(threads=options['threads'])
+        self.stdout.write(f'Worker {worker.name} running with {worker.threads} thread(s)')
+        try:
+            worker.run(poll_interval=options['poll_interval'], burst=options['burst'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping')
+        self.stdout.write(self.style.SUCCESS('Worker stopped'))
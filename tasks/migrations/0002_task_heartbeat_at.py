@@ -0,0 +1,28 @@
+# Generated by Django 5.0.5 on 2026-10-18 12:41
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def renew_running(apps, schema_editor):
+    """
+    Tasks running now hold their lease from when they were claimed
+    """
+    Task = apps.get_model("tasks", "Task")
+    Task.objects.filter(status="running").update(heartbeat_at=F("started_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tasks", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(renew_running, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,149 @@
+from datetime import timedelta
+from django.db import models
+from django.db.models import F, Q
+from django.utils import timezone
+from core.db import run_write_transaction
+
+
+class TaskManager(models.Manager):
+    """
+    Manager holding the queue operations: enqueue, claim and finish
+    """
+    def enqueue(self, name, args=(), kwargs=None, dedup_key=None, run_at=None, max_attempts=5):
+        """
+        Queue a call of the named task. A task with a dedup_key is dropped
+        if one with the same key is already waiting to run
+        """
+        task = self.model(
+            name=name,
+            args=list(args),
+            kwargs=kwargs or {},
+            dedup_key=dedup_key,
+            run_at=run_at or timezone.now(),
+            max_attempts=max_attempts,
+        )
+        if dedup_key is None:
+            task.save()
+        else:
+            # The unique index on waiting dedup keys turns the duplicate into a no-op
+            self.bulk_create([task], ignore_conflicts=True)
+
+    def claim(self, worker, limit):
+        """
+        Mark up to `limit` due tasks as running for the worker and return
+        them, oldest first; one write transaction, so two workers never
+        claim the same task
+        """
+        def claim_due():
+            now = timezone.now()
+            ids = list(
+                self.select_for_update(skip_locked=True)
+                .filter(status=Task.QUEUED, run_at__lte=now)
+                .order_by('run_at', 'pk')
+                .values_list('pk', flat=True)[:limit]
+            )
+            if not ids:
+                return []
+            self.filter(pk__in=ids).update(
+                status=Task.RUNNING, worker=worker, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1
+            )
+            return list(self.filter(pk__in=ids).order_by('run_at', 'pk'))
+        return run_write_transaction(claim_due)
+
+    def requeue(self, task, run_at, error=''):
+        """
+        Put a task back in the queue to run at run_at; if a newer copy of a
+        deduplicated task is already waiting, that one covers it
+        """
+        def put_back():
+            superseded = task.dedup_key is not None and self.filter(
+                dedup_key=task.dedup_key, status=Task.QUEUED
+            ).exists()
+            self.filter(pk=task.pk).update(
+                status=Task.DONE if superseded else Task.QUEUED,
+                run_at=run_at,
+                finished_at=timezone.now() if superseded else None,
+                last_error=error,
+            )
+        run_write_transaction(put_back)
+
+    def renew(self, pk):
+        """
+        Extend the lease of a running task from now
+        """
+        run_write_transaction(
+            lambda: self.filter(pk=pk, status=Task.RUNNING).update(heartbeat_at=timezone.now())
+        )
+
+    def requeue_stale(self, lease_seconds):
+        """
+        Requeue running tasks not heard from for longer than the lease (since
+        they were claimed or last renewed), left behind by a worker that
+        died; returns how many
+        """
+        cutoff = timezone.now() - timedelta(seconds=lease_seconds)
+        stale = list(self.filter(status=Task.RUNNING, heartbeat_at__lt=cutoff))
+        for task in stale:
+            self.requeue(task, timezone.now(), error=f'Lease expired on worker {task.worker}')
+        return len(stale)
+
+    def purge_done(self, keep_seconds):
+        """
+        Delete finished tasks older than keep_seconds
+        """
+        cutoff = timezone.now() - timedelta(seconds=keep_seconds)
+        return run_write_transaction(
+            lambda: self.filter(status=Task.DONE, finished_at__lt=cutoff).delete()[0]
+        )
+
+
+class Task(models.Model):
+    """
+    One queued call of a background task function (see tasks.queue)
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    dedup_key = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # When the running task was claimed or last renewed its lease
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    objects = TaskManager()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Claiming due tasks, and finding stale running ones
+            models.Index(fields=['status', 'run_at']),
+            models.Index(fields=['status', 'finished_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=Q(status='queued'),
+                name='tasks_task_unique_queued_dedup_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
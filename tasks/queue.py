@@ -0,0 +1,287 @@
+"""
+Durable background tasks, queued in the Task table (TASKS['ENABLED']).
+
+@task makes a function a task; fn.delay(*args, **kwargs) queues a call of
+it, in the caller's transaction, so the call is queued exactly when the
+change that needs it commits. Arguments must be JSON-serialisable. Workers
+(`python manage.py run_tasks`) claim due tasks and run them on a thread
+pool; a task that raises is retried with exponential backoff until it has
+had max_attempts runs, then left as failed. A task declared with dedup=True
+is queued at most once per set of arguments until a worker picks it up.
+
+A running task holds a lease of LEASE_SECONDS, after which housekeeping
+takes its worker for dead and requeues it; tasks that can run longer call
+heartbeat() as they go to renew it.
+
+With the queue disabled (the default) delay() calls the function straight
+away, so nothing needs a worker.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+from core.db import run_write_transaction
+from core.stats import percentile
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+# The task the current worker thread is running, and when it last renewed its lease
+_running = threading.local()
+
+
+def config(name):
+    """
+    Read one TASKS setting
+    """
+    return settings.TASKS[name]
+
+
+def enabled():
+    return config('ENABLED')
+
+
+class TaskFunction:
+    """
+    A function registered as a task; calling it runs it directly
+    """
+    def __init__(self, func, name, max_attempts, dedup):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.dedup = dedup
+        self.__doc__ = func.__doc__
+        self.__wrapped__ = func
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f'<task {self.name}>'
+
+    def dedup_key(self, args, kwargs):
+        if not self.dedup:
+            return None
+        call = json.dumps([list(args), kwargs], sort_keys=True, default=str)
+        return f'{self.name}:{hashlib.md5(call.encode(), usedforsecurity=False).hexdigest()}'
+
+    def delay(self, *args, **kwargs):
+        """
+        Queue a call of the task, or make it now if the queue is disabled
+        """
+        return self.enqueue(args, kwargs)
+
+    def enqueue(self, args=(), kwargs=None, countdown=None):
+        """
+        Queue a call of the task, to run no sooner than countdown seconds from now
+        """
+        kwargs = kwargs or {}
+        if not enabled():
+            self.func(*args, **kwargs)
+            return
+        run_at = timezone.now() + timedelta(seconds=countdown) if countdown else None
+        Task.objects.enqueue(
+            self.name,
+            args,
+            kwargs,
+            dedup_key=self.dedup_key(args, kwargs),
+            run_at=run_at,
+            max_attempts=self.max_attempts or config('MAX_ATTEMPTS'),
+        )
+
+
+def task(func=None, *, name=None, max_attempts=None, dedup=False):
+    """
+    Register a function as a background task, e.g.
+
+        @task(dedup=True)
+        def refresh_search_document(kind, pk): ...
+
+        refresh_search_document.delay('question', question.pk)
+    """
+    def register(func):
+        task_name = name or f'{func.__module__}.{func.__qualname__}'
+        _registry[task_name] = TaskFunction(func, task_name, max_attempts, dedup)
+        return _registry[task_name]
+    return register(func) if func is not None else register
+
+
+def get_task(name):
+    return _registry[name]
+
+
+def heartbeat():
+    """
+    Renew the lease of the task running in this thread, at most every tenth
+    of LEASE_SECONDS; does nothing outside a worker
+    """
+    task_id = getattr(_running, 'task_id', None)
+    if task_id is None or time.monotonic() - _running.renewed < config('LEASE_SECONDS') / 10:
+        return
+    Task.objects.renew(task_id)
+    _running.renewed = time.monotonic()
+
+
+def backoff_delay(attempts):
+    """
+    Seconds to wait before another run after `attempts` failed ones: doubling
+    from BACKOFF up to MAX_BACKOFF, jittered so failures do not retry in step
+    """
+    delay = min(config('BACKOFF') * 2 ** (attempts - 1), config('MAX_BACKOFF'))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class Worker:
+    """
+    Claims due tasks and runs them, `threads` at a time
+    """
+    def __init__(self, threads=1, name=None):
+        self.threads = threads
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix='task') if threads > 1 else None
+        self.last_housekeeping = 0
+
+    def run_once(self):
+        """
+        Run one batch of due tasks; returns how many were run
+        """
+        self.housekeeping()
+        claimed = Task.objects.claim(self.name, self.threads)
+        if self.pool is None:
+            for claimed_task in claimed:
+                self.execute(claimed_task)
+        else:
+            list(self.pool.map(self.execute_in_thread, claimed))
+        return len(claimed)
+
+    def run(self, poll_interval=None, burst=False):
+        """
+        Run tasks until interrupted, or until the queue is drained with burst
+        """
+        poll_interval = config('POLL_INTERVAL') if poll_interval is None else poll_interval
+        try:
+            while True:
+                if not self.run_once():
+                    if burst:
+                        return
+                    close_old_connections()
+                    time.sleep(poll_interval)
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def housekeeping(self):
+        """
+        Requeue tasks of dead workers and purge old finished ones, once a minute
+        """
+        if time.monotonic() - self.last_housekeeping < 60:
+            return
+        self.last_housekeeping = time.monotonic()
+        stale = Task.objects.requeue_stale(config('LEASE_SECONDS'))
+        if stale:
+            logger.warning('Requeued %d task(s) whose worker stopped responding', stale)
+        Task.objects.purge_done(config('KEEP_DONE_SECONDS'))
+
+    def execute_in_thread(self, claimed_task):
+        try:
+            self.execute(claimed_task)
+        finally:
+            # Pool threads are not closed by the request cycle
+            connections.close_all()
+
+    def execute(self, claimed_task):
+        """
+        Run one claimed task and record how it went
+        """
+        _running.task_id, _running.renewed = claimed_task.pk, time.monotonic()
+        try:
+            get_task(claimed_task.name)(*claimed_task.args, **claimed_task.kwargs)
+        except Exception:
+            self.failed(claimed_task, traceback.format_exc())
+        else:
+            run_write_transaction(
+                lambda: Task.objects.filter(pk=claimed_task.pk).update(
+                    status=Task.DONE, finished_at=timezone.now(), last_error=''
+                )
+            )
+        finally:
+            _running.task_id = None
+
+    def failed(self, claimed_task, error):
+        if claimed_task.attempts < claimed_task.max_attempts:
+            delay = backoff_delay(claimed_task.attempts)
+            logger.warning(
+                'Task %s (#%d) failed on attempt %d; retrying in %.0fs',
+                claimed_task.name, claimed_task.pk, claimed_task.attempts, delay,
+            )
+            Task.objects.requeue(claimed_task, timezone.now() + timedelta(seconds=delay), error)
+            return
+        logger.error(
+            'Task %s (#%d) failed for good after %d attempts:\n%s',
+            claimed_task.name, claimed_task.pk, claimed_task.attempts, error,
+        )
+        run_write_transaction(
+            lambda: Task.objects.filter(pk=claimed_task.pk).update(
+                status=Task.FAILED, finished_at=timezone.now(), last_error=error
+            )
+        )
+
+
+def queue_stats(window=3600, sample=1000):
+    """
+    Queue depth per task and status, the age of the oldest due task, and
+    wait (queued to started) and run time percentiles in milliseconds over
+    tasks finished in the last `window` seconds
+    """
+    now = timezone.now()
+    depth = {}
+    rows = Task.objects.exclude(status=Task.DONE).values('name', 'status').annotate(
+        count=Count('pk'), due=Count('pk', filter=Q(run_at__lte=now))
+    )
+    for row in rows:
+        counts = depth.setdefault(row['name'], {})
+        counts[row['status']] = row['count']
+        if row['status'] == Task.QUEUED:
+            counts['due'] = row['due']
+    oldest = Task.objects.filter(status=Task.QUEUED, run_at__lte=now).aggregate(Min('run_at'))['run_at__min']
+
+    finished = Task.objects.filter(status=Task.DONE, finished_at__gte=now - timedelta(seconds=window))
+    waits, runs = [], []
+    for created_at, run_at, started_at, finished_at in finished.order_by('-finished_at').values_list(
+        'created_at', 'run_at', 'started_at', 'finished_at'
+    )[:sample]:
+        if started_at is None:
+            # Superseded by a newer copy before it ran
+            continue
+        waits.append((started_at - max(created_at, run_at)).total_seconds() * 1000)
+        runs.append((finished_at - started_at).total_seconds() * 1000)
+    latency = {
+        name: {
+            'p50': round(percentile(values, 0.50), 3),
+            'p95': round(percentile(values, 0.95), 3),
+            'max': round(max(values), 3),
+        } if values else None
+        for name, values in (('wait_ms', waits), ('run_ms', runs))
+    }
+    return {
+        'depth': depth,
+        'oldest_due_seconds': (now - oldest).total_seconds() if oldest else 0,
+        'finished': len(runs),
+        'latency': latency,
+    }
@@ -0,0 +1,157 @@
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from questions.models import Question
+from questions import search
+from .models import Task
+from . import queue as queue_module
+from .queue import Worker, heartbeat, task, queue_stats
+
+calls = []
+
+
+@task(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task(name='tests.record_once', dedup=True)
+def record_once(value):
+    calls.append(value)
+
+
+@task(name='tests.fail', max_attempts=2)
+def fail():
+    raise RuntimeError('boom')
+
+
+@override_settings(TASKS={**settings.TASKS, 'ENABLED': True})
+class TaskQueueTest(TestCase):
+    """
+    Test case for the database-backed task queue
+    """
+    def setUp(self):
+        calls.clear()
+        self.worker = Worker(threads=1)
+
+    @override_settings(TASKS={**settings.TASKS, 'ENABLED': False})
+    def test_disabled_queue_runs_inline(self):
+        """Test delay() calls the function at once when the queue is off"""
+        record.delay(1)
+        self.assertEqual(calls, [1])
+        self.assertFalse(Task.objects.exists())
+
+    def test_delay_queues_and_worker_runs(self):
+        """Test a queued call is run by the worker and marked done"""
+        record.delay(1)
+        self.assertEqual(calls, [])
+        self.assertEqual(self.worker.run_once(), 1)
+        self.assertEqual(calls, [1])
+        queued = Task.objects.get()
+        self.assertEqual((queued.status, queued.attempts), (Task.DONE, 1))
+        self.assertEqual(self.worker.run_once(), 0)
+
+    def test_dedup_while_queued(self):
+        """Test a deduplicated task is queued once per arguments until it runs"""
+        record_once.delay(1)
+        record_once.delay(1)
+        record_once.delay(2)
+        self.assertEqual(Task.objects.filter(status=Task.QUEUED).count(), 2)
+        while self.worker.run_once():
+            pass
+        record_once.delay(1)
+        self.assertEqual(Task.objects.filter(status=Task.QUEUED).count(), 1)
+
+    def test_countdown(self):
+        """Test a delayed task is not run before it is due"""
+        record.enqueue((1,), countdown=60)
+        self.assertEqual(self.worker.run_once(), 0)
+        Task.objects.update(run_at=timezone.now())
+        self.assertEqual(self.worker.run_once(), 1)
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        """Test a failing task is retried later, then left as failed"""
+        fail.delay()
+        with self.assertLogs('tasks.queue', level='WARNING'):
+            self.worker.run_once()
+        failed = Task.objects.get()
+        self.assertEqual((failed.status, failed.attempts), (Task.QUEUED, 1))
+        self.assertGreater(failed.run_at, timezone.now())
+        self.assertIn('RuntimeError: boom', failed.last_error)
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('tasks.queue', level='ERROR'):
+            self.worker.run_once()
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.attempts), (Task.FAILED, 2))
+
+    def test_stale_running_tasks_requeued(self):
+        """Test tasks left running by a dead worker are run again"""
+        record.delay(1)
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Task.objects.update(status=Task.RUNNING, started_at=an_hour_ago, heartbeat_at=an_hour_ago)
+        with self.assertLogs('tasks.queue', level='WARNING'):
+            self.assertEqual(self.worker.run_once(), 1)
+        self.assertEqual(calls, [1])
+
+    @override_settings(TASKS={**settings.TASKS, 'ENABLED': True, 'LEASE_SECONDS': 60})
+    def test_long_task_keeps_its_lease(self):
+        """Test a task running past the lease is not requeued while it sends heartbeats"""
+        def run_past_lease(value):
+            # Claimed two leases ago, and renewing as it goes
+            Task.objects.update(
+                started_at=timezone.now() - timedelta(seconds=120),
+                heartbeat_at=timezone.now() - timedelta(seconds=120),
+            )
+            later = time.monotonic() + 7
+            with mock.patch.object(queue_module, 'time', mock.Mock(monotonic=lambda: later)):
+                heartbeat()
+            calls.append(Task.objects.requeue_stale(60))
+
+        with mock.patch.object(record, 'func', side_effect=run_past_lease):
+            record.delay(1)
+            self.worker.run_once()
+        self.assertEqual(calls, [0])
+        finished = Task.objects.get()
+        self.assertEqual((finished.status, finished.attempts, finished.last_error), (Task.DONE, 1, ''))
+
+    def test_run_tasks_command(self):
+        """Test the worker command drains the queue in burst mode"""
+        record.delay(1)
+        record.delay(2)
+        out = StringIO()
+        call_command('run_tasks', '--threads', '1', '--burst', stdout=out)
+        self.assertEqual(sorted(calls), [1, 2])
+        self.assertIn('Worker stopped', out.getvalue())
+
+    def test_search_indexed_by_worker(self):
+        """Test search indexing is deferred to the worker when the queue is on"""
+        user = User.objects.create_user(username='testuser', password='testpassword123')
+        question = Question.objects.create(title='Deferred indexing', author=user)
+        self.assertEqual(search.search('deferred'), [])
+        self.worker.run_once()
+        self.assertEqual([hit.object_id for hit in search.search('deferred')], [question.pk])
+        question.delete()
+        self.worker.run_once()
+        self.assertEqual(search.search('deferred'), [])
+
+    def test_stats_endpoint(self):
+        """Test queue depth and latency are reported to staff only"""
+        record.delay(1)
+        self.worker.run_once()
+        record.delay(2)
+        self.assertEqual(queue_stats()['depth'], {'tests.record': {'queued': 1, 'due': 1}})
+        client = Client()
+        url = reverse('task-stats')
+        self.assertEqual(client.get(url).status_code, 302)
+        User.objects.create_user(username='staff', password='testpassword123', is_staff=True)
+        client.login(username='staff', password='testpassword123')
+        stats = client.get(url).json()['tasks']
+        self.assertEqual(stats['finished'], 1)
+        self.assertIn('p95', stats['latency']['wait_ms'])